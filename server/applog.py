@@ -0,0 +1,132 @@
+"""
+構造化ログ
+ログはキューに積んで別スレッドでJSON Linesとして標準出力に書き出すため、
+イベントループをブロックしません。ペイロードの文字列化は実際に出力される
+レコードに対してのみ、書き出し側のスレッドで行います。
+
+環境変数:
+    LOG_LEVEL           全体のログレベル（既定: INFO）
+    LOG_ROUTE_LEVELS    ルートごとのレベル（例: interactions=DEBUG,command=WARNING）
+    LOG_SAMPLE_RATES    ルートごとのサンプリング率（例: interactions=0.1）
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+ROOT = "botdiscord"
+
+# LogRecord 標準の属性（これ以外は extra として出力する）
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+_handler: Optional["_NonBlockingQueueHandler"] = None
+
+
+def _parse_mapping(value: Optional[str]) -> Dict[str, str]:
+    """"a=1,b=2" 形式の環境変数をdictにする"""
+    mapping = {}
+    for item in (value or "").split(","):
+        name, sep, setting = item.partition("=")
+        if sep and name.strip():
+            mapping[name.strip()] = setting.strip()
+    return mapping
+
+
+class JsonFormatter(logging.Formatter):
+    """1レコードを1行のJSONに整形する"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """一定の割合のレコードだけを通す（WARNING以上は常に通す）"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """キューが詰まっている場合は待たずに捨てる"""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 整形は書き出し側のスレッドで行う。例外情報だけは先に文字列にしておく
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(max_queue: int = 10000) -> None:
+    """ログ出力を初期化する（複数回呼んでも1度だけ有効）"""
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+    _handler = _NonBlockingQueueHandler(queue.Queue(maxsize=max_queue))
+    _listener = QueueListener(_handler.queue, stream, respect_handler_level=False)
+    _listener.start()
+
+    root = logging.getLogger(ROOT)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    root.addHandler(_handler)
+    root.propagate = False
+
+    for route, level in _parse_mapping(os.getenv("LOG_ROUTE_LEVELS")).items():
+        get_logger(route).setLevel(level.upper())
+    for route, rate in _parse_mapping(os.getenv("LOG_SAMPLE_RATES")).items():
+        get_logger(route).addFilter(SamplingFilter(float(rate)))
+
+
+def shutdown_logging() -> None:
+    """キューに残っているログを書き出して停止する"""
+    global _listener, _handler
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger(ROOT).removeHandler(_handler)
+    _listener = None
+    _handler = None
+
+
+def get_logger(route: str) -> logging.Logger:
+    """ルート名（interactions, command など）ごとのロガー"""
+    return logging.getLogger(f"{ROOT}.{route}")
+
+
+def dropped_records() -> int:
+    """キューが溢れて捨てたレコード数"""
+    return _handler.dropped if _handler is not None else 0
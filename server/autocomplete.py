@@ -0,0 +1,165 @@
+"""
+オートコンプリート用の前方一致インデックス
+候補を正規化した名前でソートした配列に保持し、入力のたびに bisect で先頭位置を
+探して最大25件を返します（全件を走査しません）。候補の追加・削除・変更は
+その項目だけを配列に挿入・削除するので、インデックスを作り直す必要はありません。
+"""
+
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Discordが受け付ける候補の最大数
+MAX_CHOICES = 25
+# 候補の名前・値の最大文字数
+MAX_NAME_LENGTH = 100
+
+Choice = Dict[str, Any]
+
+
+def normalize(text: str) -> str:
+    """大文字・小文字や全角・半角の違いを無視して比較するためのキー"""
+    return unicodedata.normalize("NFKC", text).strip().casefold()
+
+
+class PrefixIndex:
+    """名前の前方一致で候補を返すインデックス
+
+    値（value）を候補のIDとして扱い、同じ値で add すると名前を置き換えます。
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, Any]] = ()):
+        # ソート済みのキー（"正規化した名前\\0値"、同名の候補も区別する）
+        self._keys: List[str] = []
+        # キー -> 応答に入れる候補（検索時にdictを作らない）
+        self._choices: Dict[str, Choice] = {}
+        # 値 -> キー（削除・変更用）
+        self._by_value: Dict[Any, str] = {}
+        self.replace(entries)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, value: Any) -> bool:
+        return value in self._by_value
+
+    @staticmethod
+    def _key(name: str, value: Any) -> str:
+        return f"{normalize(name)}\0{value}"
+
+    def add(self, name: str, value: Any) -> None:
+        """候補を追加する（同じ値の候補があれば置き換える）"""
+        name = name[:MAX_NAME_LENGTH]
+        key = self._key(name, value)
+        old = self._by_value.get(value)
+        if old == key:
+            self._choices[key] = {"name": name, "value": value}
+            return
+        if old is not None:
+            self._discard(old)
+        insort(self._keys, key)
+        self._choices[key] = {"name": name, "value": value}
+        self._by_value[value] = key
+
+    def remove(self, value: Any) -> bool:
+        """候補を削除する（存在しなければ False）"""
+        key = self._by_value.pop(value, None)
+        if key is None:
+            return False
+        self._discard(key)
+        return True
+
+    def _discard(self, key: str) -> None:
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            del self._keys[index]
+        self._choices.pop(key, None)
+
+    def replace(self, entries: Iterable[Tuple[str, Any]]) -> None:
+        """候補をまとめて入れ替える（差分が少なければ差分だけを反映する）"""
+        wanted: Dict[Any, str] = {}
+        for name, value in entries:
+            wanted[value] = name[:MAX_NAME_LENGTH]
+
+        removed = [value for value in self._by_value if value not in wanted]
+        changed = [
+            (name, value)
+            for value, name in wanted.items()
+            if self._by_value.get(value) != self._key(name, value)
+        ]
+        # 変更が多い場合はソートし直した方が速い
+        if len(removed) + len(changed) > len(self._keys) // 4:
+            self._rebuild(wanted)
+            return
+        for value in removed:
+            self.remove(value)
+        for name, value in changed:
+            self.add(name, value)
+
+    def _rebuild(self, entries: Dict[Any, str]) -> None:
+        self._choices = {}
+        self._by_value = {}
+        for value, name in entries.items():
+            key = self._key(name, value)
+            self._choices[key] = {"name": name, "value": value}
+            self._by_value[value] = key
+        self._keys = sorted(self._choices)
+
+    def search(self, prefix: str, limit: int = MAX_CHOICES) -> List[Choice]:
+        """名前が prefix で始まる候補を名前順に最大 limit 件返す"""
+        prefix = normalize(prefix)
+        keys = self._keys
+        start = bisect_left(keys, prefix)
+        # 一致するキーは連続しているので、一致しなくなったら終わり
+        choices = []
+        for key in keys[start:start + limit]:
+            if not key.startswith(prefix):
+                break
+            choices.append(self._choices[key])
+        return choices
+
+
+class IndexSet:
+    """キー（ギルドIDなど）ごとのインデックスを必要になったときに作る"""
+
+    def __init__(self, max_indexes: int = 1024):
+        self.max_indexes = max_indexes
+        self._indexes: Dict[Hashable, PrefixIndex] = {}
+        # キー -> 最後に反映した元データ（同じオブジェクトなら差分を取らない）
+        self._sources: Dict[Hashable, Any] = {}
+
+    def get(self, key: Hashable) -> Optional[PrefixIndex]:
+        return self._indexes.get(key)
+
+    def build(
+        self, key: Hashable, load: Callable[[], Iterable[Tuple[str, Any]]]
+    ) -> PrefixIndex:
+        """インデックスが無ければ load() の候補から作る"""
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._store(key, PrefixIndex(load()))
+        return index
+
+    def sync(
+        self, key: Hashable, source: Any, entries: Callable[[Any], Iterable[Tuple[str, Any]]]
+    ) -> PrefixIndex:
+        """元データが変わっていたら差分を反映する"""
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._store(key, PrefixIndex(entries(source)))
+        elif self._sources.get(key) is not source:
+            index.replace(entries(source))
+        self._sources[key] = source
+        return index
+
+    def _store(self, key: Hashable, index: PrefixIndex) -> PrefixIndex:
+        if len(self._indexes) >= self.max_indexes:
+            # 最も古く作ったインデックスを捨てる
+            oldest = next(iter(self._indexes))
+            self.discard(oldest)
+        self._indexes[key] = index
+        return index
+
+    def discard(self, key: Hashable) -> None:
+        self._indexes.pop(key, None)
+        self._sources.pop(key, None)
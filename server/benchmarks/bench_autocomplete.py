@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+オートコンプリートのベンチマーク
+10万件（--entries）の候補から前方一致で25件を返すときのレイテンシを、
+PrefixIndex（ソート済み配列 + bisect）と全件走査で比較します。候補の追加・削除と、
+署名付きの type 4 を /interactions に送ったときの応答時間も計測します。
+
+    python benchmarks/bench_autocomplete.py [--entries 100000] [-n 5000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import string
+import time
+
+from harness import Signer, asgi_headers, call_asgi, encode, percentile
+
+SIGNER = Signer()
+SIGNER.install()
+os.environ["DISCORD_TOKEN"] = ""
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+from autocomplete import MAX_CHOICES, PrefixIndex, normalize  # noqa: E402
+
+GUILD_ID = "81384788765712384"
+
+
+def make_names(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8))) for _ in range(2000)]
+    return [
+        (f"{rng.choice(words)}-{rng.choice(words)}-{i}", str(10**17 + i)) for i in range(count)
+    ]
+
+
+def make_prefixes(names, count: int, seed: int = 2):
+    """実際の入力に近い長さ0〜5文字の入力"""
+    rng = random.Random(seed)
+    prefixes = []
+    for _ in range(count):
+        name = rng.choice(names)[0]
+        prefixes.append(name[:rng.randint(0, 5)])
+    return prefixes
+
+
+def linear_search(entries, prefix: str):
+    """比較用: 全件を走査して一致したものを名前順に25件返す"""
+    prefix = normalize(prefix)
+    matches = [
+        {"name": name, "value": value}
+        for name, value in entries
+        if normalize(name).startswith(prefix)
+    ]
+    matches.sort(key=lambda choice: normalize(choice["name"]))
+    return matches[:MAX_CHOICES]
+
+
+def measure(function, inputs):
+    latencies = []
+    for item in inputs:
+        start = time.perf_counter()
+        function(item)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {name: percentile(latencies, q) * 1e6 for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))}
+
+
+def report(name: str, result) -> None:
+    print(f"{name:28} p50 {result['p50']:10.1f}  p95 {result['p95']:10.1f}  p99 {result['p99']:10.1f} µs")
+
+
+async def measure_endpoint(names, prefixes):
+    """署名付きの type 4 を /interactions に送る（チャンネル一覧はキャッシュに入れておく）"""
+    import interactions
+    import interactions_app
+
+    app = interactions_app.app
+    channels = [{"id": value, "name": name, "type": 0} for name, value in names]
+    await interactions.metadata.backend.set(f"/guilds/{GUILD_ID}/channels", channels, 3600)
+
+    requests = []
+    for i, prefix in enumerate(prefixes):
+        raw_body = encode({
+            "type": 4, "id": str(i + 1), "application_id": "1", "token": "bench", "version": 1,
+            "guild_id": GUILD_ID, "channel_id": "1", "member": {"user": {"id": "1"}},
+            "data": {"id": "1", "name": "channel", "type": 1, "options": [
+                {"type": 3, "name": "name", "value": prefix, "focused": True},
+            ]},
+        })
+        requests.append((raw_body, asgi_headers(SIGNER.sign(raw_body))))
+
+    latencies = []
+    async with app.router.lifespan_context(app):
+        # 最初の1回でインデックスを作る
+        await call_asgi(app, "/interactions", *requests[0])
+        for raw_body, headers in requests[1:]:
+            start = time.perf_counter()
+            status, _ = await call_asgi(app, "/interactions", raw_body, headers)
+            latencies.append(time.perf_counter() - start)
+            assert status == 200, status
+    latencies.sort()
+    return {name: percentile(latencies, q) * 1e6 for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("-n", type=int, default=5000, help="検索の回数")
+    parser.add_argument("--linear", type=int, default=200, help="全件走査で計測する回数")
+    args = parser.parse_args()
+
+    names = make_names(args.entries)
+    prefixes = make_prefixes(names, args.n)
+
+    start = time.perf_counter()
+    index = PrefixIndex(names)
+    print(f"{args.entries:,} entries, build {1000 * (time.perf_counter() - start):.0f} ms")
+
+    # 結果が全件走査と同じであることを確認
+    for prefix in prefixes[:50]:
+        assert index.search(prefix) == linear_search(names, prefix), prefix
+
+    report("PrefixIndex.search", measure(index.search, prefixes))
+    report("linear scan", measure(lambda p: linear_search(names, p), prefixes[:args.linear]))
+
+    # 1件ずつの追加・名前の変更・削除
+    extra = make_names(args.n, seed=3)
+    extra = [(f"new-{name}", f"9{value}") for name, value in extra]
+    report("add", measure(lambda entry: index.add(*entry), extra))
+    report("rename", measure(lambda entry: index.add(f"renamed-{entry[0]}", entry[1]), extra))
+    report("remove", measure(lambda entry: index.remove(entry[1]), extra))
+
+    report("/interactions type 4", asyncio.run(measure_endpoint(names, prefixes)))
+
+
+if __name__ == "__main__":
+    main()
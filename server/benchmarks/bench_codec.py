@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+JSONコーデックのベンチマーク
+/interactions に PING と hello を送り、std / fast 両方のリクエスト/秒を比較します。
+
+    python benchmarks/bench_codec.py [-n 3000]
+"""
+
+import argparse
+import asyncio
+import time
+
+from harness import Signer, asgi_headers, call_asgi, encode, interaction
+
+SIGNER = Signer()
+SIGNER.install()
+
+import codec  # noqa: E402
+from main import app  # noqa: E402
+
+PAYLOADS = {
+    "PING": interaction(),
+    "hello": interaction("hello"),
+}
+
+
+def signed_request(payload):
+    raw_body = encode(payload)
+    return raw_body, asgi_headers(SIGNER.sign(raw_body))
+
+
+async def call(raw_body: bytes, headers) -> int:
+    status, _ = await call_asgi(app, "/interactions", raw_body, headers)
+    return status
+
+
+async def measure(name: str, count: int) -> float:
+    raw_body, headers = signed_request(PAYLOADS[name])
+    assert await call(raw_body, headers) == 200
+    start = time.perf_counter()
+    for _ in range(count):
+        await call(raw_body, headers)
+    return count / (time.perf_counter() - start)
+
+
+async def run(count: int):
+    results = {}
+    for mode in (codec.STANDARD, codec.FAST):
+        codec.set_mode(mode)
+        for name in PAYLOADS:
+            results[(mode, name)] = await measure(name, count)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=3000)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.n))
+    print(f"orjson: {'あり' if codec.orjson else 'なし'}")
+    for name in PAYLOADS:
+        std = results[(codec.STANDARD, name)]
+        fast = results[(codec.FAST, name)]
+        print(f"{name:6} std: {std:8,.0f} req/s  fast: {fast:8,.0f} req/s  ({fast / std:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
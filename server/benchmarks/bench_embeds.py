@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+埋め込みテンプレートのマイクロベンチマーク
+serverinfo の埋め込みを、add_field を並べる従来方式とテンプレート（dictのまま /
+discord.Embed に変換）で作り、1秒あたりの作成数を比較します。
+
+    python benchmarks/bench_embeds.py [-n 20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import discord
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import to_embed  # noqa: E402
+from embeds import SERVERINFO, serverinfo_values  # noqa: E402
+
+GUILDS = [
+    SimpleNamespace(
+        id=81384788765712384 + i,
+        name=f"guild-{i}",
+        member_count=1000 + i,
+        owner_id=80351110224678912,
+        owner=SimpleNamespace(mention="<@80351110224678912>"),
+        created_at=discord.utils.snowflake_time(81384788765712384 + i),
+        channels=[None] * 40,
+        roles=[None] * 12,
+        icon=None,
+    )
+    for i in range(100)
+]
+
+
+def legacy(guild) -> discord.Embed:
+    """変更前の serverinfo 相当"""
+    embed = discord.Embed(title=f"{guild.name} の情報", color=discord.Color.blue())
+    embed.add_field(name="メンバー数", value=guild.member_count, inline=True)
+    embed.add_field(name="サーバーID", value=guild.id, inline=True)
+    embed.add_field(
+        name="作成日", value=guild.created_at.strftime("%Y年%m月%d日"), inline=True
+    )
+    embed.add_field(name="オーナー", value=guild.owner.mention, inline=True)
+    embed.add_field(name="チャンネル数", value=len(guild.channels), inline=True)
+    embed.add_field(name="ロール数", value=len(guild.roles), inline=True)
+    if guild.icon:
+        embed.set_thumbnail(url=guild.icon.url)
+    return embed
+
+
+def template(guild) -> dict:
+    return SERVERINFO.render(
+        serverinfo_values(
+            guild.id,
+            guild.name,
+            guild.member_count,
+            guild.owner_id,
+            len(guild.channels),
+            len(guild.roles),
+            guild.icon.url if guild.icon else None,
+        )
+    )
+
+
+def template_embed(guild) -> discord.Embed:
+    return to_embed(template(guild))
+
+
+def measure(build, count: int) -> float:
+    for guild in GUILDS:
+        build(guild)
+    start = time.perf_counter()
+    for i in range(count):
+        build(GUILDS[i % len(GUILDS)])
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=20000)
+    args = parser.parse_args()
+
+    # 出力が同じであることを確認
+    assert legacy(GUILDS[0]).to_dict() == template_embed(GUILDS[0]).to_dict()
+
+    base = measure(legacy, args.n)
+    print(f"{'add_field':18} {base:10,.0f} embeds/s")
+    for name, build in (("template (dict)", template), ("template (Embed)", template_embed)):
+        rate = measure(build, args.n)
+        print(f"{name:18} {rate:10,.0f} embeds/s  ({rate / base:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+ゲートウェイのキャッシュ設定ごとのメモリ使用量
+プロファイルごとに新しいプロセスで Bot を作り、N個の合成ギルド（チャンネル・ロール・
+絵文字・メンバー・メッセージ）をゲートウェイのイベントと同じ経路で読み込ませて、
+RSSの増加量を計測します。インテントで届かないデータ（members インテントが無い場合の
+メンバー一覧など）は、実際のゲートウェイと同様にペイロードから省きます。
+
+    python benchmarks/bench_gateway_memory.py [--guilds 200] [--members 500] [--messages 200]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = ("full", "balanced", "minimal")
+
+# 子プロセスで実行するスクリプト
+CHILD = r"""
+import gc, json, sys
+from discord.ext import commands
+from gateway_profile import GatewayProfile
+
+def rss_kib():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+name, members_intent, guilds, members, messages = sys.argv[1], sys.argv[2] == "1", *map(int, sys.argv[3:6])
+profile = GatewayProfile.from_name(name, members_intent=members_intent)
+intents = profile.intents
+bot = commands.Bot(command_prefix="!", **profile.bot_options())
+state = bot._connection
+state.user = None
+# イベントは配送しない（キャッシュの大きさだけを測る）
+state.dispatch = lambda *args, **kwargs: None
+SELF_ID = 1
+
+def user(uid):
+    return {"id": str(uid), "username": f"user{uid}", "discriminator": "0", "avatar": None, "global_name": None}
+
+def member(uid):
+    return {"user": user(uid), "roles": [], "joined_at": "2020-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0}
+
+def guild_payload(index):
+    gid = 10_000_000 + index * 100_000
+    channels = [
+        {"id": str(gid + c), "type": 0, "name": f"channel-{c}", "position": c, "permission_overwrites": [], "nsfw": False, "parent_id": None}
+        for c in range(1, 31)
+    ]
+    # members インテントが無い場合、ゲートウェイは自分以外のメンバー一覧を送らない
+    member_ids = range(gid + 1000, gid + 1000 + members) if intents.members else ()
+    payload = {
+        "id": str(gid), "name": f"guild-{index}", "owner_id": str(gid + 1000), "icon": None,
+        "member_count": members, "large": members > 250, "features": [], "unavailable": False,
+        "roles": [{"id": str(gid + 50 + r), "name": f"role-{r}", "permissions": "0", "position": r, "color": 0, "hoist": False, "managed": False, "mentionable": False} for r in range(20)],
+        "channels": channels,
+        "members": [member(SELF_ID)] + [member(uid) for uid in member_ids],
+        "emojis": [{"id": str(gid + 80 + e), "name": f"emoji{e}", "roles": [], "require_colons": True, "managed": False, "animated": False, "available": True} for e in range(20)] if intents.emojis_and_stickers else [],
+        "stickers": [], "threads": [], "voice_states": [], "presences": [], "stage_instances": [], "guild_scheduled_events": [],
+    }
+    return gid, channels, payload
+
+gc.collect()
+before = rss_kib()
+for index in range(guilds):
+    gid, channels, payload = guild_payload(index)
+    state._add_guild_from_data(payload)
+    # guild_messages インテントが無い場合、メッセージは届かない
+    if intents.guild_messages:
+        for m in range(messages):
+            channel = channels[m % len(channels)]
+            author = gid + 1000 + m % max(members, 1)
+            state.parse_message_create({
+                "id": str(gid * 1000 + m), "channel_id": channel["id"], "guild_id": str(gid),
+                "author": user(author), "member": {"roles": [], "joined_at": "2020-01-01T00:00:00+00:00", "deaf": False, "mute": False},
+                "content": "x" * 80 if intents.message_content else "",
+                "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False,
+                "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [],
+                "embeds": [], "pinned": False, "type": 0,
+            })
+gc.collect()
+after = rss_kib()
+print(json.dumps({
+    "rss_kib": after - before,
+    "guilds": len(bot.guilds),
+    "members": sum(len(g.members) for g in bot.guilds),
+    "users": len(bot.users),
+    "messages": len(bot.cached_messages),
+}))
+"""
+
+
+def run(profile: str, members_intent: bool, guilds: int, members: int, messages: int):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, profile, "1" if members_intent else "0",
+         str(guilds), str(members), str(messages)],
+        cwd=SERVER_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--guilds", type=int, default=200)
+    parser.add_argument("--members", type=int, default=500, help="ギルドあたりのメンバー数")
+    parser.add_argument("--messages", type=int, default=200, help="ギルドあたりのメッセージ数")
+    parser.add_argument("--members-intent", action="store_true",
+                        help="members インテントありで計測する（メンバー一覧が届く場合）")
+    args = parser.parse_args()
+
+    print(f"{args.guilds} guilds × {args.members} members × {args.messages} messages"
+          f"{'（members インテントあり）' if args.members_intent else ''}")
+    print(f"{'profile':10} {'RSS MiB':>9} {'members':>9} {'users':>8} {'messages':>9}")
+    for profile in PROFILES:
+        result = run(profile, args.members_intent, args.guilds, args.members, args.messages)
+        print(
+            f"{profile:10} {result['rss_kib'] / 1024:9.1f} {result['members']:9,} "
+            f"{result['users']:8,} {result['messages']:9,}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+インタラクションエンドポイントの負荷テスト
+ローカルのEd25519鍵で署名したペイロードを /interactions・/discord/interaction・
+/test-interaction に送り、PING・各コマンド・同じIDの再送・不正な署名・上限を超えるボディごとにスループット、
+p50/p95/p99、1リクエストあたりのメモリ確保量を計測します。
+
+    # プロセス内（ASGIを直接呼び出す）
+    python benchmarks/bench_interactions.py [-n 2000] [--app interactions_app]
+
+    # uvicorn のワーカーを起動してHTTPで計測
+    python benchmarks/bench_interactions.py --server --workers 2 --concurrency 32
+
+    # 結果をJSONに保存し、別のコミットの結果と比較
+    python benchmarks/bench_interactions.py --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+from harness import (
+    SERVER_DIR,
+    Signer,
+    asgi_headers,
+    call_asgi,
+    encode,
+    interaction,
+    summarize,
+)
+
+SIGNER = Signer()
+SIGNER.install()
+# 外部APIへのアクセスとログ出力を止めて、エンドポイント自体の処理を計測する
+os.environ["DISCORD_TOKEN"] = ""
+os.environ["DEFERRED_COMMANDS"] = ""
+# 同じユーザーで繰り返し送るため流量制限は無効にする（bench_throttle.py で別に計測）
+for scope in ("USER", "COMMAND", "GUILD"):
+    os.environ[f"THROTTLE_{scope}"] = "0"
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+import codec  # noqa: E402
+from registry import registry  # noqa: E402
+
+ENDPOINTS = ("/interactions", "/discord/interaction", "/test-interaction")
+
+
+def build_scenarios() -> List[Dict[str, Any]]:
+    """エンドポイント × (PING + 各コマンド)、同じIDの再送、不正な署名、大きすぎるボディ"""
+    payloads = [("PING", interaction())]
+    payloads += [(spec.name, interaction(spec.name)) for spec in registry.specs]
+
+    scenarios = []
+    for path in ENDPOINTS:
+        for name, payload in payloads:
+            scenarios.append({"name": name, "path": path, "payload": payload, "expect": 200})
+    scenarios.append({
+        "name": "duplicate", "path": "/interactions", "payload": interaction("hello"),
+        "expect": 200, "replay": True,
+    })
+    scenarios.append({
+        "name": "invalid_signature", "path": "/interactions", "payload": interaction(),
+        "expect": 401, "signature": "00" * 64,
+    })
+    # ボディを読む前・読み込み中に拒否されるリクエスト
+    scenarios.append({
+        "name": "malformed_signature", "path": "/interactions", "payload": interaction(),
+        "expect": 401, "signature": "not-a-signature",
+    })
+    scenarios.append({
+        "name": "oversized", "path": "/interactions",
+        "payload": interaction("ping", padding="x" * int(os.getenv("INTERACTIONS_MAX_BODY", "262144"))),
+        "expect": 413,
+    })
+    return scenarios
+
+
+def build_request(scenario: Dict[str, Any], index: int) -> Tuple[bytes, Dict[str, str]]:
+    """index番目のリクエスト（再送シナリオ以外はインタラクションIDを毎回変える）"""
+    payload = scenario["payload"]
+    if not scenario.get("replay"):
+        payload = dict(payload, id=str(index + 1))
+    raw_body = encode(payload)
+    if scenario["path"] != "/interactions":
+        return raw_body, {"content-type": "application/json"}
+    headers = SIGNER.sign(raw_body)
+    if scenario.get("signature"):
+        headers["x-signature-ed25519"] = scenario["signature"]
+    return raw_body, headers
+
+
+# --- プロセス内 ---
+
+async def measure_allocations(app, path: str, requests, samples: int) -> Dict[str, float]:
+    """tracemalloc で1リクエストあたりのピーク確保量と残った量を計測する"""
+    tracemalloc.start()
+    try:
+        peaks = 0
+        before = tracemalloc.get_traced_memory()[0]
+        for raw_body, headers in requests[:samples]:
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await call_asgi(app, path, raw_body, headers)
+            peaks += tracemalloc.get_traced_memory()[1] - current
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    samples = min(samples, len(requests))
+    return {
+        "alloc_peak_bytes": peaks / samples,
+        "alloc_retained_bytes": retained / samples,
+    }
+
+
+async def run_inprocess(app_name: str, count: int, alloc_samples: int) -> List[Dict[str, Any]]:
+    app = getattr(__import__(app_name), "app")
+    results = []
+    offset = 0
+    async with app.router.lifespan_context(app):
+        for scenario in build_scenarios():
+            path = scenario["path"]
+            # 署名とエンコードは計測の外で済ませておく
+            requests = []
+            for index in range(offset, offset + count + alloc_samples + 1):
+                raw_body, headers = build_request(scenario, index)
+                requests.append((raw_body, asgi_headers(headers)))
+            offset += len(requests)
+
+            status, body = await call_asgi(app, path, *requests[0])
+            if status != scenario["expect"]:
+                raise SystemExit(
+                    f"{path} {scenario['name']}: "
+                    f"status {status} (expected {scenario['expect']}) {body[:200]!r}"
+                )
+
+            latencies = []
+            start = time.perf_counter()
+            for raw_body, headers in requests[1:count + 1]:
+                t = time.perf_counter()
+                await call_asgi(app, path, raw_body, headers)
+                latencies.append(time.perf_counter() - t)
+            elapsed = time.perf_counter() - start
+
+            result = {"name": scenario["name"], "path": path, "status": status}
+            result.update(summarize(latencies, elapsed))
+            if alloc_samples:
+                result.update(
+                    await measure_allocations(app, path, requests[count + 1:], alloc_samples)
+                )
+            results.append(result)
+    return results
+
+
+# --- uvicorn ---
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app_name: str, workers: int, port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", f"{app_name}:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+        ],
+        cwd=SERVER_DIR,
+        env=dict(os.environ),
+    )
+
+
+async def wait_ready(session, base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(base_url + "/metrics") as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit("サーバーが起動しませんでした")
+
+
+async def drive(session, url: str, scenario, count: int, concurrency: int, offset: int):
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    indexes = iter(range(offset, offset + count))
+
+    async def client():
+        for index in indexes:
+            # タイムスタンプの鮮度チェックがあるため毎回署名する
+            raw_body, headers = build_request(scenario, index)
+            t = time.perf_counter()
+            async with session.post(url, data=raw_body, headers=headers) as response:
+                await response.read()
+            latencies.append(time.perf_counter() - t)
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start, statuses
+
+
+async def run_server(app_name: str, count: int, workers: int, concurrency: int):
+    import aiohttp
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    process = start_server(app_name, workers, port)
+    results = []
+    try:
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await wait_ready(session, base_url)
+            offset = 0
+            for scenario in build_scenarios():
+                url = base_url + scenario["path"]
+                # ウォームアップ（全ワーカーに行き渡る程度）
+                await drive(session, url, scenario, concurrency * 2, concurrency, offset)
+                offset += concurrency * 2
+                latencies, elapsed, statuses = await drive(
+                    session, url, scenario, count, concurrency, offset
+                )
+                offset += count
+                if set(statuses) != {scenario["expect"]}:
+                    raise SystemExit(
+                        f"{scenario['path']} {scenario['name']}: status {statuses}"
+                    )
+                result = {
+                    "name": scenario["name"], "path": scenario["path"],
+                    "status": scenario["expect"],
+                }
+                result.update(summarize(latencies, elapsed))
+                results.append(result)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return results
+
+
+# --- 出力 ---
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=SERVER_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def key(result: Dict[str, Any]) -> str:
+    return f"{result['path']} {result['name']}"
+
+
+def print_results(results: List[Dict[str, Any]], baseline: Optional[Dict[str, Any]]) -> None:
+    previous = {key(r): r for r in baseline["results"]} if baseline else {}
+    header = f"{'scenario':44} {'req/s':>9} {'p50ms':>7} {'p95ms':>7} {'p99ms':>7} {'allocKiB':>9}"
+    if previous:
+        header += f" {'Δreq/s':>8} {'Δp99':>8}"
+    print(header)
+    for result in results:
+        alloc = result.get("alloc_peak_bytes")
+        line = (
+            f"{key(result):44} {result['throughput_rps']:9.0f} {result['p50_ms']:7.3f} "
+            f"{result['p95_ms']:7.3f} {result['p99_ms']:7.3f} "
+            f"{'-' if alloc is None else f'{alloc / 1024:.1f}':>9}"
+        )
+        before = previous.get(key(result))
+        if before:
+            line += (
+                f" {(result['throughput_rps'] / before['throughput_rps'] - 1) * 100:+7.1f}%"
+                f" {(result['p99_ms'] / before['p99_ms'] - 1) * 100:+7.1f}%"
+            )
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=2000, help="シナリオごとのリクエスト数")
+    parser.add_argument("--app", default="interactions_app", help="対象のモジュール（main も可）")
+    parser.add_argument("--server", action="store_true", help="uvicorn のワーカーで計測する")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--alloc-samples", type=int, default=200,
+                        help="メモリ確保量を計測するリクエスト数（0で無効、プロセス内のみ）")
+    parser.add_argument("--output", help="結果を保存するJSONファイル")
+    parser.add_argument("--compare", help="比較する以前の結果（JSON）")
+    args = parser.parse_args()
+
+    if args.server:
+        results = asyncio.run(run_server(args.app, args.n, args.workers, args.concurrency))
+    else:
+        results = asyncio.run(run_inprocess(args.app, args.n, args.alloc_samples))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "codec": codec.get_mode(),
+            "orjson": codec.orjson is not None,
+            "app": args.app,
+            "mode": "server" if args.server else "inprocess",
+            "workers": args.workers if args.server else None,
+            "concurrency": args.concurrency if args.server else 1,
+            "requests": args.n,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"保存しました: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+起動時間のベンチマーク
+新しいプロセスでエントリーポイントを import し、署名付きPINGに最初の応答を返すまでの
+時間を計測します（コールドスタートの目安）。
+
+    python benchmarks/bench_startup.py [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from nacl.signing import SigningKey
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = {
+    "interactions_app": "interactions_app:app",
+    "main": "main:app",
+}
+
+# 子プロセスで実行するスクリプト（import と最初の応答までを計測）
+CHILD = r"""
+import asyncio, json, sys, time
+start = time.perf_counter()
+module_name, attr = sys.argv[1].split(":")
+app = getattr(__import__(module_name), attr)
+imported = time.perf_counter()
+raw_body, signature, timestamp = sys.argv[2].encode(), sys.argv[3], sys.argv[4]
+
+async def first_response():
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": "/interactions",
+        "raw_path": b"/interactions", "query_string": b"", "root_path": "",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"x-signature-ed25519", signature.encode()),
+            (b"x-signature-timestamp", timestamp.encode()),
+        ],
+        "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 8000),
+    }
+    received = False
+    status = []
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": raw_body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+status = asyncio.run(first_response())
+done = time.perf_counter()
+print(json.dumps({
+    "status": status,
+    "import_ms": (imported - start) * 1000,
+    "first_response_ms": (done - imported) * 1000,
+    "total_ms": (done - start) * 1000,
+    "discord_loaded": "discord" in sys.modules,
+}))
+"""
+
+
+def run_once(entry_point: str, env, raw_body: str, signature: str, timestamp: str):
+    wall_start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, entry_point, raw_body, signature, timestamp],
+        cwd=SERVER_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - wall_start) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    signing_key = SigningKey.generate()
+    env = dict(
+        os.environ,
+        DISCORD_PUBLIC_KEY=signing_key.verify_key.encode().hex(),
+        DISCORD_TOKEN="",
+        LOG_LEVEL="ERROR",
+    )
+    raw_body = json.dumps({"type": 1})
+    timestamp = str(int(time.time()))
+    signature = signing_key.sign(timestamp.encode() + raw_body.encode()).signature.hex()
+
+    print(f"{'entry point':18} {'import':>9} {'1st resp':>9} {'total':>9} {'process':>9}  discord")
+    for name, entry_point in ENTRY_POINTS.items():
+        runs = [
+            run_once(entry_point, env, raw_body, signature, timestamp)
+            for _ in range(args.runs)
+        ]
+        assert all(run["status"] == 200 for run in runs)
+
+        def median(key):
+            return statistics.median(run[key] for run in runs)
+
+        print(
+            f"{name:18} {median('import_ms'):7.1f}ms {median('first_response_ms'):7.1f}ms "
+            f"{median('total_ms'):7.1f}ms {median('process_ms'):7.1f}ms  {runs[0]['discord_loaded']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+流量制限のベンチマーク
+プロセス内のバケット表で、--users 人のユーザーからランダムに届く実行を
+Throttle.check で確認するときのレイテンシ、バケット1つあたりのメモリ、
+使われなくなったバケットが捨てられて表が縮むことを計測します。
+
+    python benchmarks/bench_throttle.py [--users 100000] [-n 200000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+import tracemalloc
+
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+from harness import percentile  # noqa: E402
+from throttle import COMMAND, GUILD, USER, MemoryBackend, Rule, Throttle  # noqa: E402
+
+
+def make_throttle(max_keys: int, period: float = 10.0) -> Throttle:
+    rules = {USER: Rule(10, period), COMMAND: Rule(5, period), GUILD: Rule(100, period)}
+    return Throttle(rules, MemoryBackend(max_keys))
+
+
+async def measure(throttle: Throttle, requests):
+    latencies = []
+    throttled = 0
+    for user_id, guild_id, command in requests:
+        start = time.perf_counter()
+        wait = await throttle.check(user_id, guild_id, command)
+        latencies.append(time.perf_counter() - start)
+        throttled += wait > 0
+    latencies.sort()
+    result = {name: percentile(latencies, q) * 1e6 for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))}
+    result["throttled"] = throttled
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--guilds", type=int, default=1000)
+    parser.add_argument("-n", type=int, default=200_000, help="確認の回数")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    commands = ("ping", "hello", "serverinfo", "userinfo", "here")
+    users = [str(10**17 + i) for i in range(args.users)]
+    requests = [
+        (rng.choice(users), str(rng.randrange(args.guilds)), rng.choice(commands))
+        for _ in range(args.n)
+    ]
+
+    throttle = make_throttle(max_keys=10 * args.users)
+    result = asyncio.run(measure(throttle, requests))
+
+    # メモリは別の表で計測する（tracemalloc はレイテンシを大きくする）
+    memory = make_throttle(max_keys=10 * args.users, period=3600)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    asyncio.run(measure(memory, requests))
+    size = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+    buckets = len(memory.backend)
+    print(f"{args.n:,} checks from {args.users:,} users")
+    print(
+        f"check  p50 {result['p50']:6.2f}  p95 {result['p95']:6.2f}  p99 {result['p99']:6.2f} µs"
+        f"  throttled {result['throttled']:,}"
+    )
+    print(f"{buckets:,} buckets, {size / buckets:.0f} bytes/bucket")
+
+    # 短い周期で満タンに戻るバケットは、以降の確認のついでに捨てられる
+    throttle = make_throttle(max_keys=10 * args.users, period=0.05)
+    asyncio.run(measure(throttle, requests[: args.n // 2]))
+    peak = len(throttle.backend)
+    time.sleep(0.1)
+    asyncio.run(measure(throttle, [("1", "1", "ping")] * 1000))
+    print(f"idle eviction: {peak:,} -> {len(throttle.backend):,} buckets")
+
+
+if __name__ == "__main__":
+    main()
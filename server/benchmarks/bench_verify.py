@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+署名検証のマイクロベンチマーク
+リクエストごとにVerifyKeyを作る従来方式と、SignatureVerifierの比較を行います。
+
+    python benchmarks/bench_verify.py [-n 5000] [--concurrency 64]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from nacl.signing import SigningKey, VerifyKey
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from verifier import SignatureVerifier, parse_public_keys  # noqa: E402
+
+
+def make_samples(count: int):
+    """ローカル鍵で署名したサンプルを作る"""
+    signing_key = SigningKey.generate()
+    public_hex = signing_key.verify_key.encode().hex()
+    body = json.dumps({"type": 2, "data": {"name": "hello"}}).encode()
+    samples = []
+    for i in range(count):
+        timestamp = str(1700000000 + i)
+        signature = signing_key.sign(timestamp.encode() + body).signature.hex()
+        samples.append((body, signature, timestamp))
+    return public_hex, samples
+
+
+def legacy_verify(public_hex: str, raw_body: bytes, signature: str, timestamp: str) -> bool:
+    """変更前の verify_signature 相当"""
+    verify_key = VerifyKey(bytes.fromhex(public_hex))
+    verify_key.verify(timestamp.encode() + raw_body, bytes.fromhex(signature))
+    return True
+
+
+def rate(count: int, elapsed: float) -> str:
+    return f"{count / elapsed:,.0f} verifications/s"
+
+
+async def run_async(verifier: SignatureVerifier, samples, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(sample):
+        async with semaphore:
+            with verifier.track():
+                await asyncio.sleep(0)
+                assert await verifier.verify_async(*sample)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(sample) for sample in samples))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    public_hex, samples = make_samples(args.n)
+
+    start = time.perf_counter()
+    for sample in samples:
+        legacy_verify(public_hex, *sample)
+    print(f"before (鍵を毎回生成):      {rate(args.n, time.perf_counter() - start)}")
+
+    verifier = SignatureVerifier(parse_public_keys(public_hex))
+    start = time.perf_counter()
+    for sample in samples:
+        assert verifier.verify(*sample)
+    print(f"after  (鍵をキャッシュ):    {rate(args.n, time.perf_counter() - start)}")
+
+    # ローテーション中（先頭が古い鍵）の最悪ケース
+    rotated = SignatureVerifier(
+        parse_public_keys(f"{SigningKey.generate().verify_key.encode().hex()},{public_hex}")
+    )
+    start = time.perf_counter()
+    for sample in samples:
+        assert rotated.verify(*sample)
+    print(f"after  (鍵2本・ローテ中):   {rate(args.n, time.perf_counter() - start)}")
+
+    elapsed = asyncio.run(run_async(verifier, samples, args.concurrency))
+    print(f"after  (async, 並列{args.concurrency}): {rate(args.n, elapsed)}")
+    verifier.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+ベンチマーク用の共通部品
+ローカルのEd25519鍵で署名したインタラクションを作り、ASGIアプリを直接呼び出します。
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from nacl.signing import SigningKey
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+class Signer:
+    """ローカル鍵でDiscordと同じ形式の署名を付ける"""
+
+    def __init__(self):
+        self.signing_key = SigningKey.generate()
+        self.public_key = self.signing_key.verify_key.encode().hex()
+
+    def install(self) -> None:
+        """アプリを import する前に公開鍵を環境変数に設定する"""
+        os.environ["DISCORD_PUBLIC_KEY"] = self.public_key
+
+    def sign(self, raw_body: bytes, timestamp: Optional[str] = None) -> Dict[str, str]:
+        timestamp = timestamp or str(int(time.time()))
+        signature = self.signing_key.sign(timestamp.encode() + raw_body).signature
+        return {
+            "content-type": "application/json",
+            "x-signature-ed25519": signature.hex(),
+            "x-signature-timestamp": timestamp,
+        }
+
+
+def interaction(command: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+    """PING（command=None）またはスラッシュコマンドのペイロード"""
+    if command is None:
+        return {"type": 1, "id": "1", "application_id": "1", "token": "bench", "version": 1}
+    payload = {
+        "type": 2,
+        "id": "1",
+        "application_id": "1",
+        "token": "bench",
+        "version": 1,
+        "data": {"id": "1", "name": command, "type": 1},
+        "guild_id": "81384788765712384",
+        "channel_id": "81384788765712385",
+        "member": {
+            "user": {"id": "80351110224678912", "username": "bench", "global_name": "Bench"},
+            "roles": [],
+        },
+    }
+    payload.update(fields)
+    return payload
+
+
+def encode(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+def asgi_headers(headers: Dict[str, str]) -> Headers:
+    return [(name.encode(), value.encode()) for name, value in headers.items()]
+
+
+async def call_asgi(app, path: str, raw_body: bytes, headers: Headers, method: str = "POST"):
+    """ASGIアプリを直接呼び出して (status, body) を返す"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 8000),
+    }
+    received = False
+    status = 0
+    chunks = []
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": raw_body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """スループットとレイテンシの分位点（ミリ秒）"""
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
@@ -0,0 +1,436 @@
+"""
+Discord Bot（ゲートウェイ接続）
+スラッシュコマンドのゲートウェイ側ハンドラーを持ちます。
+単体でも起動できます（python bot.py）。FastAPIと同じプロセスで動かす場合は main.py を使います。
+SHARD_COUNT を指定すると AutoShardedBot で起動し、シャードごとに1プロセスだけが接続します
+（gateway_lease.py）。
+"""
+
+import asyncio
+import os
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+from dotenv import load_dotenv
+
+from applog import get_logger, setup_logging, shutdown_logging
+from autocomplete import IndexSet
+from components import SERVERINFO_PAGES, USERINFO_PAGES, components, pager
+from command_sync import CommandSyncer
+from embeds import (
+    BLUE,
+    DATETIME_FORMAT,
+    HERE,
+    SERVERINFO,
+    USERINFO,
+    channel_text,
+    format_datetime,
+    list_pages,
+    named_text,
+    paged_embed,
+    server_text,
+    serverinfo_values,
+    snowflake_date,
+)
+from gateway_lease import GatewayCoordinator
+from gateway_profile import CHUNK_LAZY, GatewayProfile, MemberLRU
+from gateway_status import GatewayStatus
+from lifecycle import lifecycle
+from registry import GATEWAY, registry
+from throttle import retry_after, throttle
+
+# 環境変数を読み込み
+load_dotenv()
+
+bot_logger = get_logger("bot")
+
+class TrackedCommandTree(app_commands.CommandTree):
+    """終了時に実行中のスラッシュコマンドを待てるよう、処理中の仕事として数える"""
+
+    async def _call(self, interaction: discord.Interaction) -> None:
+        with lifecycle.track():
+            await super()._call(interaction)
+
+
+# Discord Botの設定（インテントとキャッシュは GATEWAY_PROFILE で選ぶ）
+profile = GatewayProfile.from_env()
+intents = profile.intents
+
+# シャードの所有権（複数ワーカーでも各シャードに接続するのは1プロセスだけ）
+gateway = GatewayCoordinator.from_env(os.getenv("DISCORD_TOKEN"))
+if gateway.sharded:
+    # shard_ids は起動時に所有権を取れたシャードに置き換える
+    bot = commands.AutoShardedBot(
+        command_prefix="!",
+        shard_count=gateway.shard_count,
+        shard_ids=gateway.candidates,
+        tree_cls=TrackedCommandTree,
+        **profile.bot_options(),
+    )
+else:
+    bot = commands.Bot(command_prefix="!", tree_cls=TrackedCommandTree, **profile.bot_options())
+
+# キャッシュに無いメンバー・ユーザーは必要なときに取得する
+members = MemberLRU.from_env(bot)
+
+# /bot/status 用のギルド数・メンバー数・シャードの状態（イベントで更新する）
+gateway_status = GatewayStatus(bot)
+
+
+# Botイベント
+@bot.event
+async def on_ready():
+    bot_logger.info("%s がログインしました！", bot.user, extra={"bot_id": bot.user.id})
+
+    # シャード0を持つプロセスだけがスラッシュコマンドを同期する
+    if not gateway.owns(0):
+        return
+
+    # スラッシュコマンドを同期（再接続のたびに呼ばれるため変更があった場合のみ）
+    try:
+        result = await command_syncer.sync()
+        if not result["global"]["changed"]:
+            bot_logger.info("スラッシュコマンドに変更はありません")
+    except Exception as e:
+        bot_logger.exception("スラッシュコマンドの同期に失敗しました: %s", e)
+
+
+# スラッシュコマンドの定義（名前と説明は registry.py で定義）
+@registry.handler(GATEWAY, "ping")
+async def ping(interaction: discord.Interaction):
+    latency = round(bot.latency * 1000)
+    await interaction.response.send_message(f"🏓 Pong! 応答時間: {latency}ms")
+
+
+@registry.handler(GATEWAY, "hello")
+async def hello(interaction: discord.Interaction):
+    await interaction.response.send_message(
+        f"こんにちは、{interaction.user.mention}さん！"
+    )
+
+
+def to_embed(data: dict, timestamp=None) -> discord.Embed:
+    """テンプレートで作ったdictを discord.Embed にする（from_dict より軽い）"""
+    embed = discord.Embed(
+        title=data["title"],
+        colour=data.get("color"),
+        description=data.get("description"),
+        timestamp=timestamp,
+    )
+    # from_dict と同じくフィールドのリストをそのまま使う
+    if "fields" in data:
+        embed._fields = data["fields"]
+    thumbnail = data.get("thumbnail")
+    if thumbnail:
+        embed.set_thumbnail(url=thumbnail["url"])
+    footer = data.get("footer")
+    if footer:
+        embed.set_footer(text=footer["text"])
+    return embed
+
+
+def component_view(rows: list):
+    """コンポーネントのdictから送信用の View を作る
+
+    クリックは on_interaction でルーターが処理するため、view store には登録しません
+    （停止した View は登録されない）。別のプロセスにクリックが届いても同じように処理できます。
+    """
+    if not rows:
+        return discord.utils.MISSING
+    view = discord.ui.View(timeout=None)
+    for index, row in enumerate(rows):
+        for item in row["components"]:
+            view.add_item(discord.ui.Button(
+                style=discord.ButtonStyle(item["style"]),
+                label=item["label"],
+                custom_id=item["custom_id"],
+                disabled=item["disabled"],
+                row=index,
+            ))
+    view.stop()
+    return view
+
+
+async def check_throttle(interaction: discord.Interaction, command=None) -> bool:
+    """流量制限に掛かっていれば本人にだけ見えるメッセージを返して False"""
+    wait = await throttle.check(
+        str(interaction.user.id),
+        str(interaction.guild_id) if interaction.guild_id else None,
+        command,
+    )
+    if not wait:
+        return True
+    await interaction.response.send_message(
+        f"操作が多すぎます。{retry_after(wait)}秒後にもう一度お試しください。", ephemeral=True
+    )
+    return False
+
+
+async def interaction_check(interaction: discord.Interaction) -> bool:
+    # オートコンプリートは入力のたびに届くため流量制限の対象外
+    if interaction.type == discord.InteractionType.autocomplete:
+        return True
+    return await check_throttle(interaction, (interaction.data or {}).get("name"))
+
+
+# スラッシュコマンドは実行前に流量制限を確認する
+bot.tree.interaction_check = interaction_check
+
+
+@bot.listen()
+async def on_interaction(interaction: discord.Interaction):
+    # 起動時ではなく、ギルドで最初に使われたときにメンバーを取得する
+    if profile.chunk == CHUNK_LAZY:
+        members.request_chunk(interaction.guild)
+
+    # ボタン・セレクトメニューは custom_id からハンドラーと状態を取り出す
+    if interaction.type != discord.InteractionType.component:
+        return
+    handler, state = components.resolve(GATEWAY, (interaction.data or {}).get("custom_id", ""))
+    if handler is not None and await check_throttle(interaction):
+        with lifecycle.track():
+            await handler(interaction, *state)
+
+
+def serverinfo_embed_data(guild: discord.Guild) -> dict:
+    values = serverinfo_values(
+        guild.id,
+        guild.name,
+        guild.member_count,
+        guild.owner_id,
+        len(guild.channels),
+        len(guild.roles),
+        guild.icon.url if guild.icon else None,
+    )
+    return SERVERINFO.render(values)
+
+
+def serverinfo_embed(guild: discord.Guild) -> discord.Embed:
+    """ゲートウェイのキャッシュからサーバー情報の埋め込みを作る（/command と共通）"""
+    return to_embed(serverinfo_embed_data(guild))
+
+
+def serverinfo_page(guild: discord.Guild, page: int):
+    """サーバー情報のページ（概要・チャンネル一覧・ロール一覧）の埋め込みと View"""
+    pages = list_pages(
+        "チャンネル一覧",
+        [
+            channel.mention
+            for channel in guild.channels
+            if not isinstance(channel, discord.CategoryChannel)
+        ],
+    ) + list_pages(
+        "ロール一覧", [role.mention for role in reversed(guild.roles) if not role.is_default()]
+    )
+    data, page, total = paged_embed(
+        lambda: serverinfo_embed_data(guild), pages, page, color=BLUE
+    )
+    return to_embed(data), component_view(pager(SERVERINFO_PAGES, page=page, total=total))
+
+
+@registry.handler(GATEWAY, "serverinfo")
+async def serverinfo(interaction: discord.Interaction):
+    embed, view = serverinfo_page(interaction.guild, 0)
+    await interaction.response.send_message(embed=embed, view=view)
+
+
+@components.handler(GATEWAY, SERVERINFO_PAGES, int)
+async def serverinfo_pages(interaction: discord.Interaction, page: int):
+    if interaction.guild is None:
+        await interaction.response.send_message("この操作は使用できません。", ephemeral=True)
+        return
+    # 元のメッセージを書き換える（type 7）
+    embed, view = serverinfo_page(interaction.guild, page)
+    await interaction.response.edit_message(embed=embed, view=view)
+
+
+def userinfo_page(user, page: int):
+    """ユーザー情報のページ（概要・ロール一覧）の埋め込みと View"""
+    roles = [role for role in reversed(getattr(user, "roles", ())) if not role.is_default()]
+
+    def overview() -> dict:
+        joined_at = getattr(user, "joined_at", None)
+        values = {
+            "name": user.name,
+            "display_name": user.display_name,
+            "id": user.id,
+            "created": snowflake_date(user.id),
+            "joined": format_datetime(joined_at) if joined_at else "不明",
+            "roles": len(getattr(user, "roles", ())),
+            "avatar_url": user.avatar.url if user.avatar else None,
+        }
+        return USERINFO.render(values, color=user.color.value)
+
+    pages = list_pages("ロール一覧", [role.mention for role in roles])
+    data, page, total = paged_embed(overview, pages, page)
+    return to_embed(data), component_view(pager(USERINFO_PAGES, user.id, page=page, total=total))
+
+
+@registry.handler(GATEWAY, "userinfo")
+async def userinfo(interaction: discord.Interaction, user: discord.Member = None):
+    if user is None:
+        user = interaction.user
+    embed, view = userinfo_page(user, 0)
+    await interaction.response.send_message(embed=embed, view=view)
+
+
+@components.handler(GATEWAY, USERINFO_PAGES, int, int)
+async def userinfo_pages(interaction: discord.Interaction, user_id: int, page: int):
+    guild = interaction.guild
+    if guild is not None:
+        user = await members.member(guild, user_id)
+    else:
+        user = await members.user(user_id)
+    if user is None:
+        await interaction.response.send_message("ユーザー情報を取得できませんでした。", ephemeral=True)
+        return
+    embed, view = userinfo_page(user, page)
+    await interaction.response.edit_message(embed=embed, view=view)
+
+
+@registry.handler(GATEWAY, "here")
+async def here(interaction: discord.Interaction):
+    guild = interaction.guild
+    channel = interaction.channel
+    user = interaction.user
+
+    values = {
+        # サーバー情報
+        "server": server_text(guild.name, guild.id, guild.member_count) if guild else "DM",
+        "channel": None,
+        "category": None,
+        "channel_created": None,
+        "display_name": user.display_name,
+        "user_id": user.id,
+    }
+
+    # チャンネル情報
+    if isinstance(channel, discord.TextChannel):
+        values["channel"] = named_text(channel.name, channel.id, prefix="#")
+        # カテゴリ情報
+        category = channel.category
+        values["category"] = named_text(category.name, category.id) if category else "なし"
+        # チャンネル作成日
+        values["channel_created"] = snowflake_date(channel.id, DATETIME_FORMAT)
+    elif isinstance(channel, discord.DMChannel):
+        values["channel"] = "DM"
+        values["category"] = "なし"
+
+    embed = to_embed(HERE.render(values), timestamp=discord.utils.utcnow())
+    await interaction.response.send_message(embed=embed)
+
+
+# ギルドごとのチャンネル名のインデックス（最初の入力で作り、以降はイベントで更新する）
+channel_indexes = IndexSet()
+
+
+def _channel_entries(guild: discord.Guild):
+    return (
+        (channel.name, str(channel.id))
+        for channel in guild.channels
+        if not isinstance(channel, discord.CategoryChannel)
+    )
+
+
+def _channel_index(guild: discord.Guild):
+    return channel_indexes.build(guild.id, lambda: _channel_entries(guild))
+
+
+@bot.listen()
+async def on_guild_channel_create(channel: discord.abc.GuildChannel):
+    index = channel_indexes.get(channel.guild.id)
+    if index is not None and not isinstance(channel, discord.CategoryChannel):
+        index.add(channel.name, str(channel.id))
+
+
+@bot.listen()
+async def on_guild_channel_update(before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+    index = channel_indexes.get(after.guild.id)
+    if index is not None and before.name != after.name:
+        index.add(after.name, str(after.id))
+
+
+@bot.listen()
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    index = channel_indexes.get(channel.guild.id)
+    if index is not None:
+        index.remove(str(channel.id))
+
+
+@bot.listen()
+async def on_guild_remove(guild: discord.Guild):
+    channel_indexes.discard(guild.id)
+
+
+@registry.autocomplete(GATEWAY, "channel", option="name")
+async def channel_name(interaction: discord.Interaction, current: str):
+    if interaction.guild is None:
+        return []
+    return [
+        app_commands.Choice(name=choice["name"], value=choice["value"])
+        for choice in _channel_index(interaction.guild).search(current)
+    ]
+
+
+@registry.handler(GATEWAY, "channel")
+async def channel(interaction: discord.Interaction, name: str):
+    guild = interaction.guild
+    if guild is None:
+        await interaction.response.send_message("このコマンドはサーバー内でのみ使用できます。")
+        return
+
+    # 候補を選んだ場合はチャンネルID、そうでなければ入力した名前が届く
+    target = guild.get_channel(int(name)) if name.isdigit() else None
+    if target is None:
+        matches = _channel_index(guild).search(name, limit=1) if name else []
+        target = guild.get_channel(int(matches[0]["value"])) if matches else None
+    if target is None:
+        await interaction.response.send_message(f"チャンネル '{name}' は見つかりませんでした。")
+        return
+    await interaction.response.send_message(channel_text(target.id))
+
+
+# レジストリのコマンドを bot.tree に登録
+registry.install(bot.tree)
+command_syncer = CommandSyncer(bot.tree)
+
+
+# Botを起動する関数
+async def start_bot():
+    token = os.getenv("DISCORD_TOKEN")
+    if not token or token == "your_discord_bot_token_here":
+        bot_logger.warning("DISCORD_TOKENが設定されていません。Botは起動しません。")
+        return
+
+    # 所有権を取れるまではHTTPだけを処理する
+    shard_ids = await gateway.wait_for_shards(bot.is_closed)
+    if not shard_ids:
+        return
+    if gateway.sharded:
+        bot.shard_ids = shard_ids
+
+    keep_alive = asyncio.create_task(gateway.keep_alive(bot.close))
+    try:
+        await bot.start(token)
+    except Exception as e:
+        bot_logger.exception("Botの起動に失敗しました: %s", e)
+    finally:
+        keep_alive.cancel()
+        await gateway.release_all()
+
+
+async def run():
+    """Botだけを起動する"""
+    async with bot:
+        await start_bot()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown_logging()
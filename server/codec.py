@@ -0,0 +1,77 @@
+"""
+インタラクション用のJSONコーデック
+INTERACTION_CODEC=fast のとき、バイト列から直接パースし、
+レスポンスはエンコード済みのボディをそのまま返します（orjsonがあれば使用）。
+"""
+
+import json
+import os
+from typing import Any, Dict, Union
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson は任意
+    orjson = None
+
+STANDARD = "std"
+FAST = "fast"
+
+_mode = os.getenv("INTERACTION_CODEC", STANDARD)
+
+
+def dumps(payload: Any) -> bytes:
+    """コンパクトなJSONバイト列にエンコードする"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def loads(raw_body: Union[bytes, str]) -> Any:
+    """JSONをパースする（fastモードではデコードを挟まない）"""
+    if _mode != FAST:
+        if isinstance(raw_body, bytes):
+            raw_body = raw_body.decode("utf-8")
+        return json.loads(raw_body)
+    if orjson is not None:
+        return orjson.loads(raw_body)
+    return json.loads(raw_body)
+
+
+class Encoded(dict):
+    """エンコード済みのボディを持つレスポンス（固定の応答用）"""
+
+    __slots__ = ("body",)
+
+    def __init__(self, payload: Dict[str, Any]):
+        super().__init__(payload)
+        self.body = dumps(payload)
+
+
+def encode(payload: Dict[str, Any]) -> bytes:
+    """レスポンスをバイト列にする（エンコード済みならそのまま）"""
+    return payload.body if isinstance(payload, Encoded) else dumps(payload)
+
+
+def get_mode() -> str:
+    return _mode
+
+
+def set_mode(mode: str) -> None:
+    """コーデックを切り替える（std / fast）"""
+    global _mode
+    if mode not in (STANDARD, FAST):
+        raise ValueError(f"不明なコーデックです: {mode}")
+    _mode = mode
+
+
+def render(payload: Dict[str, Any]) -> Union[Dict[str, Any], Response]:
+    """エンドポイントの戻り値を作る
+
+    std ではdictをそのまま返してFastAPIにエンコードさせ、
+    fast では jsonable_encoder を通さずにバイト列を返します。
+    """
+    if _mode != FAST:
+        return payload
+    return Response(content=encode(payload), media_type="application/json")
@@ -0,0 +1,188 @@
+"""
+スラッシュコマンドの差分同期
+ローカルのコマンドツリーを正規化してハッシュを取り、前回同期した内容
+（ファイルに保存、無ければAPIから取得）と違う場合だけアップロードします。
+on_ready は再接続のたびに呼ばれるため、毎回の全件アップロードを避けます。
+
+環境変数:
+    COMMAND_SYNC_STATE      同期状態を保存するファイル（既定: .command_sync.json）
+    COMMAND_SYNC_SOURCE     比較対象（file: 保存した状態 / api: 毎回APIから取得）
+    COMMAND_SYNC_GUILD_IDS  ギルド専用コマンドを同期するギルドID（カンマ区切り）
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+import discord
+
+from applog import get_logger
+
+logger = get_logger("command_sync")
+
+
+def _normalize_option(option: Dict[str, Any]) -> Dict[str, Any]:
+    normalized = {
+        "type": option.get("type"),
+        "name": option.get("name"),
+        "description": option.get("description", ""),
+        "required": bool(option.get("required", False)),
+        "autocomplete": bool(option.get("autocomplete", False)),
+        "choices": [
+            {"name": choice["name"], "value": choice["value"]}
+            for choice in option.get("choices") or []
+        ],
+        "channel_types": sorted(option.get("channel_types") or []),
+        "options": [_normalize_option(child) for child in option.get("options") or []],
+    }
+    for key in ("min_value", "max_value", "min_length", "max_length"):
+        if option.get(key) is not None:
+            normalized[key] = option[key]
+    return normalized
+
+
+def normalize(command: Dict[str, Any]) -> Dict[str, Any]:
+    """ローカル・リモートのどちらのコマンド定義も同じ形にそろえる"""
+    permissions = command.get("default_member_permissions")
+    dm_permission = command.get("dm_permission")
+    return {
+        "type": command.get("type", 1),
+        "name": command["name"],
+        "description": command.get("description", ""),
+        "options": [
+            _normalize_option(option) for option in command.get("options") or []
+        ],
+        "nsfw": bool(command.get("nsfw", False)),
+        "dm_permission": True if dm_permission is None else bool(dm_permission),
+        "default_member_permissions": None if permissions is None else str(permissions),
+    }
+
+
+def digest(payload: Any) -> str:
+    """正規化したJSONのSHA-256"""
+    encoded = json.dumps(
+        payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def command_hashes(commands: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+    """"type:name" -> ハッシュ"""
+    return {
+        f"{normalized['type']}:{normalized['name']}": digest(normalized)
+        for normalized in map(normalize, commands)
+    }
+
+
+def tree_hash(hashes: Dict[str, str]) -> str:
+    """コマンドツリー全体のハッシュ"""
+    return digest(sorted(hashes.items()))
+
+
+def diff(local: Dict[str, str], remote: Dict[str, str]) -> Dict[str, List[str]]:
+    return {
+        "added": sorted(local.keys() - remote.keys()),
+        "removed": sorted(remote.keys() - local.keys()),
+        "changed": sorted(
+            key for key in local.keys() & remote.keys() if local[key] != remote[key]
+        ),
+    }
+
+
+class CommandSyncer:
+    """変更があったスコープ（グローバル・ギルド）だけを同期する"""
+
+    def __init__(
+        self,
+        tree: discord.app_commands.CommandTree,
+        state_path: Optional[str] = None,
+        source: Optional[str] = None,
+    ):
+        self.tree = tree
+        self.state_path = state_path or os.getenv(
+            "COMMAND_SYNC_STATE", ".command_sync.json"
+        )
+        self.source = source or os.getenv("COMMAND_SYNC_SOURCE", "file")
+        self._state: Optional[Dict[str, Any]] = None
+
+    def _load(self) -> Dict[str, Any]:
+        if self._state is None:
+            try:
+                with open(self.state_path, encoding="utf-8") as f:
+                    self._state = json.load(f)
+            except (OSError, ValueError):
+                self._state = {}
+        return self._state
+
+    def _save(self) -> None:
+        try:
+            with open(self.state_path, "w", encoding="utf-8") as f:
+                json.dump(self._state, f, indent=2, sort_keys=True)
+        except OSError as e:
+            # 読み取り専用の環境では次回APIから取得する
+            logger.warning("同期状態を保存できませんでした: %s", e)
+
+    def _guild_ids(self, application_id: str) -> List[int]:
+        ids = set(getattr(self.tree, "_guild_commands", {}).keys())
+        for item in os.getenv("COMMAND_SYNC_GUILD_IDS", "").split(","):
+            if item.strip():
+                ids.add(int(item))
+        # 以前同期したギルドも含める（コマンドが消えた場合に削除するため）
+        for scope in self._load().get(application_id, {}):
+            if scope != "global":
+                ids.add(int(scope))
+        return sorted(ids)
+
+    async def _remote_hashes(
+        self, guild: Optional[discord.abc.Snowflake]
+    ) -> Dict[str, str]:
+        remote = await self.tree.fetch_commands(guild=guild)
+        return command_hashes(command.to_dict() for command in remote)
+
+    async def _sync_scope(
+        self, application_id: str, guild: Optional[discord.abc.Snowflake], force: bool
+    ) -> Dict[str, Any]:
+        scope = "global" if guild is None else str(guild.id)
+        local = command_hashes(
+            command.to_dict() for command in self.tree.get_commands(guild=guild)
+        )
+        saved = self._load().setdefault(application_id, {})
+
+        remote = None if self.source == "api" else saved.get(scope)
+        if remote is None:
+            remote = await self._remote_hashes(guild)
+        changes = diff(local, remote)
+
+        result = {
+            "scope": scope,
+            "hash": tree_hash(local),
+            "commands": sorted(key.split(":", 1)[1] for key in local),
+            "diff": changes,
+        }
+        if not force and not any(changes.values()):
+            saved[scope] = local
+            return dict(result, changed=False)
+
+        synced = await self.tree.sync(guild=guild)
+        saved[scope] = local
+        logger.info(
+            "%d 個のスラッシュコマンドを同期しました",
+            len(synced),
+            extra={"scope": scope, "diff": changes},
+        )
+        return dict(result, changed=True)
+
+    async def sync(self, force: bool = False) -> Dict[str, Any]:
+        """グローバルと各ギルドのコマンドを必要な分だけ同期する"""
+        application_id = str(self.tree.client.application_id)
+        results = {
+            "global": await self._sync_scope(application_id, None, force),
+            "guilds": {},
+        }
+        for guild_id in self._guild_ids(application_id):
+            results["guilds"][str(guild_id)] = await self._sync_scope(
+                application_id, discord.Object(id=guild_id), force
+            )
+        self._save()
+        return results
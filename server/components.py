@@ -0,0 +1,143 @@
+"""
+メッセージコンポーネント（ボタン・セレクトメニュー、type 3）のルーター
+custom_id に "ハンドラーID:状態:状態..." を詰めて送り、クリックされたらそれを
+解読して処理します。サーバー側にセッションを保存しないので、どのワーカーや
+サーバーレスのインスタンスにクリックが届いても同じように処理できます。
+ハンドラーIDと状態の型は登録時に表へ入れておき、クリックのたびに先頭の
+区切りまでを表で引くだけで振り分けます。整数は36進数で詰めます
+（スノーフレークIDでも12文字程度）。
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# custom_id の最大文字数
+MAX_CUSTOM_ID = 100
+SEPARATOR = ":"
+
+# コンポーネントの種類
+ACTION_ROW = 1
+BUTTON = 2
+
+# ボタンのスタイル
+PRIMARY = 1
+SECONDARY = 2
+
+# ハンドラーID
+SERVERINFO_PAGES = "si"
+USERINFO_PAGES = "ui"
+
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _encode_int(value: int) -> str:
+    if value < 0:
+        return "-" + _encode_int(-value)
+    text = ""
+    while True:
+        value, digit = divmod(value, 36)
+        text = _DIGITS[digit] + text
+        if not value:
+            return text
+
+
+def _encode(value: Any) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return _encode_int(value)
+    text = str(value)
+    if SEPARATOR in text:
+        raise ValueError(f"状態に '{SEPARATOR}' は使えません: {text}")
+    return text
+
+
+# 型 -> custom_id の文字列から値に戻す関数
+_DECODERS: Dict[type, Callable[[str], Any]] = {
+    int: lambda text: int(text, 36),
+    str: str,
+    bool: lambda text: text == "1",
+}
+
+
+class ComponentRouter:
+    """custom_id の先頭のハンドラーIDからハンドラーを引くテーブル"""
+
+    def __init__(self):
+        # 種類 -> ハンドラーID -> (ハンドラー, 状態の型ごとのデコーダー)
+        self._tables: Dict[str, Dict[str, Tuple[Callable, Tuple[Callable[[str], Any], ...]]]] = {}
+
+    def handler(self, kind: str, handler_id: str, *types: type) -> Callable[[Callable], Callable]:
+        """ハンドラーを登録するデコレーター（types は custom_id に入れる状態の型）"""
+        if not handler_id or SEPARATOR in handler_id:
+            raise ValueError(f"ハンドラーIDが不正です: {handler_id!r}")
+        decoders = tuple(_DECODERS[t] for t in types)
+
+        def decorator(func: Callable) -> Callable:
+            self._tables.setdefault(kind, {})[handler_id] = (func, decoders)
+            return func
+
+        return decorator
+
+    @staticmethod
+    def custom_id(handler_id: str, *state: Any) -> str:
+        """ハンドラーIDと状態から custom_id を作る"""
+        custom_id = SEPARATOR.join((handler_id, *map(_encode, state)))
+        if len(custom_id) > MAX_CUSTOM_ID:
+            raise ValueError(f"custom_id が {MAX_CUSTOM_ID} 文字を超えています: {custom_id}")
+        return custom_id
+
+    def resolve(self, kind: str, custom_id: str) -> Tuple[Optional[Callable], Tuple[Any, ...]]:
+        """custom_id からハンドラーと状態を取り出す（不明・壊れている場合は None）"""
+        handler_id, _, rest = custom_id.partition(SEPARATOR)
+        entry = self._tables.get(kind, {}).get(handler_id)
+        if entry is None:
+            return None, ()
+        handler, decoders = entry
+        parts = rest.split(SEPARATOR) if rest else []
+        if len(parts) != len(decoders):
+            return None, ()
+        try:
+            return handler, tuple(decode(part) for decode, part in zip(decoders, parts))
+        except ValueError:
+            return None, ()
+
+
+def button(
+    custom_id: str, label: str, style: int = SECONDARY, disabled: bool = False
+) -> Dict[str, Any]:
+    return {
+        "type": BUTTON,
+        "style": style,
+        "label": label,
+        "custom_id": custom_id,
+        "disabled": disabled,
+    }
+
+
+def action_row(*components: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": ACTION_ROW, "components": list(components)}
+
+
+def pager(handler_id: str, *state: Any, page: int, total: int) -> List[Dict[str, Any]]:
+    """前へ・次へボタン（移動先のページを custom_id の最後の状態に入れる）
+
+    端のボタンは無効にし、custom_id が重ならないよう範囲外のページを入れます。
+    """
+    if total <= 1:
+        return []
+    custom_id = ComponentRouter.custom_id
+    return [
+        action_row(
+            button(custom_id(handler_id, *state, page - 1), "◀ 前へ", disabled=page <= 0),
+            button(
+                custom_id(handler_id, *state, page + 1),
+                "次へ ▶",
+                style=PRIMARY,
+                disabled=page >= total - 1,
+            ),
+        )
+    ]
+
+
+# 共有ルーター
+components = ComponentRouter()
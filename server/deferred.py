@@ -0,0 +1,191 @@
+"""
+遅延応答（type 5）とバックグラウンド実行
+時間のかかるコマンドはすぐに DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE を返し、
+ハンドラーはワーカープールで実行して結果をフォローアップWebhookに送ります。
+
+環境変数:
+    DEFERRED_COMMANDS   遅延実行するコマンド（例: here,serverinfo）
+    DEFERRED_WORKERS    ワーカー数（既定: 8）
+    DEFERRED_LIMITS     コマンドごとの同時実行数（例: serverinfo=2）
+"""
+
+import asyncio
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from applog import get_logger
+
+logger = get_logger("deferred")
+
+DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE = 5
+
+Job = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+class WebhookFollowupSender:
+    """フォローアップWebhookで元の応答を書き換える"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def edit_original(
+        self, application_id: str, token: str, data: Dict[str, Any]
+    ) -> None:
+        await self.client.patch(
+            f"/webhooks/{application_id}/{token}/messages/@original",
+            json=data,
+            auth=False,
+        )
+
+    async def close(self) -> None:
+        # クライアントは共有なので呼び出し側で閉じる
+        pass
+
+
+class StubFollowupSender:
+    """送信内容を記録するだけのスタブ（テスト・ベンチマーク用）"""
+
+    def __init__(self):
+        self.sent: List[Tuple[str, str, Dict[str, Any]]] = []
+        self.event = asyncio.Event()
+
+    async def edit_original(
+        self, application_id: str, token: str, data: Dict[str, Any]
+    ) -> None:
+        self.sent.append((application_id, token, data))
+        self.event.set()
+
+    async def close(self) -> None:
+        pass
+
+
+class JobPool:
+    """上限付きのワーカープール（コマンドごとの同時実行数制限付き）
+
+    同時実行数に空きがあるコマンドのジョブだけをワーカーのキューに入れ、
+    空きが無いジョブはコマンドごとの待ち行列に置きます。上限に達したコマンドの
+    ジョブがワーカーを占有して、ほかのコマンドが待たされることはありません。
+    """
+
+    def __init__(
+        self,
+        sender,
+        workers: int = 8,
+        queue_size: int = 256,
+        limits: Optional[Dict[str, int]] = None,
+    ):
+        self.sender = sender
+        self.workers = workers
+        self.limits = limits or {}
+        # 実行できるジョブ（同時実行数の枠を取ったもの）
+        self._queue: Optional[asyncio.Queue] = None
+        self._queue_size = queue_size
+        self._tasks: List[asyncio.Task] = []
+        # コマンド -> 枠を取っているジョブ数 / 枠が空くのを待っているジョブ
+        self._active: Dict[str, int] = {}
+        self._waiting: Dict[str, deque] = {}
+        self._backlog = 0
+
+    @classmethod
+    def from_env(cls, sender) -> "JobPool":
+        limits = {}
+        for item in os.getenv("DEFERRED_LIMITS", "").split(","):
+            name, sep, value = item.partition("=")
+            if sep:
+                limits[name.strip()] = int(value)
+        return cls(
+            sender,
+            workers=int(os.getenv("DEFERRED_WORKERS", "8")),
+            limits=limits,
+        )
+
+    @property
+    def pending(self) -> int:
+        """まだ実行を始めていないジョブの数"""
+        return self._queue.qsize() + self._backlog if self._queue is not None else 0
+
+    def _start(self) -> None:
+        # 上限は submit で待ち行列と合わせて確認する
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+
+    def submit(self, command: str, job: Job, application_id: str, token: str) -> bool:
+        """ジョブを積む。キューが満杯なら False を返す"""
+        if self._queue is None:
+            self._start()
+        if self.pending >= self._queue_size:
+            return False
+        item = (command, job, application_id, token)
+        active = self._active.get(command, 0)
+        if active < self.limits.get(command, self.workers):
+            self._active[command] = active + 1
+            self._queue.put_nowait(item)
+        else:
+            self._waiting.setdefault(command, deque()).append(item)
+            self._backlog += 1
+        return True
+
+    def _release(self, command: str) -> None:
+        # 同じコマンドの待っているジョブがあれば枠をそのまま渡す
+        waiting = self._waiting.get(command)
+        if waiting:
+            self._backlog -= 1
+            self._queue.put_nowait(waiting.popleft())
+            if not waiting:
+                del self._waiting[command]
+            return
+        self._active[command] -= 1
+        if not self._active[command]:
+            del self._active[command]
+
+    async def _worker(self) -> None:
+        while True:
+            command, job, application_id, token = await self._queue.get()
+            try:
+                try:
+                    result = await job()
+                    data = result.get("data") or {}
+                except Exception as e:
+                    logger.exception(
+                        "遅延コマンドの実行に失敗しました: %s", e,
+                        extra={"command": command},
+                    )
+                    data = {"content": "エラーが発生しました。"}
+                await self.sender.edit_original(application_id, token, data)
+            except Exception as e:
+                logger.exception(
+                    "フォローアップの送信に失敗しました: %s", e, extra={"command": command}
+                )
+            finally:
+                # task_done の前に次のジョブを入れるので、join は待ち行列の分も待つ
+                self._release(command)
+                self._queue.task_done()
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """残っているジョブを待ってから停止する"""
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    "遅延ジョブの完了待ちがタイムアウトしました",
+                    extra={"pending": self.pending},
+                )
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._queue = None
+            self._tasks = []
+            self._active = {}
+            self._waiting = {}
+            self._backlog = 0
+        await self.sender.close()
+
+
+def deferred_commands() -> set:
+    """DEFERRED_COMMANDS で指定されたコマンド名"""
+    names = os.getenv("DEFERRED_COMMANDS", "").split(",")
+    return {name.strip() for name in names if name.strip()}
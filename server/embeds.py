@@ -0,0 +1,228 @@
+"""
+埋め込みのテンプレート
+フィールドの並び（名前・値の書式・inline）を一度だけコンパイルしておき、
+描画時は値を埋めるだけにします。プレースホルダーの無いフィールドは
+コンパイル時に作ったものを使い回し、スノーフレークIDから求める日付は
+IDごとにキャッシュします。ゲートウェイ（bot.to_embed で discord.Embed に変換）と
+Webhook（dictのまま）のどちらでも同じテンプレートを使います。
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from metadata_cache import snowflake_time
+
+# 埋め込みの色（discord.Color.blue() / green() と同じ）
+BLUE = 0x3498DB
+GREEN = 0x2ECC71
+
+DATE_FORMAT = "%Y年%m月%d日"
+DATETIME_FORMAT = "%Y年%m月%d日 %H:%M"
+
+# 一覧ページ1枚あたりの行数
+PAGE_SIZE = 20
+
+Values = Mapping[str, Any]
+
+
+@lru_cache(maxsize=4096)
+def snowflake_date(snowflake: int, fmt: str = DATE_FORMAT) -> str:
+    """スノーフレークIDの作成日時を書式化する（IDごとにキャッシュ）"""
+    return snowflake_time(snowflake).strftime(fmt)
+
+
+@lru_cache(maxsize=4096)
+def format_datetime(value: datetime, fmt: str = DATE_FORMAT) -> str:
+    """日時を書式化する（参加日など、同じ値ならキャッシュを使う）"""
+    return value.strftime(fmt)
+
+
+def _compile(template: str) -> Tuple[Optional[Callable[[Values], str]], Tuple[str, ...]]:
+    """書式文字列を値から文字列を作る関数に変換する（固定文字列なら None）"""
+    parsed = list(Formatter().parse(template))
+    keys = tuple(name for _, name, _, _ in parsed if name is not None)
+    if not keys:
+        return None, keys
+    if len(parsed) == 1 and not parsed[0][0] and not parsed[0][2] and not parsed[0][3]:
+        # "{name}" だけなら format を通さない
+        key = keys[0]
+        return lambda values: str(values[key]), keys
+    return template.format_map, keys
+
+
+class Field:
+    """フィールドの定義（optional なら値が None のとき省略する）"""
+
+    __slots__ = ("name", "value", "inline", "optional")
+
+    def __init__(self, name: str, value: str, inline: bool = True, optional: bool = False):
+        self.name = name
+        self.value = value
+        self.inline = inline
+        self.optional = optional
+
+
+class EmbedTemplate:
+    """コンパイル済みの埋め込みのレイアウト"""
+
+    def __init__(
+        self,
+        title: str,
+        fields: Sequence[Field],
+        color: Optional[int] = None,
+        thumbnail: Optional[str] = None,
+    ):
+        self.color = color
+        self._title, _ = _compile(title)
+        self._static_title = title
+        self._thumbnail = _compile(thumbnail) if thumbnail else None
+        # (固定のフィールド or None, 値を作る関数, 名前, inline, 省略判定に使うキー)
+        self._fields: List[tuple] = []
+        for field in fields:
+            render, keys = _compile(field.value)
+            static = None
+            if render is None:
+                static = {"name": field.name, "value": field.value, "inline": field.inline}
+            self._fields.append(
+                (static, render, field.name, field.inline, keys if field.optional else ())
+            )
+
+    def render(
+        self,
+        values: Values,
+        color: Optional[int] = None,
+        timestamp: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """値を埋めて埋め込みのdictを作る"""
+        fields = []
+        for static, render, name, inline, required in self._fields:
+            if required and any(values.get(key) is None for key in required):
+                continue
+            if static is not None:
+                fields.append(static)
+            else:
+                fields.append({"name": name, "value": render(values), "inline": inline})
+
+        embed = {
+            "type": "rich",
+            "title": self._title(values) if self._title else self._static_title,
+        }
+        color = self.color if color is None else color
+        if color is not None:
+            embed["color"] = color
+        embed["fields"] = fields
+        if self._thumbnail is not None:
+            render, keys = self._thumbnail
+            if all(values.get(key) for key in keys):
+                embed["thumbnail"] = {"url": render(values)}
+        if timestamp is not None:
+            embed["timestamp"] = timestamp.isoformat()
+        return embed
+
+
+SERVERINFO = EmbedTemplate(
+    "{name} の情報",
+    [
+        Field("メンバー数", "{member_count}"),
+        Field("サーバーID", "{id}"),
+        Field("作成日", "{created}"),
+        Field("オーナー", "<@{owner_id}>"),
+        Field("チャンネル数", "{channels}"),
+        Field("ロール数", "{roles}"),
+    ],
+    color=BLUE,
+    thumbnail="{icon_url}",
+)
+
+USERINFO = EmbedTemplate(
+    "{display_name} の情報",
+    [
+        Field("ユーザー名", "{name}"),
+        Field("ディスプレイ名", "{display_name}"),
+        Field("ユーザーID", "{id}"),
+        Field("アカウント作成日", "{created}"),
+        Field("サーバー参加日", "{joined}"),
+        Field("ロール数", "{roles}"),
+    ],
+    thumbnail="{avatar_url}",
+)
+
+HERE = EmbedTemplate(
+    "📍 現在の場所情報",
+    [
+        Field("🏰 サーバー", "{server}", inline=False),
+        Field("💬 チャンネル", "{channel}", optional=True),
+        Field("📁 カテゴリ", "{category}", optional=True),
+        Field("📅 チャンネル作成日", "{channel_created}", optional=True),
+        Field("👤 あなた", "**{display_name}**\nID: `{user_id}`", inline=False),
+    ],
+    color=GREEN,
+)
+
+
+def serverinfo_values(
+    guild_id: Any,
+    name: str,
+    member_count: Any,
+    owner_id: Any,
+    channels: int,
+    roles: int,
+    icon_url: Optional[str] = None,
+) -> Dict[str, Any]:
+    return {
+        "id": guild_id,
+        "name": name,
+        "member_count": member_count,
+        "created": snowflake_date(int(guild_id)),
+        "owner_id": owner_id,
+        "channels": channels,
+        "roles": roles,
+        "icon_url": icon_url,
+    }
+
+
+def server_text(name: str, guild_id: Any, member_count: Any) -> str:
+    return f"**{name}**\nID: `{guild_id}`\nメンバー数: {member_count}"
+
+
+def named_text(name: str, item_id: Any, prefix: str = "") -> str:
+    return f"**{prefix}{name}**\nID: `{item_id}`"
+
+
+def channel_text(channel_id: Any) -> str:
+    return (
+        f"💬 <#{channel_id}>\nID: `{channel_id}`\n"
+        f"📅 作成日: {snowflake_date(int(channel_id), DATETIME_FORMAT)}"
+    )
+
+
+def list_pages(title: str, lines: Sequence[str], size: int = PAGE_SIZE) -> List[Tuple[str, Sequence[str]]]:
+    """一覧を size 行ずつのページ（タイトル, 行）に分ける"""
+    return [(title, lines[start:start + size]) for start in range(0, len(lines), size)]
+
+
+def paged_embed(
+    overview: Callable[[], Dict[str, Any]],
+    pages: Sequence[Tuple[str, Sequence[str]]],
+    page: int,
+    color: Optional[int] = None,
+) -> Tuple[Dict[str, Any], int, int]:
+    """page 0 を概要、それ以降を一覧のページとして埋め込みを作る
+
+    範囲外のページは端に寄せ、(埋め込み, ページ, ページ数) を返します。
+    """
+    total = 1 + len(pages)
+    page = min(max(page, 0), total - 1)
+    if page == 0:
+        embed = overview()
+    else:
+        title, lines = pages[page - 1]
+        embed = {"type": "rich", "title": title}
+        if color is not None:
+            embed["color"] = color
+        embed["description"] = "\n".join(lines)
+    if total > 1:
+        embed["footer"] = {"text": f"{page + 1} / {total}"}
+    return embed, page, total
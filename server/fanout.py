@@ -0,0 +1,62 @@
+"""
+上限付きの並行実行
+多数のチャンネルへの送信を、全体の同時実行数とキー（チャンネル）ごとの
+同時実行数を守りながら並行に実行し、終わった順に結果を返します。
+同じチャンネル宛ての項目は順番に実行されるため、待っている間に全体の枠を使いません。
+
+環境変数:
+    BATCH_CONCURRENCY     全体の同時実行数（既定: 16）
+    BATCH_PER_CHANNEL     チャンネルごとの同時実行数（既定: 1）
+"""
+
+import asyncio
+import os
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class FanOut:
+    """全体とキーごとの同時実行数を制限して項目を実行する"""
+
+    def __init__(self, concurrency: int = 16, per_key: int = 1):
+        self.concurrency = concurrency
+        self.per_key = per_key
+
+    @classmethod
+    def from_env(cls) -> "FanOut":
+        return cls(
+            concurrency=int(os.getenv("BATCH_CONCURRENCY", "16")),
+            per_key=int(os.getenv("BATCH_PER_CHANNEL", "1")),
+        )
+
+    async def run(
+        self,
+        items: Sequence[T],
+        run: Callable[[T], Awaitable[R]],
+        key: Callable[[T], Hashable],
+    ) -> AsyncIterator[Tuple[int, R]]:
+        """(項目の番号, 結果) を終わった順に返す（run は例外を投げない前提）"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        key_semaphores: Dict[Hashable, asyncio.Semaphore] = {}
+
+        async def run_one(index: int, item: T) -> Tuple[int, R]:
+            item_key = key(item)
+            key_semaphore = key_semaphores.get(item_key)
+            if key_semaphore is None:
+                key_semaphore = key_semaphores[item_key] = asyncio.Semaphore(self.per_key)
+            # キーの順番が来てから全体の枠を取る
+            async with key_semaphore:
+                async with semaphore:
+                    return index, await run(item)
+
+        tasks = [asyncio.create_task(run_one(i, item)) for i, item in enumerate(items)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # 途中で切断された場合は残りを止める
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
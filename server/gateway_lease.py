@@ -0,0 +1,278 @@
+"""
+ゲートウェイのシャード所有権
+uvicorn を複数ワーカーで動かしても、1つのシャードに接続するプロセスが1つだけに
+なるよう、シャードごとにロック（ローカルのファイルロック、または共有ストアのリース）を
+取ってから接続します。シャードを取れなかったプロセスはHTTPだけを処理し、
+一定間隔で空いたシャードが無いか確認します。
+
+環境変数:
+    SHARD_COUNT             シャードの総数（指定すると AutoShardedBot を使う）
+    SHARD_IDS               このプロセスが担当できるシャード（例: 0-3 / 0,2,4、既定: 全シャード）
+    GATEWAY_MAX_SHARDS      1プロセスが接続するシャード数の上限（既定: 上限なし）
+    GATEWAY_LEASE           所有権の取り方（file / redis / none、既定: file）
+    GATEWAY_LOCK_DIR        ファイルロックを置くディレクトリ（既定: 一時ディレクトリ）
+    GATEWAY_LEASE_URL       redis の場合の接続先
+    GATEWAY_LEASE_TTL       リースの有効期間（秒、既定: 30）
+    GATEWAY_RETRY_INTERVAL  シャードを取れなかったときの再試行間隔（秒、既定: 15）
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from applog import get_logger
+
+logger = get_logger("gateway")
+
+
+def parse_shard_ids(value: Optional[str], shard_count: Optional[int]) -> List[int]:
+    """"0-3" や "0,2,4" をシャードIDのリストにする（未指定なら全シャード）"""
+    if not value or not value.strip():
+        return list(range(shard_count or 1))
+    shard_ids = set()
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        start, sep, end = item.partition("-")
+        if sep:
+            shard_ids.update(range(int(start), int(end) + 1))
+        else:
+            shard_ids.add(int(item))
+    if shard_count is not None:
+        invalid = [shard_id for shard_id in shard_ids if shard_id >= shard_count]
+        if invalid:
+            raise ValueError(f"SHARD_COUNT を超えるシャードIDです: {invalid}")
+    return sorted(shard_ids)
+
+
+class NoLease:
+    """所有権を管理しない（常に取得できる）"""
+
+    name = "none"
+
+    async def acquire(self, shard_id: int) -> bool:
+        return True
+
+    async def renew(self, shard_id: int) -> bool:
+        return True
+
+    async def release(self, shard_id: int) -> None:
+        pass
+
+
+class FileLease:
+    """同じホスト上のプロセス間で flock を使って所有権を取る
+
+    ロックはプロセスが終了するとOSが解放するため、更新は不要です。
+    """
+
+    name = "file"
+
+    def __init__(self, directory: str, namespace: str):
+        self.directory = directory
+        self.namespace = namespace
+        self._files: Dict[int, int] = {}
+
+    def _path(self, shard_id: int) -> str:
+        return os.path.join(self.directory, f"botdiscord-{self.namespace}-shard{shard_id}.lock")
+
+    async def acquire(self, shard_id: int) -> bool:
+        import fcntl
+
+        if shard_id in self._files:
+            return True
+        fd = os.open(self._path(shard_id), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._files[shard_id] = fd
+        return True
+
+    async def renew(self, shard_id: int) -> bool:
+        return shard_id in self._files
+
+    async def release(self, shard_id: int) -> None:
+        import fcntl
+
+        fd = self._files.pop(shard_id, None)
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+# 自分のリースのときだけ延長・削除する
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLease:
+    """Redis互換ストアのTTL付きキーで所有権を取る（複数ホスト向け）"""
+
+    name = "redis"
+
+    def __init__(self, url: str, namespace: str, ttl: float = 30.0):
+        import redis.asyncio as redis
+
+        self._client = redis.from_url(url)
+        self.namespace = namespace
+        self.ttl = ttl
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+
+    def _key(self, shard_id: int) -> str:
+        return f"botdiscord:gateway:{self.namespace}:shard{shard_id}"
+
+    async def acquire(self, shard_id: int) -> bool:
+        return bool(
+            await self._client.set(
+                self._key(shard_id), self.owner, nx=True, px=int(self.ttl * 1000)
+            )
+        )
+
+    async def renew(self, shard_id: int) -> bool:
+        return bool(
+            await self._client.eval(
+                _RENEW_SCRIPT, 1, self._key(shard_id), self.owner, int(self.ttl * 1000)
+            )
+        )
+
+    async def release(self, shard_id: int) -> None:
+        await self._client.eval(_RELEASE_SCRIPT, 1, self._key(shard_id), self.owner)
+
+
+class GatewayCoordinator:
+    """このプロセスが接続するシャードを決める"""
+
+    def __init__(
+        self,
+        lease,
+        candidates: List[int],
+        shard_count: Optional[int] = None,
+        max_shards: Optional[int] = None,
+        retry_interval: float = 15.0,
+    ):
+        self.lease = lease
+        self.candidates = candidates
+        self.shard_count = shard_count
+        self.max_shards = max_shards
+        self.retry_interval = retry_interval
+        self.owned: List[int] = []
+
+    @classmethod
+    def from_env(cls, token: Optional[str]) -> "GatewayCoordinator":
+        shard_count = int(os.environ["SHARD_COUNT"]) if os.getenv("SHARD_COUNT") else None
+        # 同じホストで別のBotを動かしても衝突しないようトークンから名前空間を作る
+        namespace = hashlib.sha256((token or "").encode()).hexdigest()[:12]
+        kind = os.getenv("GATEWAY_LEASE", "file")
+        if kind == "redis":
+            lease = RedisLease(
+                os.environ["GATEWAY_LEASE_URL"],
+                namespace,
+                ttl=float(os.getenv("GATEWAY_LEASE_TTL", "30")),
+            )
+        elif kind == "file":
+            lease = FileLease(
+                os.getenv("GATEWAY_LOCK_DIR") or tempfile.gettempdir(), namespace
+            )
+        else:
+            lease = NoLease()
+        max_shards = os.getenv("GATEWAY_MAX_SHARDS")
+        return cls(
+            lease,
+            parse_shard_ids(os.getenv("SHARD_IDS"), shard_count),
+            shard_count=shard_count,
+            max_shards=int(max_shards) if max_shards else None,
+            retry_interval=float(os.getenv("GATEWAY_RETRY_INTERVAL", "15")),
+        )
+
+    @property
+    def sharded(self) -> bool:
+        return self.shard_count is not None
+
+    @property
+    def role(self) -> str:
+        return "owner" if self.owned else "standby"
+
+    def owns(self, shard_id: int) -> bool:
+        return shard_id in self.owned
+
+    async def claim(self) -> List[int]:
+        """空いているシャードの所有権を取る"""
+        for shard_id in self.candidates:
+            if self.max_shards is not None and len(self.owned) >= self.max_shards:
+                break
+            if shard_id in self.owned:
+                continue
+            try:
+                acquired = await self.lease.acquire(shard_id)
+            except Exception as e:
+                logger.warning("シャードの所有権を確認できませんでした: %s", e)
+                break
+            if acquired:
+                self.owned.append(shard_id)
+        self.owned.sort()
+        return self.owned
+
+    async def wait_for_shards(self, stopped: Callable[[], bool]) -> List[int]:
+        """シャードを1つ以上取れるまで待つ（stopped() が真になったら空のリストを返す）"""
+        while not stopped():
+            if await self.claim():
+                logger.info("ゲートウェイに接続します", extra={"shards": self.owned})
+                return self.owned
+            logger.info(
+                "他のプロセスがゲートウェイに接続しています",
+                extra={"retry_interval": self.retry_interval},
+            )
+            await asyncio.sleep(self.retry_interval)
+        return []
+
+    async def keep_alive(self, on_lost: Callable[[], Awaitable[None]]) -> None:
+        """リースを定期的に延長し、失ったら on_lost を呼ぶ"""
+        if not isinstance(self.lease, RedisLease):
+            return
+        while True:
+            await asyncio.sleep(self.lease.ttl / 3)
+            for shard_id in list(self.owned):
+                try:
+                    renewed = await self.lease.renew(shard_id)
+                except Exception as e:
+                    logger.warning("リースの延長に失敗しました: %s", e)
+                    continue
+                if not renewed:
+                    logger.error("シャードの所有権を失いました", extra={"shard": shard_id})
+                    self.owned.remove(shard_id)
+                    await on_lost()
+                    return
+
+    async def release_all(self) -> None:
+        for shard_id in self.owned:
+            try:
+                await self.lease.release(shard_id)
+            except Exception as e:
+                logger.warning("シャードの所有権を解放できませんでした: %s", e)
+        self.owned = []
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "role": self.role,
+            "lease": self.lease.name,
+            "shard_count": self.shard_count,
+            "shards": self.owned,
+        }
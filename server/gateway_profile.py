@@ -0,0 +1,199 @@
+"""
+ゲートウェイのインテントとキャッシュの設定
+大きなギルドではメンバーとメッセージのキャッシュがメモリと起動時間の大半を占めるため、
+用途に合わせてプロファイルを選べるようにします。キャッシュに無いメンバー・ユーザーは
+必要なときにREST APIで取得し、小さなLRUに保持します。
+
+    minimal   guilds インテントのみ。メンバー・メッセージをキャッシュせず、チャンクもしない（既定）
+    balanced  既定のインテント（message_content なし）。メッセージはキャッシュせず、チャンクは必要時のみ
+    full      変更前と同じ設定（message_content あり、メッセージ1000件、members インテントがあれば起動時にチャンク）
+
+環境変数:
+    GATEWAY_PROFILE         プロファイル名（既定: minimal）
+    GATEWAY_MEMBERS_INTENT  members インテント（特権）を追加する（Developer Portal で有効化が必要）
+    MEMBER_CACHE_SIZE       必要時に取得したメンバー・ユーザーを保持する件数（既定: 256）
+"""
+
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set
+
+import discord
+
+from applog import get_logger
+
+logger = get_logger("gateway")
+
+MINIMAL = "minimal"
+BALANCED = "balanced"
+FULL = "full"
+
+# チャンクの方法
+CHUNK_STARTUP = "startup"
+CHUNK_LAZY = "lazy"
+CHUNK_OFF = "off"
+
+
+class GatewayProfile:
+    """commands.Bot に渡すインテントとキャッシュの設定"""
+
+    def __init__(
+        self,
+        name: str,
+        intents: discord.Intents,
+        member_cache_flags: discord.MemberCacheFlags,
+        max_messages: Optional[int],
+        chunk: str,
+    ):
+        self.name = name
+        self.intents = intents
+        self.member_cache_flags = member_cache_flags
+        self.max_messages = max_messages
+        self.chunk = chunk
+
+    @classmethod
+    def from_name(cls, name: str, members_intent: bool = False) -> "GatewayProfile":
+        if name == FULL:
+            intents = discord.Intents.default()
+            intents.message_content = True
+            intents.members = members_intent
+            # チャンクには members インテントが必要（discord.py の既定と同じ）
+            chunk = CHUNK_STARTUP if members_intent else CHUNK_OFF
+            return cls(name, intents, discord.MemberCacheFlags.from_intents(intents), 1000, chunk)
+        if name == BALANCED:
+            intents = discord.Intents.default()
+            intents.members = members_intent
+            return cls(
+                name, intents, discord.MemberCacheFlags.from_intents(intents), None, CHUNK_LAZY
+            )
+        if name == MINIMAL:
+            intents = discord.Intents.none()
+            intents.guilds = True
+            intents.members = members_intent
+            return cls(name, intents, discord.MemberCacheFlags.none(), None, CHUNK_OFF)
+        raise ValueError(f"不明なゲートウェイプロファイルです: {name}")
+
+    @classmethod
+    def from_env(cls) -> "GatewayProfile":
+        return cls.from_name(
+            os.getenv("GATEWAY_PROFILE", MINIMAL),
+            members_intent=os.getenv("GATEWAY_MEMBERS_INTENT", "").lower() in ("1", "true", "yes"),
+        )
+
+    def bot_options(self) -> Dict[str, Any]:
+        """commands.Bot / AutoShardedBot のキーワード引数"""
+        return {
+            "intents": self.intents,
+            "member_cache_flags": self.member_cache_flags,
+            "max_messages": self.max_messages,
+            "chunk_guilds_at_startup": self.chunk == CHUNK_STARTUP,
+        }
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "profile": self.name,
+            "intents": self.intents.value,
+            "members_intent": self.intents.members,
+            "max_messages": self.max_messages,
+            "chunk": self.chunk,
+        }
+
+
+class MemberLRU:
+    """キャッシュに無いメンバー・ユーザーをREST APIで取得して保持する"""
+
+    def __init__(self, client: discord.Client, max_entries: int = 256):
+        self.client = client
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._chunk_requested: Set[int] = set()
+        self._chunk_tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_env(cls, client: discord.Client) -> "MemberLRU":
+        return cls(client, int(os.getenv("MEMBER_CACHE_SIZE", "256")))
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _remember(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _get(self, key: Hashable, fetch) -> Any:
+        value = self._entries.get(key)
+        if value is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+        self.misses += 1
+
+        # 同じキーの取得は1回にまとめる
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            try:
+                value = await fetch()
+            except discord.NotFound:
+                value = None
+            if value is not None:
+                self._remember(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            del self._inflight[key]
+
+    async def user(self, user_id: int) -> Optional[discord.User]:
+        """ゲートウェイのキャッシュ、LRU、REST APIの順にユーザーを探す"""
+        user = self.client.get_user(user_id)
+        if user is not None:
+            return user
+        return await self._get(("user", user_id), lambda: self.client.fetch_user(user_id))
+
+    async def member(self, guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
+        """ゲートウェイのキャッシュ、LRU、REST APIの順にメンバーを探す"""
+        member = guild.get_member(user_id)
+        if member is not None:
+            return member
+        return await self._get(
+            ("member", guild.id, user_id), lambda: guild.fetch_member(user_id)
+        )
+
+    def request_chunk(self, guild: Optional[discord.Guild]) -> None:
+        """必要時チャンク: ギルドで最初に使われたときにバックグラウンドでメンバーを取得する"""
+        if (
+            guild is None
+            or guild.chunked
+            or guild.id in self._chunk_requested
+            or not self.client.intents.members
+        ):
+            return
+        self._chunk_requested.add(guild.id)
+        # タスクは終わるまで参照を保持する（途中でGCされないように）
+        task = asyncio.create_task(self._chunk(guild))
+        self._chunk_tasks.add(task)
+        task.add_done_callback(self._chunk_tasks.discard)
+
+    async def _chunk(self, guild: discord.Guild) -> None:
+        try:
+            await guild.chunk(cache=True)
+        except Exception as e:
+            self._chunk_requested.discard(guild.id)
+            logger.warning("メンバーを取得できませんでした: %s", e, extra={"guild_id": guild.id})
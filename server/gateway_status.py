@@ -0,0 +1,183 @@
+"""
+Botの状態のスナップショット
+ギルド数・メンバー数・シャードの状態をゲートウェイのイベントで増減させておき、
+/bot/status と /health では保持している値を返すだけにします。bot.guilds や
+bot.users はキャッシュからリストを作るため、ユーザー数に比例した時間がかかります。
+
+メンバー数はギルドの member_count の合計（同じユーザーが複数のギルドにいれば重複して
+数える）で、参加・退出は members インテントがある場合だけ反映されます。ユーザー数は
+キャッシュにいるユーザーの数で、イベントのたびに辞書の大きさだけを読みます。
+
+ready は全シャードが接続している間だけ True で、切断されると False に戻ります。
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+import discord
+
+
+def _last_ack_age(ws) -> Optional[float]:
+    """最後のハートビートACKからの経過秒数（discord.py の内部の値を読む）"""
+    keep_alive = getattr(ws, "_keep_alive", None)
+    last_ack = getattr(keep_alive, "_last_ack", None)
+    if last_ack is None:
+        return None
+    return round(time.perf_counter() - last_ack, 3)
+
+
+class GatewayStatus:
+    """ゲートウェイのイベントから状態を集計する"""
+
+    def __init__(self, client: discord.Client):
+        self.client = client
+        self.sharded = isinstance(client, discord.AutoShardedClient)
+        self.ready = False
+        self.user: Optional[discord.ClientUser] = None
+        self.guilds = 0
+        self.unavailable_guilds = 0
+        self.members = 0
+        self.users = 0
+        self.ready_at: Optional[float] = None
+        self.resumed_at: Optional[float] = None
+        # シャードID -> {"connected": bool, "ready": bool}
+        self.shards: Dict[int, Dict[str, bool]] = {}
+        self._snapshot: Optional[Dict[str, Any]] = None
+
+        listeners = {
+            "on_ready": self._on_ready,
+            "on_resumed": self._on_resumed,
+            "on_guild_join": self._on_guild_join,
+            "on_guild_remove": self._on_guild_remove,
+            "on_guild_available": self._on_guild_available,
+            "on_guild_unavailable": self._on_guild_unavailable,
+            "on_member_join": self._on_member_join,
+            "on_member_remove": self._on_member_remove,
+        }
+        if self.sharded:
+            listeners.update({
+                "on_shard_connect": self._on_shard_connect,
+                "on_shard_disconnect": self._on_shard_disconnect,
+                "on_shard_ready": self._on_shard_ready,
+                "on_shard_resumed": self._on_shard_resumed,
+            })
+        else:
+            # シャードを使わない場合はシャード0として扱う
+            listeners.update({
+                "on_connect": lambda: self._on_shard_connect(0),
+                "on_disconnect": lambda: self._on_shard_disconnect(0),
+            })
+        for name, listener in listeners.items():
+            client.add_listener(self._wrap(listener), name)
+
+    def _wrap(self, listener):
+        async def handler(*args):
+            listener(*args)
+            self.users = self._user_count()
+            # 次の参照でスナップショットを作り直す
+            self._snapshot = None
+
+        return handler
+
+    def _shard(self, shard_id: int) -> Dict[str, bool]:
+        shard = self.shards.get(shard_id)
+        if shard is None:
+            shard = self.shards[shard_id] = {"connected": False, "ready": False}
+        return shard
+
+    def _user_count(self) -> int:
+        # bot.users はリストを作るため、discord.py の内部の辞書の大きさを読む
+        users = getattr(getattr(self.client, "_connection", None), "_users", None)
+        return len(users) if users is not None else 0
+
+    def _update_ready(self) -> None:
+        # 起動後は全シャードが接続し直したときに ready に戻す
+        if self.ready_at is not None:
+            self.ready = all(shard["ready"] for shard in self.shards.values())
+
+    def _recount(self) -> None:
+        # READY（RESUME できずに接続し直した場合を含む）のときだけ全ギルドを数え直す
+        guilds = self.client.guilds
+        self.guilds = len(guilds)
+        self.unavailable_guilds = sum(1 for guild in guilds if guild.unavailable)
+        self.members = sum(guild.member_count or 0 for guild in guilds)
+
+    def _on_ready(self) -> None:
+        self.ready = True
+        self.ready_at = time.time()
+        self.user = self.client.user
+        self._recount()
+        if not self.sharded:
+            self._shard(0).update(connected=True, ready=True)
+
+    def _on_resumed(self) -> None:
+        self.resumed_at = time.time()
+        if not self.sharded:
+            self._shard(0).update(connected=True, ready=True)
+            self._update_ready()
+
+    def _on_guild_join(self, guild: discord.Guild) -> None:
+        self.guilds += 1
+        self.members += guild.member_count or 0
+
+    def _on_guild_remove(self, guild: discord.Guild) -> None:
+        self.guilds -= 1
+        self.members -= guild.member_count or 0
+
+    def _on_guild_available(self, guild: discord.Guild) -> None:
+        self.unavailable_guilds = max(self.unavailable_guilds - 1, 0)
+
+    def _on_guild_unavailable(self, guild: discord.Guild) -> None:
+        self.unavailable_guilds += 1
+
+    def _on_member_join(self, member: discord.Member) -> None:
+        self.members += 1
+
+    def _on_member_remove(self, member: discord.Member) -> None:
+        self.members -= 1
+
+    def _on_shard_connect(self, shard_id: int) -> None:
+        self._shard(shard_id)["connected"] = True
+
+    def _on_shard_disconnect(self, shard_id: int) -> None:
+        self._shard(shard_id).update(connected=False, ready=False)
+        self.ready = False
+
+    def _on_shard_ready(self, shard_id: int) -> None:
+        self._shard(shard_id).update(connected=True, ready=True)
+        if self.ready_at is not None:
+            # 起動後に1つのシャードだけが接続し直した場合
+            self._recount()
+            self._update_ready()
+
+    def _on_shard_resumed(self, shard_id: int) -> None:
+        self._shard(shard_id).update(connected=True, ready=True)
+        self._update_ready()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """集計済みの状態（イベントが届くまでは同じdictを返す）"""
+        if self._snapshot is None:
+            self._snapshot = {
+                "bot_ready": self.ready,
+                "bot_user": str(self.user) if self.user else None,
+                "bot_id": self.user.id if self.user else None,
+                "guilds": self.guilds,
+                "unavailable_guilds": self.unavailable_guilds,
+                "members": self.members,
+                "users": self.users,
+                "ready_at": self.ready_at,
+                "resumed_at": self.resumed_at,
+            }
+        return self._snapshot
+
+    def shard_status(self) -> Dict[str, Dict[str, Any]]:
+        """シャードごとの接続状態と、最後のハートビートACKからの経過秒数"""
+        result = {}
+        for shard_id, shard in self.shards.items():
+            if self.sharded:
+                info = self.client.get_shard(shard_id)
+                ws = info._parent.ws if info is not None else None
+            else:
+                ws = self.client.ws
+            result[str(shard_id)] = dict(shard, heartbeat_ack_age=_last_ack_age(ws))
+        return result
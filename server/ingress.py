@@ -0,0 +1,140 @@
+"""
+インタラクションWebhookの入口での検査
+署名ヘッダーの有無・形式と Content-Type はボディを読む前に確認し、ボディは
+上限を超えた時点で読むのをやめて拒否します。壊れたリクエストや巨大なリクエストに
+メモリや署名検証・JSONパースの時間を使わないためのASGIミドルウェアです。
+
+環境変数:
+    INTERACTIONS_MAX_BODY   ボディの最大サイズ（バイト、既定: 262144）
+"""
+
+import os
+import re
+from typing import Dict, Optional, Sequence
+
+from metrics import INGRESS_REJECTIONS
+
+# Ed25519署名（64バイト）の hex 表現
+_SIGNATURE = re.compile(rb"[0-9a-fA-F]{128}")
+_TIMESTAMP = re.compile(rb"[0-9]{1,20}")
+
+# 拒否の理由
+MISSING_SIGNATURE = "missing_signature"
+MALFORMED_SIGNATURE = "malformed_signature"
+MISSING_TIMESTAMP = "missing_timestamp"
+MALFORMED_TIMESTAMP = "malformed_timestamp"
+CONTENT_TYPE = "content_type"
+CONTENT_LENGTH = "content_length"
+BODY_TOO_LARGE = "body_too_large"
+
+REASONS = (
+    MISSING_SIGNATURE,
+    MALFORMED_SIGNATURE,
+    MISSING_TIMESTAMP,
+    MALFORMED_TIMESTAMP,
+    CONTENT_TYPE,
+    CONTENT_LENGTH,
+    BODY_TOO_LARGE,
+)
+
+# 理由ごとのステータスと応答（HTTPException と同じ形）
+_RESPONSES = {
+    MISSING_SIGNATURE: (401, b'{"detail":"Unauthorized"}'),
+    MALFORMED_SIGNATURE: (401, b'{"detail":"Unauthorized"}'),
+    MISSING_TIMESTAMP: (401, b'{"detail":"Unauthorized"}'),
+    MALFORMED_TIMESTAMP: (401, b'{"detail":"Unauthorized"}'),
+    CONTENT_TYPE: (415, b'{"detail":"Unsupported Media Type"}'),
+    CONTENT_LENGTH: (400, b'{"detail":"Bad Request"}'),
+    BODY_TOO_LARGE: (413, b'{"detail":"Payload Too Large"}'),
+}
+
+
+class IngressGuard:
+    """署名付きWebhookのリクエストを、ボディを読む前・読みながら検査するASGIミドルウェア"""
+
+    def __init__(self, app, paths: Sequence[str] = ("/interactions",), max_body: Optional[int] = None):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.max_body = max_body if max_body is not None else int(
+            os.getenv("INTERACTIONS_MAX_BODY", "262144")
+        )
+        self._counters = {reason: INGRESS_REJECTIONS.labels(reason) for reason in REASONS}
+
+    def _check_headers(self, headers: Dict[bytes, bytes]) -> Optional[str]:
+        signature = headers.get(b"x-signature-ed25519")
+        if not signature:
+            return MISSING_SIGNATURE
+        if not _SIGNATURE.fullmatch(signature):
+            return MALFORMED_SIGNATURE
+        timestamp = headers.get(b"x-signature-timestamp")
+        if not timestamp:
+            return MISSING_TIMESTAMP
+        if not _TIMESTAMP.fullmatch(timestamp):
+            return MALFORMED_TIMESTAMP
+        content_type = headers.get(b"content-type", b"")
+        if content_type.split(b";", 1)[0].strip().lower() != b"application/json":
+            return CONTENT_TYPE
+        length = headers.get(b"content-length")
+        if length is not None:
+            if not length.isdigit():
+                return CONTENT_LENGTH
+            if int(length) > self.max_body:
+                return BODY_TOO_LARGE
+        return None
+
+    async def _reject(self, send, reason: str) -> None:
+        self._counters[reason].inc()
+        status, body = _RESPONSES[reason]
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] not in self.paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        # ヘッダー名はASGIサーバーが小文字にしている
+        reason = self._check_headers(dict(scope["headers"]))
+        if reason is not None:
+            await self._reject(send, reason)
+            return
+
+        # 上限を超えた時点で読むのをやめる（Content-Length が無い・偽りの場合も）
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body:
+                await self._reject(send, BODY_TOO_LARGE)
+                return
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+
+        body = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay, send)
@@ -0,0 +1,455 @@
+"""
+Webhook経由のインタラクション処理
+/interactions・/discord/interaction・/test-interaction が共有します。
+"""
+
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from autocomplete import Choice, IndexSet, PrefixIndex
+from codec import Encoded
+from components import SERVERINFO_PAGES, USERINFO_PAGES, components, pager
+from deferred import (
+    DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE,
+    JobPool,
+    WebhookFollowupSender,
+    deferred_commands,
+)
+from embeds import (
+    BLUE,
+    DATETIME_FORMAT,
+    HERE,
+    SERVERINFO,
+    USERINFO,
+    channel_text,
+    format_datetime,
+    list_pages,
+    named_text,
+    paged_embed,
+    server_text,
+    serverinfo_values,
+    snowflake_date,
+)
+from metadata_cache import MetadataCache
+from metrics import AUTOCOMPLETE_LATENCY, COMMAND_LATENCY, register_cache
+from registry import HTTP, registry
+from response_cache import ResponseCache
+from rest import DiscordRESTClient
+from throttle import retry_after, throttle
+
+# インタラクションの種類
+PING = 1
+APPLICATION_COMMAND = 2
+MESSAGE_COMPONENT = 3
+APPLICATION_COMMAND_AUTOCOMPLETE = 4
+
+# チャンネルの種類
+GUILD_TEXT = 0
+DM = 1
+GUILD_CATEGORY = 4
+
+# レスポンスの種類
+PONG = 1
+CHANNEL_MESSAGE_WITH_SOURCE = 4
+UPDATE_MESSAGE = 7
+APPLICATION_COMMAND_AUTOCOMPLETE_RESULT = 8
+
+# メッセージのフラグ
+EPHEMERAL = 64
+
+# 固定の応答はエンコード済みで保持する
+PONG_RESPONSE = Encoded({"type": PONG})
+DEFERRED_RESPONSE = Encoded({"type": DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE})
+NO_CHOICES_RESPONSE = Encoded(
+    {"type": APPLICATION_COMMAND_AUTOCOMPLETE_RESULT, "data": {"choices": []}}
+)
+
+
+class InteractionContext:
+    """ハンドラーに渡すインタラクションの情報"""
+
+    def __init__(self, body: Dict[str, Any], via: str, options: Dict[str, Any]):
+        self.body = body
+        self.via = via
+        self.options = options
+
+        # ユーザー情報を正しく取得（サーバー内は member.user、DMは user）
+        member = body.get("member") or {}
+        user_info = member.get("user") or body.get("user") or {}
+        self.user_id = user_info.get("id", "unknown")
+        self.username = user_info.get("username", "Unknown")
+        self.display_name = (
+            member.get("nick") or user_info.get("global_name") or self.username
+        )
+        self.guild_id = body.get("guild_id")
+        self.channel_id = body.get("channel_id")
+
+
+def message(content: str) -> Dict[str, Any]:
+    """チャンネルメッセージのレスポンスを作る"""
+    return {"type": CHANNEL_MESSAGE_WITH_SOURCE, "data": {"content": content}}
+
+
+def ephemeral(content: str) -> Dict[str, Any]:
+    """実行したユーザーにだけ見えるメッセージのレスポンスを作る"""
+    return {
+        "type": CHANNEL_MESSAGE_WITH_SOURCE,
+        "data": {"content": content, "flags": EPHEMERAL},
+    }
+
+
+def throttled(wait: float) -> Dict[str, Any]:
+    """流量制限に掛かったときの応答（実行したユーザーにだけ見える）"""
+    return ephemeral(f"操作が多すぎます。{retry_after(wait)}秒後にもう一度お試しください。")
+
+
+# Discord REST APIクライアント（接続プールを共有する）
+rest = DiscordRESTClient.from_env()
+
+# 遅延実行のワーカープール
+job_pool = JobPool.from_env(WebhookFollowupSender(rest))
+_deferred_by_env = deferred_commands()
+
+
+def is_deferred(name: str) -> bool:
+    """コマンドを遅延実行するかどうか"""
+    spec = registry.spec(name)
+    return name in _deferred_by_env or (spec is not None and spec.deferred)
+
+
+# ギルド・チャンネル情報のキャッシュ（HTTPモードでREST APIの呼び出しを減らす）
+metadata = MetadataCache.from_env(rest.fetch)
+register_cache("metadata", metadata)
+
+# 入力だけで決まる応答のキャッシュ
+response_cache = ResponseCache.from_env()
+register_cache("responses", response_cache)
+
+# コマンドごとの処理時間（ホットパスでラベルを作らないよう事前に用意する）
+_command_latency = {
+    spec.name: COMMAND_LATENCY.labels(spec.name) for spec in registry.specs
+}
+_autocomplete_latency = {
+    spec.name: AUTOCOMPLETE_LATENCY.labels(spec.name)
+    for spec in registry.specs
+    if any(option.get("autocomplete") for option in spec.options)
+}
+
+
+async def _run(name: str, handler, ctx: "InteractionContext") -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        return await handler(ctx)
+    finally:
+        _command_latency[name].observe(time.perf_counter() - start)
+
+
+async def dispatch_interaction(body: Dict[str, Any], via: str) -> Dict[str, Any]:
+    """インタラクションを処理してレスポンスを返す"""
+    interaction_type = body.get("type")
+
+    # DiscordのPINGリクエスト（type: 1）を処理
+    if interaction_type == PING:
+        return PONG_RESPONSE
+
+    # スラッシュコマンド（type: 2）を処理
+    if interaction_type == APPLICATION_COMMAND:
+        data = body.get("data") or {}
+        handler, options = registry.resolve(HTTP, data)
+        if handler is None:
+            return message(f"コマンド '{data.get('name', '')}' は認識されませんでした。")
+        name = data["name"]
+        ctx = InteractionContext(body, via, options)
+        wait = await throttle.check(ctx.user_id, ctx.guild_id, name)
+        if wait:
+            return throttled(wait)
+
+        # 遅延実行するコマンドはすぐに type 5 を返し、結果はフォローアップで送る
+        if is_deferred(name) and body.get("token") and body.get("application_id"):
+            if job_pool.submit(
+                name, lambda: _run(name, handler, ctx), body["application_id"], body["token"]
+            ):
+                return DEFERRED_RESPONSE
+        return await _run(name, handler, ctx)
+
+    # ボタン・セレクトメニュー（type: 3）は custom_id からハンドラーと状態を取り出す
+    if interaction_type == MESSAGE_COMPONENT:
+        data = body.get("data") or {}
+        handler, state = components.resolve(HTTP, data.get("custom_id") or "")
+        if handler is None:
+            return ephemeral("この操作は使用できません。")
+        ctx = InteractionContext(body, via, {"values": data.get("values") or []})
+        wait = await throttle.check(ctx.user_id, ctx.guild_id)
+        if wait:
+            return throttled(wait)
+        return await handler(ctx, *state)
+
+    # オートコンプリート（type: 4）は入力のたびに届くため、候補だけをすぐに返す
+    # （流量制限の対象外。コマンドの実行時に確認する）
+    if interaction_type == APPLICATION_COMMAND_AUTOCOMPLETE:
+        data = body.get("data") or {}
+        handler, value, options = registry.resolve_autocomplete(HTTP, data)
+        if handler is None:
+            return NO_CHOICES_RESPONSE
+        name = data["name"]
+        latency = _autocomplete_latency.get(name)
+        if latency is None:
+            latency = _autocomplete_latency[name] = AUTOCOMPLETE_LATENCY.labels(name)
+        start = time.perf_counter()
+        try:
+            choices = await handler(InteractionContext(body, via, options), value)
+        finally:
+            latency.observe(time.perf_counter() - start)
+        return {
+            "type": APPLICATION_COMMAND_AUTOCOMPLETE_RESULT,
+            "data": {"choices": choices},
+        }
+
+    return message("不明なインタラクションタイプです。")
+
+
+@registry.handler(HTTP, "ping")
+@response_cache.cached(key=lambda ctx: ctx.via)
+async def ping(ctx: InteractionContext) -> Dict[str, Any]:
+    return message(f"🏓 Pong! {ctx.via}で応答しました")
+
+
+@registry.handler(HTTP, "hello")
+@response_cache.cached(key=lambda ctx: ctx.user_id, ttl=3600)
+async def hello(ctx: InteractionContext) -> Dict[str, Any]:
+    return message(f"こんにちは、<@{ctx.user_id}>さん！")
+
+
+def embed_response(
+    embed: Dict[str, Any],
+    rows: Optional[List[Dict[str, Any]]] = None,
+    response_type: int = CHANNEL_MESSAGE_WITH_SOURCE,
+) -> Dict[str, Any]:
+    """埋め込み1件（とボタンの行）のレスポンスを作る。UPDATE_MESSAGE なら元のメッセージを書き換える"""
+    data = {"embeds": [embed]}
+    if rows:
+        data["components"] = rows
+    return {"type": response_type, "data": data}
+
+
+async def _lookup(coro) -> Optional[Any]:
+    """キャッシュから取得する。失敗した場合は None を返す"""
+    try:
+        return await coro
+    except Exception:
+        return None
+
+
+async def serverinfo_embed(guild_id: str) -> Optional[Dict[str, Any]]:
+    """キャッシュしたギルド情報からサーバー情報の埋め込みを作る"""
+    guild = await _lookup(metadata.guild(guild_id))
+    if guild is None:
+        return None
+    channels = await _lookup(metadata.guild_channels(guild_id)) or []
+
+    icon_url = None
+    if guild.get("icon"):
+        icon_url = f"https://cdn.discordapp.com/icons/{guild['id']}/{guild['icon']}.png"
+    return SERVERINFO.render(
+        serverinfo_values(
+            guild["id"],
+            guild["name"],
+            guild.get("approximate_member_count", "不明"),
+            guild["owner_id"],
+            len(channels),
+            len(guild.get("roles", [])),
+            icon_url,
+        )
+    )
+
+
+async def serverinfo_page(guild_id: str, page: int, response_type: int) -> Dict[str, Any]:
+    """サーバー情報のページ（概要・チャンネル一覧・ロール一覧）"""
+    embed = await serverinfo_embed(guild_id)
+    if embed is None:
+        return message("サーバー情報を取得できませんでした。")
+    guild = await _lookup(metadata.guild(guild_id)) or {}
+    channels = await _lookup(metadata.guild_channels(guild_id)) or []
+
+    pages = list_pages(
+        "チャンネル一覧",
+        [f"<#{channel['id']}>" for channel in channels if channel.get("type") != GUILD_CATEGORY],
+    ) + list_pages(
+        # @everyone（ギルドIDと同じID）は除く
+        "ロール一覧",
+        [f"<@&{role['id']}>" for role in guild.get("roles", []) if role["id"] != guild_id],
+    )
+    embed, page, total = paged_embed(lambda: embed, pages, page, color=BLUE)
+    return embed_response(
+        embed, pager(SERVERINFO_PAGES, page=page, total=total), response_type
+    )
+
+
+@registry.handler(HTTP, "serverinfo")
+async def serverinfo(ctx: InteractionContext) -> Dict[str, Any]:
+    if not ctx.guild_id:
+        return message("このコマンドはサーバー内でのみ使用できます。")
+    return await serverinfo_page(ctx.guild_id, 0, CHANNEL_MESSAGE_WITH_SOURCE)
+
+
+@components.handler(HTTP, SERVERINFO_PAGES, int)
+async def serverinfo_pages(ctx: InteractionContext, page: int) -> Dict[str, Any]:
+    if not ctx.guild_id:
+        return ephemeral("この操作は使用できません。")
+    return await serverinfo_page(ctx.guild_id, page, UPDATE_MESSAGE)
+
+
+def userinfo_page(
+    user: Dict[str, Any], member: Optional[Dict[str, Any]], page: int, response_type: int
+) -> Dict[str, Any]:
+    """ユーザー情報のページ（概要・ロール一覧）"""
+    member = member or {}
+    role_ids = member.get("roles") or []
+
+    def overview() -> Dict[str, Any]:
+        joined_at = member.get("joined_at")
+        avatar = user.get("avatar")
+        return USERINFO.render({
+            "name": user.get("username", "Unknown"),
+            "display_name": (
+                member.get("nick") or user.get("global_name") or user.get("username", "Unknown")
+            ),
+            "id": user["id"],
+            "created": snowflake_date(int(user["id"])),
+            "joined": format_datetime(datetime.fromisoformat(joined_at)) if joined_at else "不明",
+            "roles": len(role_ids),
+            "avatar_url": (
+                f"https://cdn.discordapp.com/avatars/{user['id']}/{avatar}.png" if avatar else None
+            ),
+        })
+
+    pages = list_pages("ロール一覧", [f"<@&{role_id}>" for role_id in role_ids])
+    embed, page, total = paged_embed(overview, pages, page)
+    return embed_response(
+        embed, pager(USERINFO_PAGES, int(user["id"]), page=page, total=total), response_type
+    )
+
+
+@registry.handler(HTTP, "userinfo")
+async def userinfo(ctx: InteractionContext) -> Dict[str, Any]:
+    # オプションで指定したユーザーは resolved に、省略時は実行したユーザー
+    user_id = ctx.options.get("user")
+    if user_id:
+        resolved = (ctx.body.get("data") or {}).get("resolved") or {}
+        user = (resolved.get("users") or {}).get(user_id)
+        member = (resolved.get("members") or {}).get(user_id)
+    else:
+        member = ctx.body.get("member")
+        user = (member or {}).get("user") or ctx.body.get("user")
+    if not user:
+        return message("ユーザー情報を取得できませんでした。")
+    return userinfo_page(user, member, 0, CHANNEL_MESSAGE_WITH_SOURCE)
+
+
+@components.handler(HTTP, USERINFO_PAGES, int, int)
+async def userinfo_pages(ctx: InteractionContext, user_id: int, page: int) -> Dict[str, Any]:
+    # クリックには対象ユーザーの情報が含まれないため、キャッシュ経由で取得する
+    member = None
+    if ctx.guild_id:
+        member = await _lookup(metadata.get(f"/guilds/{ctx.guild_id}/members/{user_id}"))
+    user = (member or {}).get("user") or await _lookup(metadata.get(f"/users/{user_id}"))
+    if not user:
+        return ephemeral("ユーザー情報を取得できませんでした。")
+    return userinfo_page(user, member, page, UPDATE_MESSAGE)
+
+
+# 応答に現在時刻が入り、取得に失敗したときはIDだけの応答になるためキャッシュしない
+# （ギルド・チャンネル情報は metadata のキャッシュから取得する）
+@registry.handler(HTTP, "here")
+async def here(ctx: InteractionContext) -> Dict[str, Any]:
+    # サーバー、カテゴリ、チャンネル情報をキャッシュ経由で取得
+    guild = await _lookup(metadata.guild(ctx.guild_id)) if ctx.guild_id else None
+    channel = await _lookup(metadata.channel(ctx.channel_id)) if ctx.channel_id else None
+
+    if (ctx.guild_id and guild is None) or channel is None:
+        # 詳細を取得できない場合はIDだけを返す
+        guild_id = ctx.guild_id or "DM"
+        channel_id = ctx.channel_id or "unknown"
+        return message(
+            f"📍 **現在の場所情報**\n\n🏰 **サーバー**: {guild_id}\n💬 **チャンネル**: <#{channel_id}>\n👤 **ユーザー**: <@{ctx.user_id}>"
+        )
+
+    values = {
+        "server": (
+            server_text(guild["name"], guild["id"], guild.get("approximate_member_count", "不明"))
+            if guild
+            else "DM"
+        ),
+        "channel": None,
+        "category": None,
+        "channel_created": None,
+        "display_name": ctx.display_name,
+        "user_id": ctx.user_id,
+    }
+
+    # チャンネル情報
+    if channel.get("type") == GUILD_TEXT:
+        values["channel"] = named_text(channel["name"], channel["id"], prefix="#")
+
+        # カテゴリ情報
+        parent_id = channel.get("parent_id")
+        category = await _lookup(metadata.channel(parent_id)) if parent_id else None
+        values["category"] = (
+            named_text(category["name"], category["id"]) if category else "なし"
+        )
+
+        # チャンネル作成日
+        values["channel_created"] = snowflake_date(int(channel["id"]), DATETIME_FORMAT)
+    elif channel.get("type") == DM:
+        values["channel"] = "DM"
+        values["category"] = "なし"
+
+    return embed_response(HERE.render(values, timestamp=datetime.now(timezone.utc)))
+
+
+# ギルドごとのチャンネル名のインデックス（チャンネル一覧のキャッシュが更新されたら差分を反映する）
+channel_indexes = IndexSet()
+
+
+def _channel_entries(channels: List[Dict[str, Any]]):
+    return (
+        (channel["name"], channel["id"])
+        for channel in channels
+        if channel.get("type") != GUILD_CATEGORY
+    )
+
+
+async def _channel_index(guild_id: str) -> Optional[PrefixIndex]:
+    channels = await _lookup(metadata.guild_channels(guild_id))
+    if channels is None:
+        return channel_indexes.get(guild_id)
+    return channel_indexes.sync(guild_id, channels, _channel_entries)
+
+
+@registry.autocomplete(HTTP, "channel", option="name")
+async def channel_name(ctx: InteractionContext, value: str) -> List[Choice]:
+    if not ctx.guild_id:
+        return []
+    index = await _channel_index(ctx.guild_id)
+    return index.search(value) if index is not None else []
+
+
+@registry.handler(HTTP, "channel")
+async def channel(ctx: InteractionContext) -> Dict[str, Any]:
+    if not ctx.guild_id:
+        return message("このコマンドはサーバー内でのみ使用できます。")
+
+    # 候補を選んだ場合はチャンネルID、そうでなければ入力した名前が届く
+    value = str(ctx.options.get("name") or "")
+    index = await _channel_index(ctx.guild_id)
+    channel_id = None
+    if index is not None and value:
+        if value in index:
+            channel_id = value
+        else:
+            matches = index.search(value, limit=1)
+            channel_id = matches[0]["value"] if matches else None
+    if channel_id is None:
+        return message(f"チャンネル '{value}' は見つかりませんでした。")
+    return message(channel_text(channel_id))
@@ -0,0 +1,181 @@
+"""
+インタラクションWebhook用の軽量ASGIアプリ
+署名検証とディスパッチだけを読み込み、discord.py やゲートウェイ接続は使いません。
+Vercel ではこのアプリが /interactions を処理します。
+"""
+
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from fastapi import APIRouter, FastAPI, HTTPException, Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+import codec
+from applog import get_logger, setup_logging, shutdown_logging
+from ingress import IngressGuard
+from interactions import dispatch_interaction, job_pool, message, rest
+from metrics import (
+    STALE_TIMESTAMPS,
+    VERIFY_FAILURES,
+    VERIFY_LATENCY,
+    MetricsMiddleware,
+    loop_monitor,
+    register_cache,
+    router as metrics_router,
+)
+from replay import ReplayGuard
+from verifier import SignatureVerifier
+
+# 環境変数を読み込み
+load_dotenv()
+
+# ログ出力（キュー経由でJSON Linesを書き出す）
+setup_logging()
+logger = get_logger("app")
+
+# Discord公開鍵（起動時に一度だけパースする。カンマ区切りで複数指定可）
+verifier = SignatureVerifier.from_env()
+
+# 古いタイムスタンプの拒否と、再送されたインタラクションの重複排除
+replay_guard = ReplayGuard.from_env()
+register_cache("replay", replay_guard)
+
+# メトリクスを記録するルート
+INTERACTION_ROUTES = ("/interactions", "/discord/interaction", "/test-interaction")
+
+
+async def close_interactions() -> None:
+    """インタラクション処理で使うリソースを解放する"""
+    await loop_monitor.stop()
+    await job_pool.close()
+    await rest.close()
+    verifier.close()
+
+
+# リクエストモデル
+class DiscordInteraction(BaseModel):
+    type: int
+    data: Optional[Dict[str, Any]] = None
+    guild_id: Optional[str] = None
+    channel_id: Optional[str] = None
+    user: Optional[Dict[str, Any]] = None
+
+
+router = APIRouter()
+
+
+@router.post("/discord/interaction")
+async def handle_discord_interaction(interaction: DiscordInteraction):
+    """Discordのインタラクションを処理するエンドポイント"""
+    try:
+        return codec.render(
+            await dispatch_interaction(interaction.model_dump(), via="API経由")
+        )
+
+    except Exception as e:
+        get_logger("discord_interaction").exception("インタラクション処理エラー: %s", e)
+        return message("エラーが発生しました。")
+
+
+interaction_logger = get_logger("interactions")
+
+
+@router.post("/interactions")
+async def handle_interactions(request: Request):
+    """Vercel用のインタラクションエンドポイント（署名検証付き）"""
+    try:
+        with verifier.track():
+            # 生のリクエストボディを取得
+            raw_body = await request.body()
+            
+            # 署名ヘッダーを取得
+            signature = request.headers.get("X-Signature-Ed25519")
+            timestamp = request.headers.get("X-Signature-Timestamp")
+            
+            if not signature or not timestamp:
+                interaction_logger.warning("署名ヘッダーが不足しています")
+                raise HTTPException(status_code=401, detail="Unauthorized")
+            
+            # 古いタイムスタンプは署名検証の前に拒否する
+            if not replay_guard.is_fresh(timestamp):
+                STALE_TIMESTAMPS.inc()
+                interaction_logger.warning("タイムスタンプが古いため拒否しました")
+                raise HTTPException(status_code=401, detail="Unauthorized")
+
+            # 署名を検証（混雑時はスレッドプールでまとめて検証）
+            start = time.perf_counter()
+            verified = await verifier.verify_async(raw_body, signature, timestamp)
+            VERIFY_LATENCY.observe(time.perf_counter() - start)
+            if not verified:
+                VERIFY_FAILURES.inc()
+                interaction_logger.warning("署名検証に失敗しました")
+                raise HTTPException(status_code=401, detail="Unauthorized")
+        
+        # JSONをパース
+        body = codec.loads(raw_body)
+        
+        # デバッグ用ログ（ペイロードは出力されるときだけ文字列化される）
+        interaction_logger.debug("受信したインタラクション", extra={"payload": body})
+        
+        async def produce() -> bytes:
+            return codec.encode(await dispatch_interaction(body, via="Vercel経由"))
+
+        # 同じインタラクションIDの再送には前回の応答を返す
+        content = await replay_guard.response(body.get("id"), produce)
+        return Response(content=content, media_type="application/json")
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        interaction_logger.exception("インタラクション処理エラー: %s", e)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+test_logger = get_logger("test_interaction")
+
+
+@router.post("/test-interaction")
+async def test_interaction(request: Request):
+    """テスト用のインタラクションエンドポイント（署名検証なし）"""
+    try:
+        body = codec.loads(await request.body())
+        
+        # デバッグ用ログ
+        test_logger.debug("テスト用インタラクション受信", extra={"payload": body})
+        
+        return codec.render(await dispatch_interaction(body, via="テスト経由"))
+    
+    except Exception as e:
+        test_logger.exception("テストインタラクション処理エラー: %s", e)
+        return message("エラーが発生しました。")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    loop_monitor.start()
+    yield
+    await close_interactions()
+    shutdown_logging()
+
+
+app = FastAPI(
+    title="Discord Interactions",
+    description="Discordインタラクション用の軽量エンドポイント",
+    version="1.0.0",
+    lifespan=lifespan,
+)
+# ヘッダー・Content-Type・ボディサイズの検査（メトリクスより内側）
+app.add_middleware(IngressGuard)
+app.add_middleware(MetricsMiddleware, routes=INTERACTION_ROUTES)
+app.include_router(router)
+app.include_router(metrics_router)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("interactions_app:app", host="0.0.0.0", port=8000, log_level="info")
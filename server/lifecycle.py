@@ -0,0 +1,222 @@
+"""
+プロセスのライフサイクル（起動中 → 受付中 → ドレイン中 → 停止）
+処理中のHTTPリクエストとゲートウェイのコマンドを数えておき、終了時は新しい
+リクエストを503で断りながら、処理中のものが終わるのを期限まで待ちます。
+バックグラウンドのタスクは spawn で作り、参照を保持して終了時に待ちます。
+
+readiness（トラフィックを受けてよいか）と liveness（プロセスが応答できるか）は
+別々に返し、ドレイン中は readiness だけを失敗させます。
+
+uvicorn はシグナルを受けるとすぐに待ち受けを閉じ、処理中のリクエストを待ってから
+lifespan の終了処理を呼ぶため、そこからドレインしても新しいリクエストは断れません。
+hook_uvicorn で uvicorn のシグナルハンドラー（Server.handle_exit）を包み、
+先にドレインしてから uvicorn に終了を伝えます。
+
+環境変数:
+    LIFECYCLE_DRAIN_TIMEOUT  終了時に処理中の仕事を待つ最大秒数（既定: 25）
+    LIFECYCLE_DRAIN_DELAY    ドレイン開始後、処理中の仕事が無くても readiness を失敗させて
+                             おく秒数（ロードバランサーが外すまでの時間、既定: 0）
+"""
+
+import asyncio
+import functools
+import os
+import signal
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Coroutine, Dict, Optional, Sequence, Set
+
+from applog import get_logger
+
+logger = get_logger("lifecycle")
+
+# 状態
+STARTING = "starting"
+READY = "ready"
+DRAINING = "draining"
+STOPPED = "stopped"
+
+_DRAINING_BODY = b'{"detail":"Service Unavailable"}'
+
+# 期限を過ぎていても、タスクの後片付け（シャードの所有権の解放など）には少し待つ
+_STOP_GRACE = 1.0
+
+
+class Lifecycle:
+    """処理中の仕事の数とバックグラウンドタスクを管理する"""
+
+    def __init__(self, drain_timeout: float = 25.0, drain_delay: float = 0.0):
+        self.drain_timeout = drain_timeout
+        self.drain_delay = drain_delay
+        self.state = STARTING
+        self.inflight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._deadline: Optional[float] = None
+        self._prestop: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "Lifecycle":
+        return cls(
+            drain_timeout=float(os.getenv("LIFECYCLE_DRAIN_TIMEOUT", "25")),
+            drain_delay=float(os.getenv("LIFECYCLE_DRAIN_DELAY", "0")),
+        )
+
+    @property
+    def accepting(self) -> bool:
+        return self.state in (STARTING, READY)
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def mark_ready(self) -> None:
+        if self.state == STARTING:
+            self.state = READY
+
+    @contextmanager
+    def track(self):
+        """with の間を処理中の仕事として数える"""
+        self.inflight += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            if not self.inflight:
+                self._idle.set()
+
+    def spawn(self, coro: Coroutine, name: Optional[str] = None) -> asyncio.Task:
+        """参照を保持するバックグラウンドタスク（例外はログに出す）"""
+        task = asyncio.create_task(coro, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+        return task
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                "バックグラウンドタスクが失敗しました: %s", task.exception(),
+                extra={"task": task.get_name()},
+            )
+
+    def remaining(self) -> float:
+        """ドレインの期限までの残り秒数（ドレイン前は drain_timeout）"""
+        if self._deadline is None:
+            return self.drain_timeout
+        return max(self._deadline - time.monotonic(), 0.0)
+
+    async def drain(self) -> bool:
+        """新しい仕事を断り、処理中の仕事を期限まで待つ（間に合えば True）
+
+        2回目以降の呼び出しは同じ期限で残りの仕事を待つだけです。
+        """
+        if self._deadline is None:
+            self._deadline = time.monotonic() + self.drain_timeout
+            self.state = DRAINING
+            logger.info("ドレインを開始します", extra={"inflight": self.inflight})
+            if self.drain_delay > 0:
+                # readiness の失敗が伝わるまでは新しいリクエストが届く（503で断る）
+                await asyncio.sleep(min(self.drain_delay, self.remaining()))
+        self.state = DRAINING
+        try:
+            await asyncio.wait_for(self._idle.wait(), self.remaining())
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(
+                "処理中の仕事の完了待ちがタイムアウトしました", extra={"inflight": self.inflight}
+            )
+            return False
+
+    def on_exit_signal(self, sig: int, forward: Callable[[], None]) -> None:
+        """終了のシグナルを受けたらドレインし、終わってから forward（元のハンドラー）を呼ぶ
+
+        受付を始める前のシグナルと、ドレイン中の2回目のシグナル（Ctrl+C をもう一度
+        押した場合）はすぐに forward します。
+        """
+        if self._prestop is not None or self.state != READY:
+            forward()
+            return
+        logger.info(
+            "終了のシグナルを受けました。ドレインしてから終了します",
+            extra={"signal": signal.Signals(sig).name},
+        )
+        self._prestop = self.spawn(self._drain_then(forward), name="prestop")
+
+    async def _drain_then(self, forward: Callable[[], None]) -> None:
+        try:
+            await self.drain()
+        finally:
+            forward()
+
+    async def stop(self) -> None:
+        """残りのバックグラウンドタスクを期限まで待ち、終わらなければキャンセルする"""
+        tasks = list(self._tasks)
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=max(self.remaining(), _STOP_GRACE))
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self.state = STOPPED
+
+    def status(self) -> Dict[str, Any]:
+        return {"state": self.state, "inflight": self.inflight, "tasks": len(self._tasks)}
+
+
+def hook_uvicorn(lifecycle: Lifecycle) -> None:
+    """uvicorn の Server.handle_exit を、先にドレインしてから呼ぶように包む
+
+    uvicorn はアプリを読み込んでからシグナルハンドラーを登録するので、アプリの
+    モジュールの読み込み時に呼びます。uvicorn 以外で動かしている場合は何もしません。
+    """
+    try:
+        from uvicorn.server import Server
+    except ImportError:
+        return
+    original = getattr(Server.handle_exit, "__wrapped__", Server.handle_exit)
+
+    @functools.wraps(original)
+    def handle_exit(server, sig, frame):
+        lifecycle.on_exit_signal(sig, lambda: original(server, sig, frame))
+
+    Server.handle_exit = handle_exit
+
+
+class DrainMiddleware:
+    """処理中のリクエストを数え、ドレイン中は新しいリクエストを503で断るASGIミドルウェア
+
+    exempt のパス（プローブ・メトリクス）はドレイン中も処理し、数えません。
+    """
+
+    def __init__(self, app, lifecycle: Lifecycle, exempt: Sequence[str] = ()):
+        self.app = app
+        self.lifecycle = lifecycle
+        self.exempt = frozenset(exempt)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            await self.app(scope, receive, send)
+            return
+
+        if not self.lifecycle.accepting:
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(_DRAINING_BODY)).encode()),
+                    (b"retry-after", b"1"),
+                    (b"connection", b"close"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": _DRAINING_BODY})
+            return
+
+        with self.lifecycle.track():
+            await self.app(scope, receive, send)
+
+
+# 共有のライフサイクル（main.py と bot.py で使う）
+lifecycle = Lifecycle.from_env()
@@ -1,68 +1,76 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
-import discord
-from discord.ext import commands
 import os
-import asyncio
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import uvicorn
-import json
-import hashlib
-import hmac
-import base64
-from nacl.signing import VerifyKey
-from nacl.exceptions import BadSignatureError
+import codec
+from fanout import FanOut
+from ingress import IngressGuard
+from lifecycle import DrainMiddleware, hook_uvicorn, lifecycle
+from outbox import QUEUED, Outbox, OutboxWorker, PermanentError
+from registry import API, registry
+from rest import DiscordHTTPError
+from throttle import retry_after, throttle
+from interactions import metadata, rest, serverinfo_embed
+from interactions_app import (
+    INTERACTION_ROUTES,
+    close_interactions,
+    router as interactions_router,
+)
+from metrics import (
+    GATEWAY_LATENCY,
+    MetricsMiddleware,
+    loop_monitor,
+    register_cache,
+    router as metrics_router,
+)
+from bot import (
+    bot,
+    command_syncer,
+    gateway,
+    gateway_status,
+    members,
+    profile,
+    serverinfo_embed_data,
+    start_bot,
+)
+from applog import get_logger, setup_logging, shutdown_logging
 
 # 環境変数を読み込み
 load_dotenv()
 
-# Discord公開鍵（環境変数から取得）
-DISCORD_PUBLIC_KEY = os.getenv('DISCORD_PUBLIC_KEY')
+# ログ出力（キュー経由でJSON Linesを書き出す）
+setup_logging()
+logger = get_logger("app")
 
-def verify_signature(raw_body: bytes, signature: str, timestamp: str) -> bool:
-    """Discordの署名を検証する"""
-    if not DISCORD_PUBLIC_KEY:
-        print("警告: DISCORD_PUBLIC_KEYが設定されていません")
-        return False
-    
-    try:
-        # 署名を検証
-        message = timestamp.encode() + raw_body
-        verify_key = VerifyKey(bytes.fromhex(DISCORD_PUBLIC_KEY))
-        verify_key.verify(message, bytes.fromhex(signature))
-        return True
-    except (BadSignatureError, ValueError) as e:
-        print(f"署名検証失敗: {e}")
-        return False
-
-
-# Botを起動する関数
-async def start_bot():
-    token = os.getenv("DISCORD_TOKEN")
-    if not token or token == "your_discord_bot_token_here":
-        print("警告: DISCORD_TOKENが設定されていません。Botは起動しません。")
-        return
-
-    try:
-        await bot.start(token)
-    except Exception as e:
-        print(f"Botの起動に失敗しました: {e}")
+# SIGTERM を受けたら uvicorn が待ち受けを閉じる前にドレインする
+hook_uvicorn(lifecycle)
 
 
 # アプリケーションのライフサイクル管理
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 起動時
-    print("アプリケーションを起動中...")
-    asyncio.create_task(start_bot())
+    setup_logging()
+    logger.info("アプリケーションを起動中...")
+    loop_monitor.start()
+    start_outbox_worker()
+    lifecycle.spawn(start_bot(), name="bot")
+    lifecycle.mark_ready()
     yield
-    # 終了時
-    print("アプリケーションを終了中...")
+    # 終了時（シグナルで始めたドレインの残り。ゲートウェイのコマンドと送信キューを期限まで待つ）
+    logger.info("アプリケーションを終了中...")
+    await lifecycle.drain()
+    await outbox_worker.stop(timeout=lifecycle.remaining())
+    await outbox.close()
     await bot.close()
+    await lifecycle.stop()
+    await close_interactions()
+    shutdown_logging()
 
 
 # FastAPIアプリケーションの初期化
@@ -82,21 +90,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Discord Botの設定
-intents = discord.Intents.default()
-intents.message_content = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+# /interactions のヘッダー・ボディサイズの検査
+app.add_middleware(IngressGuard)
 
+# 処理中のリクエストを数え、終了時のドレイン中は503を返す（プローブとメトリクスは除く）
+PROBE_ROUTES = ("/health", "/health/live", "/health/ready", "/metrics")
+app.add_middleware(DrainMiddleware, lifecycle=lifecycle, exempt=PROBE_ROUTES)
 
-# リクエストモデル
-class DiscordInteraction(BaseModel):
-    type: int
-    data: Optional[Dict[str, Any]] = None
-    guild_id: Optional[str] = None
-    channel_id: Optional[str] = None
-    user: Optional[Dict[str, Any]] = None
+# メトリクス（/metrics）
+app.add_middleware(
+    MetricsMiddleware,
+    routes=INTERACTION_ROUTES + (
+        "/command", "/command/{job_id}", "/command/batch",
+        "/health", "/health/live", "/health/ready", "/bot/status", "/bot/sync-commands",
+    ),
+)
+app.include_router(metrics_router)
+GATEWAY_LATENCY.set_function(lambda: bot.latency if gateway_status.ready else None)
+register_cache("members", members)
+
+# インタラクションのエンドポイント（interactions_app.py と共通）
+app.include_router(interactions_router)
 
 
+# リクエストモデル
 class CommandRequest(BaseModel):
     command: str
     parameters: Optional[Dict[str, Any]] = None
@@ -105,423 +122,310 @@ class CommandRequest(BaseModel):
     channel_id: str
 
 
-# Botイベント
-@bot.event
-async def on_ready():
-    print(f"{bot.user} がログインしました！")
-    print(f"Bot ID: {bot.user.id}")
+class CommandTarget(BaseModel):
+    channel_id: str
+    guild_id: Optional[str] = None
 
-    # スラッシュコマンドを同期
-    try:
-        synced = await bot.tree.sync()
-        print(f"{len(synced)} 個のスラッシュコマンドを同期しました")
-    except Exception as e:
-        print(f"スラッシュコマンドの同期に失敗しました: {e}")
+
+class BatchCommandRequest(BaseModel):
+    # 個別のコマンドのリスト
+    commands: List[CommandRequest] = []
+    # 同じコマンドを複数のチャンネルに送る場合
+    command: Optional[str] = None
+    parameters: Optional[Dict[str, Any]] = None
+    user_id: Optional[str] = None
+    targets: List[CommandTarget] = []
+
+    def items(self) -> List[CommandRequest]:
+        items = list(self.commands)
+        if self.targets:
+            if not self.command or not self.user_id:
+                raise HTTPException(
+                    status_code=400, detail="targets には command と user_id が必要です"
+                )
+            items.extend(
+                CommandRequest(
+                    command=self.command,
+                    parameters=self.parameters,
+                    user_id=self.user_id,
+                    guild_id=target.guild_id,
+                    channel_id=target.channel_id,
+                )
+                for target in self.targets
+            )
+        return items
+
+
+# FastAPIエンドポイント
+@app.get("/")
+async def root():
+    return {
+        "message": "Discord Bot API Server",
+        "status": "running",
+        "updated": "1758356604",
+    }
 
 
-# スラッシュコマンドの定義
-@bot.tree.command(name="ping", description="Botの応答時間を測定します")
-async def ping(interaction: discord.Interaction):
-    latency = round(bot.latency * 1000)
-    await interaction.response.send_message(f"🏓 Pong! 応答時間: {latency}ms")
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy", "bot_ready": gateway_status.ready}
 
 
-@bot.tree.command(name="hello", description="挨拶をします")
-async def hello(interaction: discord.Interaction):
-    await interaction.response.send_message(
-        f"こんにちは、{interaction.user.mention}さん！"
-    )
+@app.get("/health/live")
+async def liveness():
+    """liveness: イベントループが応答できれば200（ドレイン中も再起動させない）"""
+    return {"status": "alive", "lifecycle": lifecycle.state}
 
 
-@bot.tree.command(name="serverinfo", description="サーバー情報を表示します")
-async def serverinfo(interaction: discord.Interaction):
-    guild = interaction.guild
-    embed = discord.Embed(title=f"{guild.name} の情報", color=discord.Color.blue())
-    embed.add_field(name="メンバー数", value=guild.member_count, inline=True)
-    embed.add_field(name="サーバーID", value=guild.id, inline=True)
-    embed.add_field(
-        name="作成日", value=guild.created_at.strftime("%Y年%m月%d日"), inline=True
-    )
-    embed.add_field(name="オーナー", value=guild.owner.mention, inline=True)
-    embed.add_field(name="チャンネル数", value=len(guild.channels), inline=True)
-    embed.add_field(name="ロール数", value=len(guild.roles), inline=True)
+@app.get("/health/ready")
+async def readiness():
+    """readiness: リクエストを受け付けている間だけ200（起動中・ドレイン中は503）
 
-    if guild.icon:
-        embed.set_thumbnail(url=guild.icon.url)
+    ゲートウェイの状態は返すだけで判定には使いません（シャードを持たない待機中の
+    プロセスもHTTPのインタラクションは処理できる）。
+    """
+    body = dict(lifecycle.status(), bot_ready=gateway_status.ready)
+    return JSONResponse(body, status_code=200 if lifecycle.ready else 503)
 
-    await interaction.response.send_message(embed=embed)
 
+class ChannelTarget:
+    """REST API経由でメッセージを送るチャンネル
 
-@bot.tree.command(name="userinfo", description="ユーザー情報を表示します")
-async def userinfo(interaction: discord.Interaction, user: discord.Member = None):
-    if user is None:
-        user = interaction.user
+    ゲートウェイのキャッシュを使わないので、どのシャードのギルドのチャンネルにも、
+    ゲートウェイに接続していないプロセスからも送信できます。
+    """
 
-    embed = discord.Embed(title=f"{user.display_name} の情報", color=user.color)
-    embed.add_field(name="ユーザー名", value=user.name, inline=True)
-    embed.add_field(name="ディスプレイ名", value=user.display_name, inline=True)
-    embed.add_field(name="ユーザーID", value=user.id, inline=True)
-    embed.add_field(
-        name="アカウント作成日",
-        value=user.created_at.strftime("%Y年%m月%d日"),
-        inline=True,
-    )
-    embed.add_field(
-        name="サーバー参加日",
-        value=user.joined_at.strftime("%Y年%m月%d日"),
-        inline=True,
-    )
-    embed.add_field(name="ロール数", value=len(user.roles), inline=True)
+    def __init__(self, channel_id: str):
+        self.id = channel_id
 
-    if user.avatar:
-        embed.set_thumbnail(url=user.avatar.url)
+    async def send(
+        self, content: Optional[str] = None, *, embed: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {}
+        if content is not None:
+            payload["content"] = content
+        if embed is not None:
+            payload["embeds"] = [embed]
+        return await rest.post(f"/channels/{self.id}/messages", json=payload)
 
-    await interaction.response.send_message(embed=embed)
 
-@bot.tree.command(name="here", description="現在のサーバー、カテゴリ、チャンネル情報を表示します")
-async def here(interaction: discord.Interaction):
-    guild = interaction.guild
-    channel = interaction.channel
-    
-    embed = discord.Embed(
-        title="📍 現在の場所情報",
-        color=discord.Color.green()
-    )
-    
-    # サーバー情報
+# /command 用のコマンド実装（user は REST API のユーザーオブジェクト）
+@registry.handler(API, "ping")
+async def api_ping(command_request: CommandRequest, channel, user):
+    latency = f"{round(bot.latency * 1000)}ms" if gateway_status.ready else "不明"
+    await channel.send(f"🏓 Pong! 応答時間: {latency} (API経由)")
+    return {"message": "Pingコマンドを実行しました"}
+
+
+@registry.handler(API, "hello")
+async def api_hello(command_request: CommandRequest, channel, user):
+    await channel.send(f"こんにちは、<@{user['id']}>さん！ (API経由)")
+    return {"message": "Helloコマンドを実行しました"}
+
+
+@registry.handler(API, "serverinfo")
+async def api_serverinfo(command_request: CommandRequest, channel, user):
+    guild_id = command_request.guild_id
+    if not guild_id:
+        raise HTTPException(status_code=400, detail="サーバーIDが必要です")
+
+    guild = bot.get_guild(int(guild_id))
     if guild:
-        embed.add_field(
-            name="🏰 サーバー",
-            value=f"**{guild.name}**\nID: `{guild.id}`\nメンバー数: {guild.member_count}",
-            inline=False
-        )
+        embed = serverinfo_embed_data(guild)
     else:
-        embed.add_field(name="🏰 サーバー", value="DM", inline=False)
-    
-    # チャンネル情報
-    if isinstance(channel, discord.TextChannel):
-        embed.add_field(
-            name="💬 チャンネル",
-            value=f"**#{channel.name}**\nID: `{channel.id}`",
-            inline=True
-        )
-        
-        # カテゴリ情報
-        if channel.category:
-            embed.add_field(
-                name="📁 カテゴリ",
-                value=f"**{channel.category.name}**\nID: `{channel.category.id}`",
-                inline=True
-            )
-        else:
-            embed.add_field(name="📁 カテゴリ", value="なし", inline=True)
-            
-        # チャンネル作成日
-        embed.add_field(
-            name="📅 チャンネル作成日",
-            value=channel.created_at.strftime("%Y年%m月%d日 %H:%M"),
-            inline=True
-        )
-        
-    elif isinstance(channel, discord.DMChannel):
-        embed.add_field(
-            name="💬 チャンネル",
-            value="DM",
-            inline=True
-        )
-        embed.add_field(name="📁 カテゴリ", value="なし", inline=True)
-    
-    # ユーザー情報
-    user = interaction.user
-    embed.add_field(
-        name="👤 あなた",
-        value=f"**{user.display_name}**\nID: `{user.id}`",
-        inline=False
-    )
-    
-    # タイムスタンプ
-    embed.timestamp = discord.utils.utcnow()
-    
-    await interaction.response.send_message(embed=embed)
+        # ゲートウェイのキャッシュに無い場合はREST APIのキャッシュから作る
+        embed = await serverinfo_embed(guild_id)
+        if embed is None:
+            raise HTTPException(status_code=404, detail="サーバーが見つかりません")
 
+    await channel.send(embed=embed)
+    return {"message": "サーバー情報を送信しました"}
 
-# FastAPIエンドポイント
-@app.get("/")
-async def root():
-    return {
-        "message": "Discord Bot API Server",
-        "status": "running",
-        "updated": "1758356604",
-    }
 
+command_logger = get_logger("command")
 
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy", "bot_ready": bot.is_ready()}
 
+async def run_command(command_request: CommandRequest) -> Dict[str, Any]:
+    """コマンドを1件実行する（送信はREST API経由）"""
+    command = command_request.command
+    handler = registry.lookup(API, command)
+    if handler is None:
+        raise HTTPException(status_code=400, detail=f"不明なコマンド: {command}")
+
+    # ユーザーはREST APIのキャッシュから取得する（404以外のエラーはそのまま送出して再試行）
+    user = await metadata.get(f"/users/{command_request.user_id}")
+    if not user:
+        raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
 
-@app.post("/discord/interaction")
-async def handle_discord_interaction(interaction: DiscordInteraction):
-    """Discordのインタラクションを処理するエンドポイント"""
     try:
-        if interaction.type == 1:  # PING
-            return {"type": 1}
-        elif interaction.type == 2:  # APPLICATION_COMMAND
-            # スラッシュコマンドの処理
-            command_name = interaction.data.get("name", "")
-
-            if command_name == "ping":
-                return {
-                    "type": 4,
-                    "data": {"content": "🏓 Pong! API経由で応答しました"},
-                }
-            elif command_name == "hello":
-                user_id = interaction.user.get("id", "unknown")
-                return {
-                    "type": 4,
-                    "data": {"content": f"こんにちは、<@{user_id}>さん！"},
-                }
-            else:
-                return {
-                    "type": 4,
-                    "data": {
-                        "content": f"コマンド '{command_name}' は認識されませんでした。"
-                    },
-                }
-        else:
-            return {
-                "type": 4,
-                "data": {"content": "不明なインタラクションタイプです。"},
-            }
+        return await handler(command_request, ChannelTarget(command_request.channel_id), user)
+    except DiscordHTTPError as e:
+        # チャンネルが無い・権限が無いなどは再試行しても成功しない
+        if e.status == 404:
+            raise HTTPException(status_code=404, detail="チャンネルが見つかりません") from e
+        if 400 <= e.status < 500 and e.status != 429:
+            raise HTTPException(status_code=e.status, detail=str(e.body)) from e
+        raise
 
-    except Exception as e:
-        print(f"インタラクション処理エラー: {e}")
-        return {"type": 4, "data": {"content": "エラーが発生しました。"}}
+
+# /command の送信キュー（再起動しても未送信のジョブは残る）
+outbox = Outbox.from_env()
 
 
-@app.post("/interactions")
-async def handle_interactions(request: Request):
-    """Vercel用のインタラクションエンドポイント（署名検証付き）"""
+async def send_queued_command(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """キューのジョブを実行する（4xx 相当は再試行しない）"""
     try:
-        # 生のリクエストボディを取得
-        raw_body = await request.body()
-        
-        # 署名ヘッダーを取得
-        signature = request.headers.get("X-Signature-Ed25519")
-        timestamp = request.headers.get("X-Signature-Timestamp")
-        
-        if not signature or not timestamp:
-            print("署名ヘッダーが不足しています")
-            raise HTTPException(status_code=401, detail="Unauthorized")
-        
-        # 署名を検証
-        if not verify_signature(raw_body, signature, timestamp):
-            print("署名検証に失敗しました")
-            raise HTTPException(status_code=401, detail="Unauthorized")
-        
-        # JSONをパース
-        body = json.loads(raw_body.decode('utf-8'))
-        
-        # デバッグ用ログ（本番環境では削除推奨）
-        print(f"受信したインタラクション: {json.dumps(body, indent=2, ensure_ascii=False)}")
-        
-        # DiscordのPINGリクエスト（type: 1）を処理
-        if body.get("type") == 1:
-            return {"type": 1}
-        
-        # スラッシュコマンド（type: 2）を処理
-        elif body.get("type") == 2:
-            command_name = body.get("data", {}).get("name", "")
-            
-            # ユーザー情報を正しく取得
-            user_info = body.get("member", {}).get("user") or body.get("user", {})
-            user_id = user_info.get("id", "unknown")
-            username = user_info.get("username", "Unknown")
-            
-            if command_name == "ping":
-                return {
-                    "type": 4,
-                    "data": {"content": "🏓 Pong! Vercel経由で応答しました"}
-                }
-            elif command_name == "hello":
-                return {
-                    "type": 4,
-                    "data": {"content": f"こんにちは、<@{user_id}>さん！"}
-                }
-            elif command_name == "here":
-                # サーバー、カテゴリ、チャンネル情報を取得
-                guild_id = body.get("guild_id", "DM")
-                channel_id = body.get("channel_id", "unknown")
-                
-                # 基本的な情報を返す（実際のDiscord APIから詳細情報を取得する場合は別途実装が必要）
-                return {
-                    "type": 4,
-                    "data": {
-                        "content": f"📍 **現在の場所情報**\n\n🏰 **サーバー**: {guild_id}\n💬 **チャンネル**: <#{channel_id}>\n👤 **ユーザー**: <@{user_id}>"
-                    }
-                }
-            else:
-                return {
-                    "type": 4,
-                    "data": {"content": f"コマンド '{command_name}' は認識されませんでした。"}
-                }
-        else:
-            return {
-                "type": 4,
-                "data": {"content": "不明なインタラクションタイプです。"}
-            }
-    
-    except HTTPException:
+        return await run_command(CommandRequest(**payload))
+    except HTTPException as e:
+        if e.status_code < 500:
+            raise PermanentError(e.detail) from e
         raise
-    except Exception as e:
-        print(f"インタラクション処理エラー: {e}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
-@app.post("/test-interaction")
-async def test_interaction(request: Request):
-    """テスト用のインタラクションエンドポイント（署名検証なし）"""
-    try:
-        body = await request.json()
-        
-        # デバッグ用ログ
-        print(f"テスト用インタラクション受信: {json.dumps(body, indent=2, ensure_ascii=False)}")
-        
-        # DiscordのPINGリクエスト（type: 1）を処理
-        if body.get("type") == 1:
-            return {"type": 1}
-        
-        # スラッシュコマンド（type: 2）を処理
-        elif body.get("type") == 2:
-            command_name = body.get("data", {}).get("name", "")
-            
-            # ユーザー情報を正しく取得
-            user_info = body.get("member", {}).get("user") or body.get("user", {})
-            user_id = user_info.get("id", "unknown")
-            username = user_info.get("username", "Unknown")
-            
-            print(f"ユーザー情報: ID={user_id}, Username={username}")
-            
-            if command_name == "ping":
-                return {
-                    "type": 4,
-                    "data": {"content": "🏓 Pong! テスト経由で応答しました"}
-                }
-            elif command_name == "hello":
-                return {
-                    "type": 4,
-                    "data": {"content": f"こんにちは、<@{user_id}>さん！"}
-                }
-            elif command_name == "here":
-                # サーバー、カテゴリ、チャンネル情報を取得
-                guild_id = body.get("guild_id", "DM")
-                channel_id = body.get("channel_id", "unknown")
-                
-                return {
-                    "type": 4,
-                    "data": {
-                        "content": f"📍 **現在の場所情報**\n\n🏰 **サーバー**: {guild_id}\n💬 **チャンネル**: <#{channel_id}>\n👤 **ユーザー**: <@{user_id}>"
-                    }
-                }
-            else:
-                return {
-                    "type": 4,
-                    "data": {"content": f"コマンド '{command_name}' は認識されませんでした。"}
-                }
-        else:
-            return {
-                "type": 4,
-                "data": {"content": "不明なインタラクションタイプです。"}
-            }
-    
-    except Exception as e:
-        print(f"テストインタラクション処理エラー: {e}")
-        return {"type": 4, "data": {"content": "エラーが発生しました。"}}
+outbox_worker = OutboxWorker.from_env(outbox, send_queued_command)
 
-@app.post("/command")
+
+def start_outbox_worker() -> None:
+    """送信キューのワーカーを起動する
+
+    送信はREST API経由なので、ゲートウェイのシャードを持たないプロセスでも動かします。
+    トークンが無い場合と Vercel（リクエストの間はプロセスが止まる）では起動しません。
+    """
+    if not rest.authorized:
+        logger.warning("DISCORD_TOKENが無いため /command の送信キューを起動しません")
+        return
+    if os.getenv("VERCEL"):
+        logger.warning("Vercel では /command の送信キューを起動しません")
+        return
+    outbox_worker.start()
+
+
+async def check_command_throttle(command_request: CommandRequest) -> float:
+    """/command の流量制限（guild_id が無ければキャッシュにあるチャンネルのギルド）"""
+    guild_id = command_request.guild_id
+    if not guild_id:
+        guild = getattr(bot.get_channel(int(command_request.channel_id)), "guild", None)
+        guild_id = str(guild.id) if guild else None
+    return await throttle.check(command_request.user_id, guild_id, command_request.command)
+
+
+def validate_command(command_request: CommandRequest) -> Optional[str]:
+    """実行できないリクエストならその理由を返す（/command と /command/batch で共通）"""
+    if registry.lookup(API, command_request.command) is None:
+        return f"不明なコマンド: {command_request.command}"
+    if not (command_request.channel_id.isdigit() and command_request.user_id.isdigit()):
+        return "channel_id と user_id は数値のIDです"
+    if command_request.guild_id and not command_request.guild_id.isdigit():
+        return "guild_id は数値のIDです"
+    return None
+
+
+@app.post("/command", status_code=202)
 async def execute_command(command_request: CommandRequest):
-    """カスタムコマンドを実行するエンドポイント"""
+    """カスタムコマンドを送信キューに登録するエンドポイント"""
+    error = validate_command(command_request)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    # 送信できないプロセスではジョブを受け付けない
+    if not outbox_worker.running:
+        raise HTTPException(status_code=503, detail="送信キューのワーカーが動いていません")
+    wait = await check_command_throttle(command_request)
+    if wait:
+        raise HTTPException(
+            status_code=429, detail="リクエストが多すぎます", headers={"Retry-After": retry_after(wait)}
+        )
+
     try:
-        command = command_request.command
-        user_id = command_request.user_id
-        guild_id = command_request.guild_id
-        channel_id = command_request.channel_id
-
-        # チャンネルとユーザーを取得
-        channel = bot.get_channel(int(channel_id))
-        if not channel:
-            raise HTTPException(status_code=404, detail="チャンネルが見つかりません")
-
-        user = bot.get_user(int(user_id))
-        if not user:
-            raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
-
-        # コマンドの実行
-        if command == "ping":
-            latency = round(bot.latency * 1000)
-            await channel.send(f"🏓 Pong! 応答時間: {latency}ms (API経由)")
-            return {"message": "Pingコマンドを実行しました"}
-
-        elif command == "hello":
-            await channel.send(f"こんにちは、{user.mention}さん！ (API経由)")
-            return {"message": "Helloコマンドを実行しました"}
-
-        elif command == "serverinfo":
-            if guild_id:
-                guild = bot.get_guild(int(guild_id))
-                if guild:
-                    embed = discord.Embed(
-                        title=f"{guild.name} の情報", color=discord.Color.blue()
-                    )
-                    embed.add_field(
-                        name="メンバー数", value=guild.member_count, inline=True
-                    )
-                    embed.add_field(name="サーバーID", value=guild.id, inline=True)
-                    embed.add_field(
-                        name="作成日",
-                        value=guild.created_at.strftime("%Y年%m月%d日"),
-                        inline=True,
-                    )
-                    embed.add_field(
-                        name="オーナー", value=guild.owner.mention, inline=True
-                    )
-                    embed.add_field(
-                        name="チャンネル数", value=len(guild.channels), inline=True
-                    )
-                    embed.add_field(
-                        name="ロール数", value=len(guild.roles), inline=True
-                    )
-
-                    if guild.icon:
-                        embed.set_thumbnail(url=guild.icon.url)
-
-                    await channel.send(embed=embed)
-                    return {"message": "サーバー情報を送信しました"}
-                else:
-                    raise HTTPException(
-                        status_code=404, detail="サーバーが見つかりません"
-                    )
-            else:
-                raise HTTPException(status_code=400, detail="サーバーIDが必要です")
-
-        else:
-            raise HTTPException(status_code=400, detail=f"不明なコマンド: {command}")
+        job_id = await outbox.enqueue(
+            command_request.channel_id, command_request.command, command_request.model_dump()
+        )
+    except Exception as e:
+        command_logger.exception("コマンドを登録できませんでした: %s", e)
+        raise HTTPException(status_code=503, detail="コマンドを登録できませんでした")
+    return {"job_id": job_id, "status": QUEUED, "status_url": f"/command/{job_id}"}
+
+
+@app.get("/command/{job_id}")
+async def get_command_status(job_id: str):
+    """送信キューのジョブの状態（queued / running / done / failed）"""
+    job = await outbox.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return job
 
+
+# 一括実行（全体とチャンネルごとの同時実行数を制限する）
+batch_fanout = FanOut.from_env()
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+
+async def run_batch_item(command_request: CommandRequest) -> Dict[str, Any]:
+    """1件を実行して結果の行を作る（失敗しても例外は投げない）"""
+    row = {"command": command_request.command, "channel_id": command_request.channel_id}
+    try:
+        row.update(status=200, result=await run_command(command_request))
+    except HTTPException as e:
+        row.update(status=e.status_code, error=e.detail)
     except Exception as e:
-        print(f"コマンド実行エラー: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        command_logger.exception(
+            "コマンド実行エラー: %s", e, extra={"channel_id": command_request.channel_id}
+        )
+        row.update(status=500, error=str(e))
+    return row
+
+
+@app.post("/command/batch")
+async def execute_batch(batch_request: BatchCommandRequest):
+    """複数のコマンドを並行に実行し、終わった順に結果をNDJSONで返す"""
+    items = batch_request.items()
+    if not items:
+        raise HTTPException(status_code=400, detail="コマンドがありません")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"一度に実行できるのは {BATCH_MAX_ITEMS} 件までです"
+        )
+    # 1件でも実行できない行があれば、何も実行せずに全体を400にする
+    for index, item in enumerate(items):
+        error = validate_command(item)
+        if error:
+            raise HTTPException(status_code=400, detail=f"{index}件目: {error}")
+    # 流量制限は一括実行のリクエスト1件を1回として数える（各行はコマンドごとの制限の対象外）。
+    # 全ユーザーの枠をまとめて確認し、1人でも足りなければ誰の枠も使わない
+    wait = await throttle.check_all(
+        [(user_id, None, "batch") for user_id in {item.user_id for item in items}]
+    )
+    if wait:
+        raise HTTPException(
+            status_code=429, detail="リクエストが多すぎます",
+            headers={"Retry-After": retry_after(wait)},
+        )
+
+    async def stream():
+        succeeded = 0
+        async for index, row in batch_fanout.run(
+            items, run_batch_item, key=lambda item: item.channel_id
+        ):
+            succeeded += row["status"] == 200
+            yield codec.dumps(dict(row, index=index)) + b"\n"
+        # 最後に集計を1行返す
+        yield codec.dumps(
+            {"done": True, "total": len(items), "succeeded": succeeded,
+             "failed": len(items) - succeeded}
+        ) + b"\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
 @app.get("/bot/status")
 async def get_bot_status():
-    """Botの状態を取得"""
-    return {
-        "bot_ready": bot.is_ready(),
-        "bot_user": str(bot.user) if bot.user else None,
-        "bot_id": bot.user.id if bot.user else None,
-        "guilds": len(bot.guilds),
-        "users": len(bot.users),
-    }
+    """Botの状態を取得（ゲートウェイのイベントで更新した値を返す）"""
+    return dict(
+        gateway_status.snapshot(),
+        gateway=dict(
+            gateway.status(), cache=profile.status(),
+            connections=gateway_status.shard_status(),
+        ),
+    )
 
 @app.get("/bot/env-check")
 async def check_environment():
@@ -529,22 +433,25 @@ async def check_environment():
     return {
         "discord_token_set": bool(os.getenv('DISCORD_TOKEN') and os.getenv('DISCORD_TOKEN') != 'your_discord_bot_token_here'),
         "discord_public_key_set": bool(os.getenv('DISCORD_PUBLIC_KEY') and os.getenv('DISCORD_PUBLIC_KEY') != 'your_discord_public_key_here'),
-        "bot_ready": bot.is_ready(),
+        "bot_ready": gateway_status.ready,
         "environment": "production" if os.getenv('VERCEL') else "development"
     }
 
 @app.post("/bot/sync-commands")
-async def sync_commands():
-    """スラッシュコマンドを手動で同期"""
+async def sync_commands(force: bool = False):
+    """スラッシュコマンドを手動で同期（force=true で変更が無くても同期）"""
     try:
-        if not bot.is_ready():
+        if not gateway_status.ready:
             return {"error": "Bot is not ready", "status": "failed"}
         
-        synced = await bot.tree.sync()
+        result = await command_syncer.sync(force=force)
         return {
             "status": "success",
-            "synced_commands": len(synced),
-            "commands": [cmd.name for cmd in synced]
+            "changed": result["global"]["changed"],
+            "synced_commands": len(result["global"]["commands"]),
+            "commands": result["global"]["commands"],
+            "diff": result["global"]["diff"],
+            "guilds": result["guilds"],
         }
     except Exception as e:
         return {"error": str(e), "status": "failed"}
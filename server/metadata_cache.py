@@ -0,0 +1,157 @@
+"""
+ギルド・チャンネル情報のキャッシュ
+HTTPモード（Vercel）ではゲートウェイのキャッシュが無いため、REST APIで取得した
+情報をTTL付きで保持します。同じIDへの同時リクエストは1回の取得にまとめます。
+
+環境変数:
+    METADATA_CACHE_TTL      キャッシュの有効期間（秒、既定: 300）
+    METADATA_CACHE_SIZE     プロセス内キャッシュの最大件数（既定: 1024）
+    METADATA_CACHE_URL      共有ストア（redis://...）を使う場合のURL
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Discordのエポック（2015-01-01T00:00:00Z、ミリ秒）
+DISCORD_EPOCH = 1420070400000
+
+Fetch = Callable[[str], Awaitable[Any]]
+
+
+def snowflake_time(snowflake: str) -> datetime:
+    """スノーフレークIDから作成日時を求める"""
+    return datetime.fromtimestamp(
+        ((int(snowflake) >> 22) + DISCORD_EPOCH) / 1000, tz=timezone.utc
+    )
+
+
+class MemoryBackend:
+    """プロセス内のTTL付きLRUキャッシュ"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Redis互換ストアを使う共有キャッシュ（複数インスタンス向け）"""
+
+    def __init__(self, url: str, prefix: str = "botdiscord:meta:"):
+        import redis.asyncio as redis
+
+        self._client = redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Any:
+        raw = await self._client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self._client.set(
+            self.prefix + key, json.dumps(value), ex=max(int(ttl), 1)
+        )
+
+    async def delete(self, key: str) -> None:
+        await self._client.delete(self.prefix + key)
+
+
+class MetadataCache:
+    """ギルド・チャンネルのメタデータを取得・キャッシュする
+
+    fetch にはREST APIのパスを受け取ってJSONを返す関数
+    （通常は DiscordRESTClient.fetch）を渡します。
+    """
+
+    def __init__(self, fetch: Fetch, backend=None, ttl: float = 300.0):
+        self._fetch = fetch
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @classmethod
+    def from_env(cls, fetch) -> "MetadataCache":
+        url = os.getenv("METADATA_CACHE_URL")
+        if url:
+            backend = RedisBackend(url)
+        else:
+            backend = MemoryBackend(int(os.getenv("METADATA_CACHE_SIZE", "1024")))
+        return cls(fetch, backend, ttl=float(os.getenv("METADATA_CACHE_TTL", "300")))
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def get(self, path: str) -> Any:
+        """REST APIのパス（/guilds/{id} など）をキーに取得する"""
+        value = await self.backend.get(path)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        # 同じキーの取得中のリクエストがあれば結果を待つ
+        pending = self._inflight.get(path)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[path] = future
+        try:
+            value = await self._fetch(path)
+            if value is not None:
+                await self.backend.set(path, value, self.ttl)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # 待っている側が無い場合でも "never retrieved" 警告を出さない
+            future.exception()
+            raise
+        finally:
+            # キャンセルされた場合も待っている側を解放する
+            if not future.done():
+                future.cancel()
+            del self._inflight[path]
+
+    async def guild(self, guild_id: str) -> Optional[Dict[str, Any]]:
+        return await self.get(f"/guilds/{guild_id}?with_counts=true")
+
+    async def guild_channels(self, guild_id: str) -> Optional[list]:
+        return await self.get(f"/guilds/{guild_id}/channels")
+
+    async def channel(self, channel_id: str) -> Optional[Dict[str, Any]]:
+        return await self.get(f"/channels/{channel_id}")
+
+    async def invalidate(self, path: str) -> None:
+        await self.backend.delete(path)
@@ -0,0 +1,329 @@
+"""
+Prometheus形式のメトリクス
+記録側はラベルごとの子メトリクスを事前に作っておき、リクエストごとには
+dictを作らずにカウンターと事前確保したバケットを加算するだけにしています。
+/metrics でテキスト形式（version 0.0.4）を返します。
+"""
+
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+# 秒単位のヒストグラムのバケット
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # 最後の要素は +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """ラベル値に対応する子メトリクス（ホットパスでは事前に取得しておく）"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {child.value}"
+            for values, child in self._children.items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        names = self.labelnames + ("le",)
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(names, values + (le,))} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {child.sum}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """値を関数で読み取るゲージ（スクレイプ時にだけ評価する）"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._functions: Dict[Tuple[str, ...], Callable[[], Optional[float]]] = {}
+
+    def set_function(self, function: Callable[[], Optional[float]], *values: str) -> None:
+        self._functions[values] = function
+
+    def set(self, value: float, *values: str) -> None:
+        self._functions[values] = lambda: value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for values, function in self._functions.items():
+            try:
+                value = function()
+            except Exception:
+                value = None
+            if value is not None:
+                labels = _format_labels(self.labelnames, values)
+                lines.append(f"{self.name}{labels} {float(value)}")
+        return lines
+
+
+class CounterFunction(Gauge):
+    """値を関数で読み取るカウンター（既存の累積値を公開する）"""
+
+    kind = "counter"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+metrics = MetricsRegistry()
+
+REQUESTS = metrics.register(Counter(
+    "botdiscord_http_requests_total", "HTTPリクエスト数", ("route", "status")
+))
+REQUEST_LATENCY = metrics.register(Histogram(
+    "botdiscord_http_request_duration_seconds", "HTTPリクエストの処理時間", ("route",)
+))
+COMMAND_LATENCY = metrics.register(Histogram(
+    "botdiscord_command_duration_seconds", "コマンドハンドラーの処理時間", ("command",)
+))
+AUTOCOMPLETE_LATENCY = metrics.register(Histogram(
+    "botdiscord_autocomplete_duration_seconds", "オートコンプリートの処理時間", ("command",)
+))
+VERIFY_LATENCY = metrics.register(Histogram(
+    "botdiscord_signature_verify_duration_seconds", "署名検証の処理時間"
+))
+VERIFY_FAILURES = metrics.register(Counter(
+    "botdiscord_signature_verify_failures_total", "署名検証の失敗数"
+))
+STALE_TIMESTAMPS = metrics.register(Counter(
+    "botdiscord_stale_timestamps_total", "タイムスタンプが古いため拒否したリクエスト数"
+))
+INGRESS_REJECTIONS = metrics.register(Counter(
+    "botdiscord_ingress_rejections_total", "ボディの検査前・読み込み中に拒否したリクエスト数", ("reason",)
+))
+THROTTLED = metrics.register(Counter(
+    "botdiscord_throttled_total", "流量制限で拒否した実行数", ("scope",)
+))
+LOOP_LAG = metrics.register(Histogram(
+    "botdiscord_event_loop_lag_seconds", "イベントループの遅延"
+))
+LOOP_LAG_LAST = metrics.register(Gauge(
+    "botdiscord_event_loop_lag_last_seconds", "直近のイベントループの遅延"
+))
+GATEWAY_LATENCY = metrics.register(Gauge(
+    "botdiscord_gateway_latency_seconds", "ゲートウェイのハートビート遅延（bot.latency）"
+))
+CACHE_REQUESTS = metrics.register(CounterFunction(
+    "botdiscord_cache_requests_total", "キャッシュの参照数", ("cache", "result")
+))
+CACHE_HIT_RATIO = metrics.register(Gauge(
+    "botdiscord_cache_hit_ratio", "キャッシュのヒット率", ("cache",)
+))
+
+
+def register_cache(name: str, cache) -> None:
+    """hits / misses を持つキャッシュをメトリクスに登録する"""
+    CACHE_REQUESTS.set_function(lambda: cache.hits, name, "hit")
+    CACHE_REQUESTS.set_function(lambda: cache.misses, name, "miss")
+    CACHE_HIT_RATIO.set_function(lambda: cache.hit_ratio, name)
+
+
+class MetricsMiddleware:
+    """ルートごとのリクエスト数と処理時間を記録するASGIミドルウェア
+
+    ラベルはマッチしたルートのテンプレート（/command/{job_id} など）で、routes に
+    無いものは "other" にまとめます（パスのIDでラベルが増えないように）。ルーティング
+    の前に断られたリクエストはパスで判定します。
+    """
+
+    def __init__(self, app, routes: Sequence[str] = ()):
+        self.app = app
+        self._latency = {route: REQUEST_LATENCY.labels(route) for route in routes}
+        self._other = REQUEST_LATENCY.labels("other")
+        self._statuses: Dict[str, Dict[int, _CounterChild]] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            # ルーターがマッチしたルートを scope に書き込む
+            matched = scope.get("route")
+            route = getattr(matched, "path", None) or scope["path"]
+            latency = self._latency.get(route)
+            if latency is None:
+                route, latency = "other", self._other
+            latency.observe(elapsed)
+            counters = self._statuses.get(route)
+            if counters is None:
+                counters = self._statuses[route] = {}
+            counter = counters.get(status)
+            if counter is None:
+                counter = counters[status] = REQUESTS.labels(route, str(status))
+            counter.inc()
+
+
+class LoopLagMonitor:
+    """一定間隔でスリープし、予定より遅れた時間をイベントループの遅延として記録する"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.last_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(loop.time() - start - self.interval, 0.0)
+            LOOP_LAG.observe(self.last_lag)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            LOOP_LAG_LAST.set_function(lambda: self.last_lag)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+loop_monitor = LoopLagMonitor()
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Prometheus形式のメトリクス"""
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
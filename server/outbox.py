@@ -0,0 +1,405 @@
+"""
+送信キュー（アウトボックス）
+/command の送信をSQLite（WALモード）に保存してからバックグラウンドで実行します。
+プロセスが再起動しても未送信のジョブは残り、少なくとも1回は送信されます
+（送信中に落ちた場合は再送されることがあります）。
+同じチャンネル宛てのジョブは登録順に1件ずつ送り、失敗したらバックオフして再試行します。
+書き込みはまとめて1回のコミットにします（グループコミット）。
+送信済みのジョブは保持期間を過ぎたらワーカーが定期的に削除します。
+
+同じデータベースを複数のプロセスのワーカーで共有できます（取り出しはトランザクション
+の中で行い、同じジョブを2つのワーカーが取らない）。送信中のまま stale_after 秒を
+過ぎたジョブは、送信していたプロセスが落ちたものとみなして再送します。
+
+環境変数:
+    OUTBOX_PATH             データベースファイル（既定: $XDG_STATE_HOME/botdiscord/outbox.sqlite3、
+                            XDG_STATE_HOME が無ければ ~/.local/state 以下）
+    OUTBOX_CONCURRENCY      同時に送信するジョブ数（既定: 8）
+    OUTBOX_MAX_ATTEMPTS     失敗とみなすまでの試行回数（既定: 5）
+    OUTBOX_COMMIT_INTERVAL  書き込みをまとめる時間（秒、既定: 0.005）
+    OUTBOX_RETENTION        送信済みのジョブを残しておく秒数（既定: 86400、0で削除しない）
+    OUTBOX_STALE_AFTER      送信中のまま止まったジョブを再送するまでの秒数（既定: 120）
+"""
+
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from applog import get_logger
+
+logger = get_logger("outbox")
+
+# ジョブの状態
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    channel_id TEXT NOT NULL,
+    command TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (channel_id, seq) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS jobs_done ON jobs (updated_at) WHERE status = 'done';
+"""
+
+# チャンネルごとに未完了のうち最も古いジョブだけを取り出す（チャンネル内の順序を守る）
+_CLAIM = """
+SELECT seq, id, channel_id, command, payload, attempts FROM jobs AS j
+WHERE status = 'queued' AND next_attempt_at <= ?
+  AND seq = (
+      SELECT MIN(seq) FROM jobs
+      WHERE channel_id = j.channel_id AND status IN ('queued', 'running')
+  )
+ORDER BY seq
+LIMIT ?
+"""
+
+
+def default_path() -> str:
+    """データベースの既定の場所（作業ディレクトリではなくユーザーの状態ディレクトリ）"""
+    base = os.getenv("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state")
+    return os.path.join(base, "botdiscord", "outbox.sqlite3")
+
+
+class PermanentError(Exception):
+    """再試行しても成功しないエラー"""
+
+
+class Outbox:
+    """SQLiteに保存する送信ジョブのキュー"""
+
+    def __init__(self, path: str, commit_interval: float = 0.005, retention: float = 86400.0):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.retention = retention
+        self._conn: Optional[sqlite3.Connection] = None
+        # 接続は1つのスレッドだけで使う
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+        self._writes: List[Tuple[str, tuple, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self.enqueued = asyncio.Event()
+
+    @classmethod
+    def from_env(cls) -> "Outbox":
+        return cls(
+            os.getenv("OUTBOX_PATH") or default_path(),
+            commit_interval=float(os.getenv("OUTBOX_COMMIT_INTERVAL", "0.005")),
+            retention=float(os.getenv("OUTBOX_RETENTION", "86400")),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(_SCHEMA)
+            conn.row_factory = sqlite3.Row
+            self._conn = conn
+        return self._conn
+
+    async def _call(self, function: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    # --- 書き込み（グループコミット） ---
+
+    def _apply(self, writes: List[Tuple[str, tuple]]) -> None:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params in writes:
+                conn.execute(sql, params)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    async def _flush(self) -> None:
+        await asyncio.sleep(self.commit_interval)
+        writes, self._writes = self._writes, []
+        self._flush_task = None
+        try:
+            await self._call(self._apply, [(sql, params) for sql, params, _ in writes])
+        except Exception as e:
+            for _, _, future in writes:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for _, _, future in writes:
+            if not future.done():
+                future.set_result(None)
+
+    async def _write(self, sql: str, params: tuple) -> None:
+        """書き込みを積み、まとめてコミットされるまで待つ"""
+        future = asyncio.get_running_loop().create_future()
+        self._writes.append((sql, params, future))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+        await future
+
+    async def enqueue(self, channel_id: str, command: str, payload: Dict[str, Any]) -> str:
+        """ジョブを保存してIDを返す（コミットされてから戻る）"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        await self._write(
+            "INSERT INTO jobs (id, channel_id, command, payload, status, next_attempt_at,"
+            " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, channel_id, command, json.dumps(payload), QUEUED, now, now, now),
+        )
+        self.enqueued.set()
+        return job_id
+
+    async def complete(self, job_id: str, result: Any) -> None:
+        await self._write(
+            "UPDATE jobs SET status = ?, result = ?, error = NULL, updated_at = ? WHERE id = ?",
+            (DONE, json.dumps(result, ensure_ascii=False), time.time(), job_id),
+        )
+
+    async def fail(self, job_id: str, error: str) -> None:
+        await self._write(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+            (FAILED, error, time.time(), job_id),
+        )
+
+    async def retry(self, job_id: str, error: str, delay: float) -> None:
+        now = time.time()
+        await self._write(
+            "UPDATE jobs SET status = ?, error = ?, next_attempt_at = ?, updated_at = ?"
+            " WHERE id = ?",
+            (QUEUED, error, now + delay, now, job_id),
+        )
+
+    # --- 読み出し ---
+
+    def _claim(self, limit: int, exclude: Set[str]) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        # 他のプロセスのワーカーと同じジョブを取らないよう、読み出しから書き込み用に
+        # ロックする
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(_CLAIM, (time.time(), limit + len(exclude))).fetchall()
+            jobs = [dict(row) for row in rows if row["channel_id"] not in exclude][:limit]
+            conn.executemany(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ?"
+                " WHERE seq = ?",
+                [(RUNNING, time.time(), job["seq"]) for job in jobs],
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return jobs
+
+    async def claim(self, limit: int, exclude: Set[str] = frozenset()) -> List[Dict[str, Any]]:
+        """送信できるジョブを取り出して running にする"""
+        return await self._call(self._claim, limit, set(exclude))
+
+    def _recover(self, before: float) -> int:
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+            (QUEUED, time.time(), RUNNING, before),
+        )
+        return cursor.rowcount
+
+    async def recover(self, stale_after: float) -> int:
+        """送信中のまま stale_after 秒を過ぎたジョブ（送信したプロセスが落ちた）を再送する"""
+        return await self._call(self._recover, time.time() - stale_after)
+
+    def _purge(self, before: float) -> int:
+        cursor = self._connect().execute(
+            "DELETE FROM jobs WHERE status = ? AND updated_at < ?", (DONE, before)
+        )
+        return cursor.rowcount
+
+    async def purge(self) -> int:
+        """保持期間を過ぎた送信済みのジョブを削除する（失敗したジョブは残す）"""
+        if self.retention <= 0:
+            return 0
+        return await self._call(self._purge, time.time() - self.retention)
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT id, channel_id, command, status, attempts, created_at, updated_at,"
+            " result, error FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._call(self._get, job_id)
+
+    def _counts(self) -> Dict[str, int]:
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+        ).fetchall()
+        return {status: count for status, count in rows}
+
+    async def counts(self) -> Dict[str, int]:
+        return await self._call(self._counts)
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            await self._flush_task
+        if self._conn is not None:
+            await self._call(self._conn.close)
+            self._conn = None
+        self.enqueued = asyncio.Event()
+
+
+Execute = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class OutboxWorker:
+    """アウトボックスのジョブを送信するワーカー"""
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        execute: Execute,
+        concurrency: int = 8,
+        max_attempts: int = 5,
+        poll_interval: float = 1.0,
+        maintenance_interval: float = 60.0,
+        stale_after: float = 120.0,
+    ):
+        self.outbox = outbox
+        self.execute = execute
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.maintenance_interval = maintenance_interval
+        self.stale_after = stale_after
+        self._maintained_at = 0.0
+        self._running: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, outbox: Outbox, execute: Execute) -> "OutboxWorker":
+        return cls(
+            outbox,
+            execute,
+            concurrency=int(os.getenv("OUTBOX_CONCURRENCY", "8")),
+            max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5")),
+            stale_after=float(os.getenv("OUTBOX_STALE_AFTER", "120")),
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """指数バックオフ + ジッター（最大5分）"""
+        return min(2 ** attempt, 300) + random.uniform(0, 1)
+
+    async def _send(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        try:
+            result = await self.execute(json.loads(job["payload"]))
+        except PermanentError as e:
+            logger.warning("ジョブを送信できませんでした: %s", e, extra={"job_id": job_id})
+            await self.outbox.fail(job_id, str(e))
+        except Exception as e:
+            attempts = job["attempts"] + 1
+            if attempts >= self.max_attempts:
+                logger.error(
+                    "ジョブの再試行回数が上限に達しました: %s", e,
+                    extra={"job_id": job_id, "attempts": attempts},
+                )
+                await self.outbox.fail(job_id, str(e))
+            else:
+                delay = self._backoff(attempts)
+                logger.warning(
+                    "ジョブの送信に失敗しました。再試行します: %s", e,
+                    extra={"job_id": job_id, "attempts": attempts, "retry_in": delay},
+                )
+                await self.outbox.retry(job_id, str(e), delay)
+        else:
+            await self.outbox.complete(job_id, result)
+
+    async def _run_job(self, job: Dict[str, Any]) -> None:
+        try:
+            await self._send(job)
+        except Exception as e:
+            # 状態を保存できなかった場合は running のまま残り、次回起動時に再送される
+            logger.exception("ジョブの状態を保存できませんでした: %s", e)
+        finally:
+            self._running.pop(job["channel_id"], None)
+            self.outbox.enqueued.set()
+
+    async def _maintain(self) -> None:
+        """止まったジョブの再送と送信済みのジョブの削除（maintenance_interval 秒ごと）"""
+        now = time.monotonic()
+        if now - self._maintained_at < self.maintenance_interval:
+            return
+        self._maintained_at = now
+        try:
+            recovered = await self.outbox.recover(self.stale_after)
+            purged = await self.outbox.purge()
+        except Exception as e:
+            logger.exception("アウトボックスを整理できませんでした: %s", e)
+            return
+        if recovered:
+            logger.info("送信中のまま止まったジョブを再送します", extra={"jobs": recovered})
+        if purged:
+            logger.info("送信済みのジョブを削除しました", extra={"jobs": purged})
+
+    async def _run(self) -> None:
+        while True:
+            self.outbox.enqueued.clear()
+            await self._maintain()
+            free = self.concurrency - len(self._running)
+            if free > 0:
+                try:
+                    jobs = await self.outbox.claim(free, exclude=set(self._running))
+                except Exception as e:
+                    logger.exception("ジョブを取り出せませんでした: %s", e)
+                    jobs = []
+                for job in jobs:
+                    self._running[job["channel_id"]] = asyncio.create_task(
+                        self._run_job(job)
+                    )
+            # 新しいジョブか送信の完了を待つ（再試行の時刻と他プロセスの登録は定期的に確認）
+            try:
+                await asyncio.wait_for(self.outbox.enqueued.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """取り出しを止め、送信中のジョブを待つ"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._running:
+            await asyncio.wait(list(self._running.values()), timeout=timeout)
@@ -0,0 +1,219 @@
+"""
+スラッシュコマンドのレジストリ
+コマンド定義とハンドラーを1か所にまとめ、各エンドポイント・bot.tree・
+同期用ペイロードが同じテーブルを参照するようにします。
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# ハンドラーの種類
+HTTP = "http"  # Webhook経由のインタラクション（/interactions など）
+GATEWAY = "gateway"  # bot.tree のスラッシュコマンド
+API = "api"  # /command エンドポイント
+
+# アプリケーションコマンドのオプション種別
+SUB_COMMAND = 1
+SUB_COMMAND_GROUP = 2
+STRING = 3
+USER = 6
+
+Path = Tuple[str, ...]
+
+
+class CommandSpec:
+    """コマンドの定義（名前・説明・オプション）"""
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        options: Optional[List[Dict[str, Any]]] = None,
+        deferred: bool = False,
+    ):
+        self.name = name
+        self.description = description
+        self.options = options or []
+        # Webhook経由では type 5 を返してバックグラウンドで実行する
+        self.deferred = deferred
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Discord APIのコマンド登録形式に変換する"""
+        payload = {"name": self.name, "type": 1, "description": self.description}
+        if self.options:
+            payload["options"] = self.options
+        return payload
+
+
+class CommandRegistry:
+    """コマンド名（とサブコマンドのパス）からハンドラーを引くテーブル"""
+
+    def __init__(self):
+        self._specs: Dict[str, CommandSpec] = {}
+        self._tables: Dict[str, Dict[Path, Callable]] = {}
+        # (パス, オプション名) -> オートコンプリートのハンドラー
+        self._autocomplete: Dict[str, Dict[Tuple[Path, str], Callable]] = {}
+
+    def define(
+        self,
+        name: str,
+        description: str,
+        options: Optional[List[Dict[str, Any]]] = None,
+        deferred: bool = False,
+    ) -> CommandSpec:
+        """コマンドを定義する"""
+        spec = CommandSpec(name, description, options, deferred)
+        self._specs[name] = spec
+        return spec
+
+    def handler(self, kind: str, *path: str) -> Callable[[Callable], Callable]:
+        """ハンドラーを登録するデコレーター
+
+        path はコマンド名から始まり、サブコマンドグループ・サブコマンドを続けます。
+        """
+        if not path or path[0] not in self._specs:
+            raise KeyError(f"未定義のコマンドです: {path}")
+
+        def decorator(func: Callable) -> Callable:
+            self._tables.setdefault(kind, {})[tuple(path)] = func
+            return func
+
+        return decorator
+
+    def autocomplete(self, kind: str, *path: str, option: str) -> Callable[[Callable], Callable]:
+        """オプションのオートコンプリートを登録するデコレーター"""
+        if not path or path[0] not in self._specs:
+            raise KeyError(f"未定義のコマンドです: {path}")
+
+        def decorator(func: Callable) -> Callable:
+            self._autocomplete.setdefault(kind, {})[(tuple(path), option)] = func
+            return func
+
+        return decorator
+
+    @property
+    def specs(self) -> Iterable[CommandSpec]:
+        return self._specs.values()
+
+    def spec(self, name: str) -> Optional[CommandSpec]:
+        return self._specs.get(name)
+
+    def table(self, kind: str) -> Dict[Path, Callable]:
+        """指定した種類のディスパッチテーブル"""
+        return self._tables.get(kind, {})
+
+    def lookup(self, kind: str, *path: str) -> Optional[Callable]:
+        """パスに一致するハンドラーを返す（最長一致）"""
+        table = self._tables.get(kind, {})
+        for end in range(len(path), 0, -1):
+            handler = table.get(path[:end])
+            if handler is not None:
+                return handler
+        return None
+
+    def resolve(
+        self, kind: str, data: Dict[str, Any]
+    ) -> Tuple[Optional[Callable], Dict[str, Any]]:
+        """インタラクションの data からハンドラーとオプション値を取り出す"""
+        path, options = command_path(data)
+        if not path:
+            return None, options
+        return self.lookup(kind, *path), options
+
+    def resolve_autocomplete(
+        self, kind: str, data: Dict[str, Any]
+    ) -> Tuple[Optional[Callable], str, Dict[str, Any]]:
+        """入力中のオプションのハンドラー、入力中の値、他のオプション値を取り出す"""
+        path, options = _leaf_options(data)
+        focused = next((option for option in options if option.get("focused")), None)
+        values = {option["name"]: option.get("value") for option in options}
+        if not path or focused is None:
+            return None, "", values
+        table = self._autocomplete.get(kind, {})
+        handler = table.get((path, focused["name"]))
+        return handler, str(focused.get("value") or ""), values
+
+    def install(self, tree) -> None:
+        """GATEWAY ハンドラーを bot.tree に登録する"""
+        from discord import app_commands
+
+        for path, callback in self.table(GATEWAY).items():
+            spec = self._specs[path[0]]
+            descriptions = {
+                option["name"]: option["description"]
+                for option in spec.options
+                if option.get("type") not in (SUB_COMMAND, SUB_COMMAND_GROUP)
+            }
+            if descriptions:
+                callback = app_commands.describe(**descriptions)(callback)
+            completers = {
+                option: func
+                for (command, option), func in self._autocomplete.get(GATEWAY, {}).items()
+                if command == path
+            }
+            if completers:
+                callback = app_commands.autocomplete(**completers)(callback)
+            tree.add_command(
+                app_commands.Command(
+                    name=spec.name, description=spec.description, callback=callback
+                )
+            )
+
+    def to_payload(self) -> List[Dict[str, Any]]:
+        """コマンド一括登録（PUT /applications/{id}/commands）用のペイロード"""
+        return [spec.to_dict() for spec in self._specs.values()]
+
+
+def _leaf_options(data: Dict[str, Any]) -> Tuple[Path, List[Dict[str, Any]]]:
+    """data からコマンドのパスと、サブコマンドの下のオプションを取り出す"""
+    name = data.get("name")
+    if not name:
+        return (), []
+    path = [name]
+    options = data.get("options") or []
+    while len(options) == 1 and options[0].get("type") in (
+        SUB_COMMAND,
+        SUB_COMMAND_GROUP,
+    ):
+        path.append(options[0]["name"])
+        options = options[0].get("options") or []
+    return tuple(path), options
+
+
+def command_path(data: Dict[str, Any]) -> Tuple[Path, Dict[str, Any]]:
+    """data からコマンドのパスとオプション値（name -> value）を取り出す"""
+    path, options = _leaf_options(data)
+    return path, {option["name"]: option.get("value") for option in options}
+
+
+# 共有レジストリとコマンド定義
+registry = CommandRegistry()
+
+registry.define("ping", "Botの応答時間を測定します")
+registry.define("hello", "挨拶をします")
+registry.define("serverinfo", "サーバー情報を表示します")
+registry.define(
+    "userinfo",
+    "ユーザー情報を表示します",
+    options=[
+        {
+            "type": USER,
+            "name": "user",
+            "description": "情報を表示するユーザー",
+            "required": False,
+        }
+    ],
+)
+registry.define("here", "現在のサーバー、カテゴリ、チャンネル情報を表示します")
+registry.define(
+    "channel",
+    "チャンネルを名前で検索します",
+    options=[
+        {
+            "type": STRING,
+            "name": "name",
+            "description": "チャンネル名",
+            "required": True,
+            "autocomplete": True,
+        }
+    ],
+)
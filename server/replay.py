@@ -0,0 +1,117 @@
+"""
+リプレイ対策
+X-Signature-Timestamp が古いリクエストを署名検証の前に拒否し、最近処理した
+インタラクションIDを固定長のリングバッファで覚えておきます。同じIDが再送された
+場合はハンドラーを再実行せず、保存しておいた応答のバイト列を返します。
+
+環境変数:
+    REPLAY_WINDOW       タイムスタンプの許容範囲（秒、既定: 300、0で無効）
+    REPLAY_CACHE_SIZE   覚えておくインタラクションIDの数（既定: 4096、0で重複排除を無効）
+"""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+Produce = Callable[[], Awaitable[bytes]]
+
+
+class ReplayGuard:
+    """タイムスタンプの鮮度チェックと、インタラクションIDの重複排除"""
+
+    def __init__(self, window: float = 300.0, max_entries: int = 4096):
+        self.window = window
+        self.max_entries = max(max_entries, 0)
+        self.hits = 0
+        self.misses = 0
+        # 古い順に上書きするリングバッファ（ID）と、ID -> [位置, 受信時刻, 応答]
+        self._ring: List[Optional[str]] = [None] * self.max_entries
+        self._position = 0
+        self._entries: Dict[str, list] = {}
+
+    @classmethod
+    def from_env(cls) -> "ReplayGuard":
+        return cls(
+            window=float(os.getenv("REPLAY_WINDOW", "300")),
+            max_entries=int(os.getenv("REPLAY_CACHE_SIZE", "4096")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def is_fresh(self, timestamp: str, now: Optional[float] = None) -> bool:
+        """タイムスタンプ（UNIX秒）が許容範囲内か（時計のずれは前後どちらも許す）"""
+        if not self.enabled:
+            return True
+        try:
+            sent_at = int(timestamp)
+        except (TypeError, ValueError):
+            return False
+        now = time.time() if now is None else now
+        return abs(now - sent_at) <= self.window
+
+    def _lookup(self, interaction_id: str) -> Optional[asyncio.Future]:
+        entry = self._entries.get(interaction_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > self.window:
+            # 期間外のIDは鮮度チェックで弾かれるので忘れてよい
+            self._forget(interaction_id, entry)
+            return None
+        return entry[2]
+
+    def _remember(self, interaction_id: str, future: asyncio.Future) -> None:
+        slot = self._position
+        evicted = self._ring[slot]
+        if evicted is not None:
+            entry = self._entries.get(evicted)
+            if entry is not None and entry[0] == slot:
+                del self._entries[evicted]
+        self._ring[slot] = interaction_id
+        self._entries[interaction_id] = [slot, time.monotonic(), future]
+        self._position = (slot + 1) % self.max_entries
+
+    def _forget(self, interaction_id: str, entry: list) -> None:
+        del self._entries[interaction_id]
+        if self._ring[entry[0]] == interaction_id:
+            self._ring[entry[0]] = None
+
+    async def response(self, interaction_id: Optional[str], produce: Produce) -> bytes:
+        """初めてのIDなら produce() を実行し、重複なら前回の応答を返す"""
+        if not self.enabled or not self.max_entries or not interaction_id:
+            return await produce()
+
+        pending = self._lookup(interaction_id)
+        if pending is not None:
+            self.hits += 1
+            # 処理中の重複は同じ結果を待つ
+            return await asyncio.shield(pending)
+        self.misses += 1
+
+        future = asyncio.get_running_loop().create_future()
+        self._remember(interaction_id, future)
+        try:
+            content = await produce()
+            future.set_result(content)
+            return content
+        except BaseException as e:
+            # 失敗した応答は保存せず、再送されたら処理し直す
+            entry = self._entries.get(interaction_id)
+            if entry is not None and entry[2] is future:
+                self._forget(interaction_id, entry)
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                future.exception()
+            else:
+                future.cancel()
+            raise
@@ -0,0 +1,105 @@
+"""
+コマンド応答のキャッシュ
+入力が同じなら同じ応答になるコマンドは、キー関数とTTLを指定して
+エンコード済みの応答を使い回します。容量はエンコード後のバイト数で管理し、
+上限を超えたら古いものから捨てます（LRU）。
+
+環境変数:
+    RESPONSE_CACHE_MAX_BYTES  キャッシュの上限（バイト、既定: 1048576、0で無効）
+"""
+
+import functools
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from codec import Encoded
+
+Handler = Callable[[Any], Awaitable[Dict[str, Any]]]
+
+
+class ResponseCache:
+    """エンコード済みの応答を保持するLRUキャッシュ"""
+
+    def __init__(self, max_bytes: int = 1 << 20):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # キー -> (期限, 応答, バイト数)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Encoded, int]]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(1 << 20))))
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Encoded]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response, _ = entry
+        if expires_at < time.monotonic():
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def set(self, key: Hashable, response: Encoded, ttl: Optional[float] = None) -> None:
+        size = len(response.body)
+        if size > self.max_bytes:
+            return
+        self._discard(key)
+        expires_at = float("inf") if ttl is None else time.monotonic() + ttl
+        self._entries[key] = (expires_at, response, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.size -= evicted
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def cached(
+        self, key: Callable[[Any], Hashable], ttl: Optional[float] = None
+    ) -> Callable[[Handler], Handler]:
+        """ハンドラーの応答をキャッシュするデコレーター
+
+        key はインタラクションのコンテキストからキャッシュキーを作る関数、
+        ttl は有効期間（秒、None なら期限なし）です。
+        """
+
+        def decorator(handler: Handler) -> Handler:
+            @functools.wraps(handler)
+            async def wrapper(ctx) -> Dict[str, Any]:
+                if self.max_bytes <= 0:
+                    return await handler(ctx)
+                cache_key = (handler, key(ctx))
+                response = self.get(cache_key)
+                if response is not None:
+                    self.hits += 1
+                    return response
+                self.misses += 1
+                response = await handler(ctx)
+                if not isinstance(response, Encoded):
+                    response = Encoded(response)
+                self.set(cache_key, response, ttl)
+                return response
+
+            return wrapper
+
+        return decorator
@@ -0,0 +1,317 @@
+"""
+Discord REST APIクライアント
+キープアライブの接続プールを使い回し、X-RateLimit-* ヘッダーからルートごとの
+バケットを管理します。バケットの残りが無いときは 429 を受ける前に待ち、
+429・5xx はジッター付きで再試行します。接続エラー・タイムアウトは、送信済みかも
+しれないリクエストを2回送らないよう、冪等なメソッドと接続できなかった場合だけ
+再試行します。
+
+バケットのハッシュはIDを伏せたルートごと、バケットの状態はハッシュとメジャー
+パラメーターごとに持ちます。Webhookのトークンはハッシュ値にしてから使い、リセット
+時刻を過ぎたバケットは定期的に捨てます。
+
+環境変数:
+    DISCORD_TOKEN       Botトークン
+    DISCORD_API_BASE    APIのURL（ローカルの偽サーバーに向ける場合）
+    REST_MAX_CONNECTIONS  接続プールの上限（既定: 100）
+"""
+
+import asyncio
+import hashlib
+import os
+import random
+import re
+import time
+from typing import Any, Dict, Optional
+
+from applog import get_logger
+
+logger = get_logger("rest")
+
+DEFAULT_API_BASE = "https://discord.com/api/v10"
+PLACEHOLDER_TOKEN = "your_discord_bot_token_here"
+
+# バケットを分けるメジャーパラメーター（Webhookはトークンまで）
+_MAJOR = re.compile(r"^/(?:channels|guilds|webhooks)/(\d+)(?:/([^/]+))?")
+_SNOWFLAKE = re.compile(r"/\d{15,25}")
+_TOKEN = re.compile(r"^(/(?:webhooks|interactions)/[^/]+/)[^/]+")
+
+# 同じリクエストを2回送っても結果が変わらないメソッド（PATCH は同じ内容への編集なので含める）
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE", "PATCH"})
+
+# リセット時刻を過ぎたバケットを捨てる間隔（秒）
+_SWEEP_INTERVAL = 60.0
+
+
+class DiscordHTTPError(Exception):
+    """Discord APIがエラーを返した"""
+
+    def __init__(self, status: int, body: Any, method: str, path: str):
+        super().__init__(f"{method} {path}: {status} {body}")
+        self.status = status
+        self.body = body
+
+
+class NotFound(DiscordHTTPError):
+    pass
+
+
+class RateLimitBucket:
+    """1つのレート制限バケットの状態"""
+
+    __slots__ = ("lock", "remaining", "reset_at")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+
+    def update(self, headers) -> None:
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if remaining is not None:
+            self.remaining = int(remaining)
+        if reset_after is not None:
+            self.reset_at = time.monotonic() + float(reset_after)
+
+    def delay(self) -> float:
+        """次のリクエストまで待つ秒数"""
+        if self.remaining == 0:
+            return max(self.reset_at - time.monotonic(), 0.0)
+        return 0.0
+
+
+def route_key(method: str, path: str) -> str:
+    """IDとWebhook・インタラクションのトークンを伏せたルート名（バケットのハッシュを引くキー）"""
+    path = _TOKEN.sub(r"\1:token", path.split("?", 1)[0])
+    return f"{method} {_SNOWFLAKE.sub('/:id', path)}"
+
+
+def major_parameter(path: str) -> str:
+    """バケットを分けるメジャーパラメーター（Webhookのトークンはハッシュ値にする）"""
+    match = _MAJOR.match(path)
+    if match is None:
+        return ""
+    major, token = match.groups()
+    if path.startswith("/webhooks/") and token:
+        major += "/" + hashlib.blake2s(token.encode(), digest_size=8).hexdigest()
+    return major
+
+
+class DiscordRESTClient:
+    """レート制限を考慮したDiscord REST APIクライアント"""
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        api_base: Optional[str] = None,
+        max_connections: int = 100,
+        max_retries: int = 3,
+        timeout: float = 10.0,
+    ):
+        self.token = token if token and token != PLACEHOLDER_TOKEN else None
+        api_base = api_base or os.getenv("DISCORD_API_BASE", DEFAULT_API_BASE)
+        self.api_base = api_base.rstrip("/")
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._session = None
+        # ルート名 -> X-RateLimit-Bucket のハッシュ（ルートの数だけ）
+        self._bucket_hashes: Dict[str, str] = {}
+        # "ハッシュ（無ければルート名）:メジャーパラメーター" -> バケット
+        self._buckets: Dict[str, RateLimitBucket] = {}
+        self._swept_at = time.monotonic()
+        self._global_reset_at = 0.0
+
+    @classmethod
+    def from_env(cls) -> "DiscordRESTClient":
+        return cls(
+            os.getenv("DISCORD_TOKEN"),
+            max_connections=int(os.getenv("REST_MAX_CONNECTIONS", "100")),
+        )
+
+    @property
+    def authorized(self) -> bool:
+        return self.token is not None
+
+    def _get_session(self):
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections, keepalive_timeout=60
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    def _bucket_id(self, key: str, major: str) -> str:
+        # 同じハッシュでもメジャーパラメーターが違えば別バケット
+        return f"{self._bucket_hashes.get(key, key)}:{major}"
+
+    def _bucket(self, key: str, major: str) -> RateLimitBucket:
+        bucket_id = self._bucket_id(key, major)
+        bucket = self._buckets.get(bucket_id)
+        if bucket is None:
+            self._sweep()
+            bucket = self._buckets[bucket_id] = RateLimitBucket()
+        return bucket
+
+    def _sweep(self) -> None:
+        """リセット時刻を過ぎ、使われていないバケットを捨てる（_SWEEP_INTERVAL ごと）"""
+        now = time.monotonic()
+        if now - self._swept_at < _SWEEP_INTERVAL:
+            return
+        self._swept_at = now
+        expired = [
+            bucket_id
+            for bucket_id, bucket in self._buckets.items()
+            if bucket.reset_at <= now and not bucket.lock.locked()
+        ]
+        for bucket_id in expired:
+            del self._buckets[bucket_id]
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """指数バックオフ + ジッター"""
+        return min(2 ** attempt, 30) * 0.5 + random.uniform(0, 0.5)
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        json: Any = None,
+        params: Optional[Dict[str, Any]] = None,
+        auth: bool = True,
+    ) -> Any:
+        """APIを呼び出してJSONを返す（204の場合は None）
+
+        429・5xx は max_retries 回まで再試行し、それでも失敗したら最後のエラーを
+        送出します。接続エラー・タイムアウトを再試行するのは冪等なメソッドの場合と、
+        接続できずに送信していない場合だけです（POST を2回送らない）。
+        """
+        import aiohttp
+
+        key = route_key(method, path)
+        major = major_parameter(path)
+        idempotent = method in IDEMPOTENT_METHODS
+        headers = {}
+        if auth and self.token:
+            headers["Authorization"] = f"Bot {self.token}"
+
+        error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            if error is not None:
+                logger.warning(
+                    "リクエストを再試行します",
+                    extra={"route": key, "attempt": attempt, "error": str(error)},
+                )
+            # 429 はバケットの待ち時間で、それ以外はバックオフで待ってから再試行する
+            backoff = 0.0
+            bucket = self._bucket(key, major)
+            # 同じバケットのリクエストは順番に送る
+            async with bucket.lock:
+                delay = max(bucket.delay(), self._global_reset_at - time.monotonic())
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                session = self._get_session()
+                try:
+                    async with session.request(
+                        method,
+                        self.api_base + path,
+                        json=json,
+                        params=params,
+                        headers=headers,
+                    ) as response:
+                        bucket.update(response.headers)
+                        bucket_hash = response.headers.get("X-RateLimit-Bucket")
+                        if bucket_hash and self._bucket_hashes.get(key) != bucket_hash:
+                            # 以降はハッシュで引けるように今のバケットを移す
+                            previous_id = self._bucket_id(key, major)
+                            if self._buckets.get(previous_id) is bucket:
+                                del self._buckets[previous_id]
+                            self._bucket_hashes[key] = bucket_hash
+                            self._buckets.setdefault(self._bucket_id(key, major), bucket)
+
+                        if response.status == 204:
+                            return None
+                        if response.content_type == "application/json":
+                            body = await response.json()
+                        else:
+                            body = await response.text()
+
+                        if response.status < 300:
+                            return body
+
+                        error_class = NotFound if response.status == 404 else DiscordHTTPError
+                        error = error_class(response.status, body, method, path)
+
+                        if response.status == 429:
+                            retry_after = float(
+                                (body.get("retry_after") if isinstance(body, dict) else None)
+                                or response.headers.get("Retry-After", 1)
+                            )
+                            if response.headers.get("X-RateLimit-Global") or (
+                                isinstance(body, dict) and body.get("global")
+                            ):
+                                self._global_reset_at = time.monotonic() + retry_after
+                            logger.warning(
+                                "レート制限に達しました",
+                                extra={"route": key, "retry_after": retry_after},
+                            )
+                            bucket.remaining = 0
+                            bucket.reset_at = (
+                                time.monotonic() + retry_after + random.uniform(0, 0.25)
+                            )
+                        elif response.status >= 500:
+                            backoff = self._backoff(attempt)
+                        else:
+                            raise error
+                except aiohttp.ClientConnectorError as e:
+                    # 接続できなかった（リクエストは送っていない）
+                    error = e
+                    backoff = self._backoff(attempt)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    # 応答が途中で切れた・タイムアウトした（Discordが受け付けた可能性がある）
+                    if not idempotent:
+                        raise
+                    error = e
+                    backoff = self._backoff(attempt)
+
+            # バックオフはロックの外で待ち、同じバケットの他のリクエストを止めない
+            if backoff and attempt < self.max_retries:
+                await asyncio.sleep(backoff)
+
+        raise error
+
+    async def get(self, path: str, **kwargs) -> Any:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> Any:
+        return await self.request("POST", path, **kwargs)
+
+    async def put(self, path: str, **kwargs) -> Any:
+        return await self.request("PUT", path, **kwargs)
+
+    async def patch(self, path: str, **kwargs) -> Any:
+        return await self.request("PATCH", path, **kwargs)
+
+    async def delete(self, path: str, **kwargs) -> Any:
+        return await self.request("DELETE", path, **kwargs)
+
+    async def fetch(self, path: str) -> Any:
+        """GETして結果を返す。トークン未設定や404の場合は None"""
+        if not self.authorized:
+            return None
+        try:
+            return await self.get(path)
+        except NotFound:
+            return None
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
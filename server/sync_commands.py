@@ -1,76 +1,218 @@
 #!/usr/bin/env python3
 """
 Discordスラッシュコマンド同期スクリプト
-Vercelにデプロイされたサーバーのスラッシュコマンドを手動で同期します。
+デプロイ済みのサーバー（preview / staging / prod など）のスラッシュコマンドを同期します。
+複数のターゲットは1つのHTTPセッションで並行して処理し、各ターゲットの /bot/status が
+ready になるまでバックオフしながら待ってから /bot/sync-commands を呼び出します。
+
+    python sync_commands.py
+    python sync_commands.py staging=https://staging.example.com prod=https://botdiscord-rust.vercel.app
+    SYNC_TARGETS=https://a.example.com,https://b.example.com python sync_commands.py --force
+
+終了コード:
+    0  すべてのターゲットで同期に成功
+    1  同期に失敗したターゲットがある
+    2  引数が不正
+    3  同期の失敗は無いが、待機時間内に ready にならなかったターゲットがある
 """
 
-import requests
-import json
+import argparse
+import asyncio
+import os
+import random
 import sys
 import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+DEFAULT_URL = "https://botdiscord-rust.vercel.app"
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_NOT_READY = 3
+
+# ターゲットごとの結果
+OK = "ok"
+FAILED = "failed"
+NOT_READY = "not ready"
+
+
+def parse_target(value: str) -> Tuple[str, str]:
+    """"名前=URL" または URL を (名前, URL) にする"""
+    name, sep, url = value.partition("=")
+    if not sep:
+        name, url = "", value
+    url = url.strip().rstrip("/")
+    if not url.startswith(("http://", "https://")):
+        raise argparse.ArgumentTypeError(f"URLではありません: {value}")
+    return name.strip() or url.split("://", 1)[1], url
+
+
+def backoff_delays(initial: float, maximum: float):
+    """指数バックオフ（ジッター付き）の待ち時間"""
+    delay = initial
+    while True:
+        yield delay * random.uniform(0.5, 1.0)
+        delay = min(delay * 2, maximum)
+
+
+async def wait_until_ready(
+    session: aiohttp.ClientSession,
+    url: str,
+    deadline: float,
+    initial: float,
+    maximum: float,
+) -> Tuple[bool, int, str]:
+    """/bot/status が ready になるまで待つ（戻り値: ready か、試行回数、最後の状態）"""
+    attempts = 0
+    last = ""
+    for delay in backoff_delays(initial, maximum):
+        attempts += 1
+        try:
+            async with session.get(f"{url}/bot/status") as response:
+                if response.status == 200:
+                    status = await response.json()
+                    if status.get("bot_ready"):
+                        return True, attempts, ""
+                    last = "bot_ready=false"
+                else:
+                    # デプロイ直後の 404 / 5xx も待つ
+                    last = f"HTTP {response.status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            last = type(e).__name__
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False, attempts, last
+        await asyncio.sleep(min(delay, remaining))
+
+
+async def sync_target(
+    session: aiohttp.ClientSession, name: str, url: str, args: argparse.Namespace
+) -> Dict[str, Any]:
+    start = time.monotonic()
+    result: Dict[str, Any] = {"target": name, "url": url}
+
+    ready, attempts, last = await wait_until_ready(
+        session, url, start + args.wait, args.backoff, args.max_backoff
+    )
+    result["attempts"] = attempts
+    if not ready:
+        return dict(result, result=NOT_READY, detail=last, elapsed=time.monotonic() - start)
 
-def sync_commands(vercel_url="https://botdiscord-rust.vercel.app"):
-    """スラッシュコマンドを同期する"""
-    
-    print("🔄 Discordスラッシュコマンドを同期中...")
-    
-    # Botの状態を確認
-    try:
-        status_response = requests.get(f"{vercel_url}/bot/status", timeout=10)
-        status_data = status_response.json()
-        print(f"📊 Bot状態: {json.dumps(status_data, indent=2, ensure_ascii=False)}")
-        
-        if not status_data.get("bot_ready", False):
-            print("⚠️ Botが起動していません。環境変数が設定されているか確認してください。")
-            return False
-            
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Bot状態の確認に失敗しました: {e}")
-        return False
-    
-    # スラッシュコマンドを同期
     try:
-        sync_response = requests.post(f"{vercel_url}/bot/sync-commands", timeout=30)
-        sync_data = sync_response.json()
-        
-        if sync_data.get("status") == "success":
-            print("✅ スラッシュコマンドの同期が成功しました！")
-            print(f"📝 同期されたコマンド数: {sync_data.get('synced_commands', 0)}")
-            print(f"🔧 コマンド一覧: {', '.join(sync_data.get('commands', []))}")
-            return True
-        else:
-            print(f"❌ スラッシュコマンドの同期に失敗しました: {sync_data}")
-            return False
-            
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 同期リクエストに失敗しました: {e}")
-        return False
-
-def main():
-    """メイン関数"""
-    print("🤖 Discord Bot スラッシュコマンド同期ツール")
-    print("=" * 50)
-    
-    # コマンドライン引数からURLを取得
-    vercel_url = sys.argv[1] if len(sys.argv) > 1 else "https://botdiscord-rust.vercel.app"
-    
-    print(f"🌐 対象URL: {vercel_url}")
-    print()
-    
-    # 同期実行
-    success = sync_commands(vercel_url)
-    
-    if success:
+        async with session.post(
+            f"{url}/bot/sync-commands", params={"force": "true" if args.force else "false"}
+        ) as response:
+            data = await response.json(content_type=None)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        return dict(result, result=FAILED, detail=type(e).__name__, elapsed=time.monotonic() - start)
+
+    elapsed = time.monotonic() - start
+    if not isinstance(data, dict) or data.get("status") != "success":
+        detail = data.get("error") if isinstance(data, dict) else None
+        return dict(result, result=FAILED, detail=detail or str(data)[:80], elapsed=elapsed)
+
+    diff = data.get("diff") or {}
+    return dict(
+        result,
+        result=OK,
+        commands=data.get("synced_commands", 0),
+        changed=bool(data.get("changed")),
+        diff=" ".join(
+            f"{sign}{len(diff.get(key) or ())}"
+            for sign, key in (("+", "added"), ("~", "changed"), ("-", "removed"))
+        ),
+        guilds=len(data.get("guilds") or {}),
+        elapsed=elapsed,
+    )
+
+
+async def sync_all(targets: List[Tuple[str, str]], args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """すべてのターゲットを1つのセッション（接続を再利用）で並行して同期する"""
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        return await asyncio.gather(
+            *(sync_target(session, name, url, args) for name, url in targets)
+        )
+
+
+def format_table(results: List[Dict[str, Any]]) -> str:
+    headers = ("target", "result", "commands", "changed", "diff", "guilds", "tries", "time")
+    rows = []
+    for r in results:
+        ok = r["result"] == OK
+        rows.append((
+            r["target"],
+            r["result"] if ok or not r.get("detail") else f"{r['result']} ({r['detail']})",
+            str(r["commands"]) if ok else "-",
+            ("yes" if r["changed"] else "no") if ok else "-",
+            r["diff"] if ok else "-",
+            str(r["guilds"]) if ok else "-",
+            str(r["attempts"]),
+            f"{r['elapsed']:.1f}s",
+        ))
+    widths = [max(len(row[i]) for row in rows + [headers]) for i in range(len(headers))]
+    lines = ["  ".join(value.ljust(width) for value, width in zip(headers, widths))]
+    lines.extend(
+        "  ".join(value.ljust(width) for value, width in zip(row, widths)) for row in rows
+    )
+    return "\n".join(line.rstrip() for line in lines)
+
+
+def exit_code(results: List[Dict[str, Any]]) -> int:
+    outcomes = {r["result"] for r in results}
+    if FAILED in outcomes:
+        return EXIT_FAILED
+    if NOT_READY in outcomes:
+        return EXIT_NOT_READY
+    return EXIT_OK
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="デプロイ先のスラッシュコマンドを同期します")
+    parser.add_argument(
+        "targets", nargs="*", type=parse_target,
+        help="同期するURL（名前=URL も可）。省略時は SYNC_TARGETS、無ければ本番URL",
+    )
+    parser.add_argument("--force", action="store_true", help="変更が無くても同期する")
+    parser.add_argument(
+        "--wait", type=float, default=float(os.getenv("SYNC_WAIT", "120")),
+        help="ready になるまで待つ最大秒数（既定: 120）",
+    )
+    parser.add_argument("--backoff", type=float, default=1.0, help="最初の再試行までの秒数")
+    parser.add_argument("--max-backoff", type=float, default=15.0, help="再試行間隔の上限（秒）")
+    parser.add_argument("--timeout", type=float, default=30.0, help="1リクエストのタイムアウト（秒）")
+    parser.add_argument("--concurrency", type=int, default=16, help="同時接続数の上限")
+    args = parser.parse_args(argv)
+
+    if not args.targets:
+        env_targets = [t for t in os.getenv("SYNC_TARGETS", "").split(",") if t.strip()]
+        try:
+            args.targets = [parse_target(t) for t in env_targets or [DEFAULT_URL]]
+        except argparse.ArgumentTypeError as e:
+            parser.error(str(e))
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    print(f"🔄 {len(args.targets)} 個のターゲットでスラッシュコマンドを同期中...", flush=True)
+
+    results = asyncio.run(sync_all(args.targets, args))
+    print(format_table(results))
+
+    code = exit_code(results)
+    if code == EXIT_OK:
         print("\n🎉 同期が完了しました！")
-        print("💡 Discordでスラッシュコマンドが利用可能になります。")
-        sys.exit(0)
+    elif code == EXIT_NOT_READY:
+        print("\n⚠️ Botが ready にならなかったターゲットがあります。")
+        print("  - 環境変数（DISCORD_TOKEN, DISCORD_PUBLIC_KEY）が設定されているか確認してください")
     else:
-        print("\n💥 同期に失敗しました。")
-        print("🔍 以下を確認してください:")
-        print("  - Vercelにデプロイが完了しているか")
-        print("  - 環境変数（DISCORD_TOKEN, DISCORD_PUBLIC_KEY）が設定されているか")
-        print("  - BotがDiscordサーバーに招待されているか")
-        sys.exit(1)
+        print("\n💥 同期に失敗したターゲットがあります。")
+    return code
+
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,63 @@
+from autocomplete import MAX_CHOICES, IndexSet, PrefixIndex
+
+
+def names(choices):
+    return [choice["name"] for choice in choices]
+
+
+def test_prefix_search_stops_at_sort_boundary():
+    index = PrefixIndex([
+        ("aa", 1), ("ab", 2), ("abc", 3), ("abd", 4), ("ac", 5), ("b", 6),
+    ])
+    assert names(index.search("ab")) == ["ab", "abc", "abd"]
+    # 最後のキーより後ろを探しても範囲外にならない
+    assert index.search("c") == []
+    assert names(index.search("")) == ["aa", "ab", "abc", "abd", "ac", "b"]
+
+
+def test_same_name_with_different_values_are_kept():
+    index = PrefixIndex([("role", 1), ("role", 2), ("roles", 3)])
+    assert [choice["value"] for choice in index.search("role")] == [1, 2, 3]
+
+
+def test_search_returns_at_most_limit():
+    index = PrefixIndex((f"item{i:03}", i) for i in range(100))
+    choices = index.search("item")
+    assert len(choices) == MAX_CHOICES
+    assert choices[0]["value"] == 0 and choices[-1]["value"] == MAX_CHOICES - 1
+    assert len(index.search("item", limit=3)) == 3
+
+
+def test_search_ignores_case_and_width():
+    index = PrefixIndex([("General", 1), ("ＧＡＭＥ", 2), ("news", 3)])
+    assert names(index.search("g")) == ["ＧＡＭＥ", "General"]
+    assert names(index.search("GEN")) == ["General"]
+    assert names(index.search("ｇａ")) == ["ＧＡＭＥ"]
+
+
+def test_add_replaces_and_remove_deletes_by_value():
+    index = PrefixIndex([("alpha", 1), ("beta", 2)])
+    index.add("gamma", 1)
+    assert names(index.search("")) == ["beta", "gamma"]
+    assert index.remove(2) is True
+    assert index.remove(2) is False
+    assert names(index.search("")) == ["gamma"] and len(index) == 1
+
+
+def test_replace_applies_small_and_large_diffs():
+    entries = [(f"n{i:02}", i) for i in range(20)]
+    index = PrefixIndex(entries)
+    # 差分が少ない場合
+    index.replace(entries[1:] + [("x", 99)])
+    assert 0 not in index and names(index.search("x")) == ["x"]
+    # ほとんど入れ替わる場合
+    index.replace([("y", 1), ("z", 2)])
+    assert names(index.search("")) == ["y", "z"] and len(index) == 2
+
+
+def test_index_set_evicts_oldest():
+    indexes = IndexSet(max_indexes=2)
+    for key in ("a", "b", "c"):
+        indexes.build(key, lambda: [(key, 1)])
+    assert indexes.get("a") is None
+    assert names(indexes.get("c").search("")) == ["c"]
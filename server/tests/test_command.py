@@ -0,0 +1,35 @@
+from fastapi.testclient import TestClient
+
+import main
+
+# lifespan を動かさない（Botは起動しない）
+client = TestClient(main.app)
+
+
+def test_batch_with_invalid_item_is_rejected_before_running(monkeypatch):
+    ran = []
+
+    async def run_command(command_request):
+        ran.append(command_request.channel_id)
+        return {}
+
+    monkeypatch.setattr(main, "run_command", run_command)
+    response = client.post("/command/batch", json={
+        "command": "ping", "user_id": "1",
+        "targets": [{"channel_id": "10"}, {"channel_id": "general"}],
+    })
+    assert response.status_code == 400
+    assert response.json()["detail"] == "1件目: channel_id と user_id は数値のIDです"
+
+    response = client.post("/command/batch", json={
+        "commands": [{"command": "nope", "user_id": "1", "channel_id": "10"}],
+    })
+    assert response.status_code == 400
+    assert ran == []
+
+
+def test_command_rejects_non_numeric_ids():
+    response = client.post(
+        "/command", json={"command": "ping", "user_id": "1", "channel_id": "10", "guild_id": "x"}
+    )
+    assert response.status_code == 400
@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+
+from command_sync import CommandSyncer, command_hashes, diff, normalize
+
+PING = {
+    "name": "ping",
+    "description": "応答速度",
+    "options": [
+        {"type": 3, "name": "target", "description": "対象", "channel_types": [2, 0]},
+    ],
+}
+
+
+def test_hash_ignores_key_order():
+    reordered = {
+        "options": [
+            {"channel_types": [0, 2], "description": "対象", "name": "target", "type": 3},
+        ],
+        "description": "応答速度",
+        "name": "ping",
+    }
+    assert command_hashes([PING]) == command_hashes([reordered])
+
+
+def test_hash_treats_defaults_like_remote_values():
+    # APIから返る定義には既定値が埋まっている
+    remote = {
+        "id": "1",
+        "application_id": "2",
+        "version": "3",
+        "type": 1,
+        "name": "ping",
+        "description": "応答速度",
+        "options": [
+            {
+                "type": 3,
+                "name": "target",
+                "description": "対象",
+                "required": False,
+                "channel_types": [0, 2],
+                "choices": None,
+                "min_length": None,
+            },
+        ],
+        "nsfw": False,
+        "dm_permission": None,
+        "default_member_permissions": None,
+    }
+    assert normalize(remote) == normalize(PING)
+    assert command_hashes([remote]) == command_hashes([PING])
+
+
+def test_hash_changes_with_definition():
+    changed = dict(PING, description="レイテンシ")
+    permissions = dict(PING, default_member_permissions=8)
+    hashes = {key: command_hashes([c])["1:ping"] for key, c in
+              (("base", PING), ("changed", changed), ("permissions", permissions))}
+    assert len(set(hashes.values())) == 3
+    assert normalize(permissions)["default_member_permissions"] == "8"
+
+
+def test_diff():
+    local = {"1:a": "x", "1:b": "y", "1:c": "z"}
+    remote = {"1:b": "y", "1:c": "changed", "1:d": "w"}
+    assert diff(local, remote) == {"added": ["1:a"], "removed": ["1:d"], "changed": ["1:c"]}
+
+
+class FakeTree:
+    def __init__(self, commands):
+        self.commands = commands
+        self.client = SimpleNamespace(application_id=1)
+        self.fetched = 0
+        self.synced = 0
+
+    def get_commands(self, guild=None):
+        return [SimpleNamespace(to_dict=lambda c=c: c) for c in self.commands]
+
+    async def fetch_commands(self, guild=None):
+        self.fetched += 1
+        return []
+
+    async def sync(self, guild=None):
+        self.synced += 1
+        return self.commands
+
+
+def test_syncer_uploads_only_when_changed(tmp_path, monkeypatch):
+    monkeypatch.delenv("COMMAND_SYNC_GUILD_IDS", raising=False)
+    path = str(tmp_path / "state.json")
+    tree = FakeTree([PING])
+    result = asyncio.run(CommandSyncer(tree, state_path=path, source="file").sync())
+    assert result["global"]["changed"] and tree.synced == 1 and tree.fetched == 1
+
+    # 保存した状態と同じなら API を呼ばない
+    result = asyncio.run(CommandSyncer(tree, state_path=path, source="file").sync())
+    assert not result["global"]["changed"] and tree.synced == 1 and tree.fetched == 1
+
+    tree.commands = [dict(PING, description="レイテンシ")]
+    result = asyncio.run(CommandSyncer(tree, state_path=path, source="file").sync())
+    assert result["global"]["diff"]["changed"] == ["1:ping"] and tree.synced == 2
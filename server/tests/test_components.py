@@ -0,0 +1,64 @@
+import pytest
+
+from components import MAX_CUSTOM_ID, ComponentRouter, pager
+
+
+def make_router():
+    router = ComponentRouter()
+
+    @router.handler("http", "pg", int, str, bool)
+    def paging(*state):
+        return state
+
+    return router, paging
+
+
+def test_custom_id_round_trip():
+    router, paging = make_router()
+    snowflake = 1234567890123456789
+    custom_id = ComponentRouter.custom_id("pg", snowflake, "name", True)
+    assert custom_id.startswith("pg:") and str(snowflake) not in custom_id
+    assert router.resolve("http", custom_id) == (paging, (snowflake, "name", True))
+    assert router.resolve("http", ComponentRouter.custom_id("pg", -5, "", False)) == (
+        paging, (-5, "", False),
+    )
+
+
+@pytest.mark.parametrize("custom_id", [
+    "xx:1:a:1",  # 登録されていないハンドラーID
+    "pg",  # 状態が足りない
+    "pg:1:a",
+    "pg:1:a:1:extra",  # 状態が多すぎる
+    "pg:!:a:1",  # 36進数でない
+    "",
+])
+def test_unknown_or_broken_custom_id(custom_id):
+    router, _ = make_router()
+    assert router.resolve("http", custom_id) == (None, ())
+
+
+def test_handlers_are_separated_by_kind():
+    router, _ = make_router()
+    assert router.resolve("gateway", "pg:1:a:1") == (None, ())
+
+
+def test_invalid_ids_and_state_are_rejected():
+    router, _ = make_router()
+    with pytest.raises(ValueError):
+        router.handler("http", "a:b")
+    with pytest.raises(ValueError):
+        ComponentRouter.custom_id("pg", "a:b")
+    with pytest.raises(ValueError):
+        ComponentRouter.custom_id("pg", "x" * MAX_CUSTOM_ID)
+
+
+def test_pager_disables_buttons_at_edges():
+    assert pager("si", page=0, total=1) == []
+    previous, following = pager("si", 42, page=0, total=3)[0]["components"]
+    assert previous["disabled"] and not following["disabled"]
+    assert previous["custom_id"] != following["custom_id"]
+    router = ComponentRouter()
+    router.handler("http", "si", int, int)(print)
+    assert router.resolve("http", following["custom_id"])[1] == (42, 1)
+    last = pager("si", 42, page=2, total=3)[0]["components"]
+    assert not last[0]["disabled"] and last[1]["disabled"]
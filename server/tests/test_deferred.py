@@ -0,0 +1,61 @@
+"""JobPool の同時実行数制限とフォローアップ送信のテスト"""
+
+import asyncio
+
+from deferred import JobPool, StubFollowupSender
+
+
+def blocking_job(started: list, release: asyncio.Event, name: str):
+    async def job():
+        started.append(name)
+        await release.wait()
+        return {"data": {"content": name}}
+
+    return job
+
+
+def test_saturated_command_does_not_starve_others():
+    async def scenario():
+        sender = StubFollowupSender()
+        pool = JobPool(sender, workers=2, limits={"slow": 1})
+        started = []
+        release = asyncio.Event()
+        for i in range(3):
+            assert pool.submit("slow", blocking_job(started, release, f"slow{i}"), "app", f"s{i}")
+
+        async def fast():
+            return {"data": {"content": "fast"}}
+
+        assert pool.submit("fast", fast, "app", "f")
+        # slow は1件ずつしか実行されず、空いているワーカーが fast を処理する
+        await asyncio.wait_for(sender.event.wait(), 1)
+        assert sender.sent == [("app", "f", {"content": "fast"})]
+        assert started == ["slow0"]
+        assert pool.pending == 2
+
+        release.set()
+        await pool.close(timeout=1)
+        assert [token for _, token, _ in sender.sent] == ["f", "s0", "s1", "s2"]
+
+    asyncio.run(scenario())
+
+
+def test_failed_job_sends_error_and_queue_limit():
+    async def scenario():
+        sender = StubFollowupSender()
+        pool = JobPool(sender, workers=1, queue_size=2)
+
+        async def broken():
+            raise RuntimeError("boom")
+
+        assert pool.submit("a", broken, "app", "t1")
+        assert pool.submit("a", broken, "app", "t2")
+        # 実行を始めていないジョブが queue_size に達したら受け付けない
+        assert not pool.submit("a", broken, "app", "t3")
+        await pool.close(timeout=1)
+        assert sender.sent == [
+            ("app", "t1", {"content": "エラーが発生しました。"}),
+            ("app", "t2", {"content": "エラーが発生しました。"}),
+        ]
+
+    asyncio.run(scenario())
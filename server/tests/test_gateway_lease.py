@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from gateway_lease import FileLease, GatewayCoordinator, NoLease, parse_shard_ids
+
+
+def test_parse_shard_ids():
+    assert parse_shard_ids("0-3,5", 8) == [0, 1, 2, 3, 5]
+    assert parse_shard_ids(" 2, 0 ,2,", None) == [0, 2]
+    assert parse_shard_ids(None, 3) == [0, 1, 2]
+    assert parse_shard_ids("", None) == [0]
+
+
+def test_parse_shard_ids_out_of_range():
+    with pytest.raises(ValueError):
+        parse_shard_ids("0-4", 4)
+    with pytest.raises(ValueError):
+        parse_shard_ids("a", 4)
+
+
+def test_file_leases_contend_for_shard(tmp_path):
+    async def run():
+        first = FileLease(str(tmp_path), "test")
+        second = FileLease(str(tmp_path), "test")
+        other = FileLease(str(tmp_path), "other")
+        assert await first.acquire(0)
+        # flock は開いたファイルごとなので、同じプロセスでも別のリースは取れない
+        assert not await second.acquire(0)
+        assert await second.acquire(1)
+        assert await other.acquire(0)
+        assert await first.renew(0) and not await second.renew(0)
+        await first.release(0)
+        assert await second.acquire(0)
+        for lease in (first, second, other):
+            for shard_id in (0, 1):
+                await lease.release(shard_id)
+
+    asyncio.run(run())
+
+
+def test_coordinators_split_shards(tmp_path):
+    async def run():
+        first = GatewayCoordinator(FileLease(str(tmp_path), "test"), [0, 1, 2], max_shards=2)
+        second = GatewayCoordinator(FileLease(str(tmp_path), "test"), [0, 1, 2])
+        assert await first.claim() == [0, 1]
+        assert await second.claim() == [2]
+        assert first.role == second.role == "owner"
+        await first.release_all()
+        assert first.role == "standby"
+        assert await second.claim() == [0, 1, 2]
+        await second.release_all()
+
+    asyncio.run(run())
+
+
+def test_no_lease_always_acquires():
+    coordinator = GatewayCoordinator(NoLease(), [0, 1])
+    assert asyncio.run(coordinator.claim()) == [0, 1]
+    assert coordinator.status()["lease"] == "none"
@@ -0,0 +1,52 @@
+import asyncio
+from types import SimpleNamespace
+
+from gateway_status import GatewayStatus
+
+
+class FakeClient:
+    """GatewayStatus が使う属性だけを持つクライアント"""
+
+    def __init__(self, guilds, users):
+        self.guilds = guilds
+        self.user = SimpleNamespace(id=1)
+        self.ws = None
+        self._connection = SimpleNamespace(_users=users)
+        self.listeners = {}
+
+    def add_listener(self, func, name):
+        self.listeners[name] = func
+
+    def emit(self, name, *args):
+        asyncio.run(self.listeners[name](*args))
+
+
+def guild(member_count):
+    return SimpleNamespace(member_count=member_count, unavailable=False)
+
+
+def test_users_follow_cache_and_ready_clears_on_disconnect():
+    client = FakeClient([guild(3), guild(5)], {1: "a", 2: "b"})
+    status = GatewayStatus(client)
+
+    client.emit("on_connect")
+    client.emit("on_ready")
+    snapshot = status.snapshot()
+    assert snapshot["bot_ready"] is True
+    assert snapshot["guilds"] == 2
+    assert snapshot["members"] == 8
+    assert snapshot["users"] == 2
+
+    client._connection._users[3] = "c"
+    client.emit("on_member_join", None)
+    assert status.snapshot()["users"] == 3
+    assert status.snapshot()["members"] == 9
+
+    client.emit("on_disconnect")
+    assert status.ready is False
+    assert status.snapshot()["bot_ready"] is False
+    assert status.shard_status()["0"]["connected"] is False
+
+    client.emit("on_connect")
+    client.emit("on_resumed")
+    assert status.snapshot()["bot_ready"] is True
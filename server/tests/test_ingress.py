@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from ingress import BODY_TOO_LARGE, IngressGuard
+
+SIGNATURE = b"ab" * 64
+HEADERS = {
+    b"x-signature-ed25519": SIGNATURE,
+    b"x-signature-timestamp": b"1700000000",
+    b"content-type": b"application/json",
+}
+
+
+class App:
+    """受け取ったボディを記録するASGIアプリ"""
+
+    def __init__(self):
+        self.bodies = []
+
+    async def __call__(self, scope, receive, send):
+        message = await receive()
+        self.bodies.append(message["body"])
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+def call(guard, headers, chunks, path="/interactions"):
+    """ボディを chunks に分けて送り、(ステータス, 読まれたチャンク数) を返す"""
+    messages = []
+    pending = list(chunks)
+    read = 0
+
+    async def receive():
+        nonlocal read
+        read += 1
+        chunk = pending.pop(0)
+        return {"type": "http.request", "body": chunk, "more_body": bool(pending)}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": path, "headers": list(headers.items())}
+    asyncio.run(guard(scope, receive, send))
+    return messages[0]["status"], read
+
+
+def test_valid_request_reaches_app_with_whole_body():
+    app = App()
+    guard = IngressGuard(app, max_body=16)
+    assert call(guard, HEADERS, [b'{"type":', b"1}"]) == (200, 2)
+    assert app.bodies == [b'{"type":1}']
+
+
+@pytest.mark.parametrize("name, value, status", [
+    (b"x-signature-ed25519", None, 401),
+    (b"x-signature-ed25519", b"zz" * 64, 401),
+    (b"x-signature-ed25519", SIGNATURE[:-2], 401),
+    (b"x-signature-timestamp", None, 401),
+    (b"x-signature-timestamp", b"-1", 401),
+    (b"content-type", b"text/plain", 415),
+    (b"content-type", None, 415),
+    (b"content-length", b"12a", 400),
+    (b"content-length", b"17", 413),
+])
+def test_bad_headers_are_rejected_before_reading_body(name, value, status):
+    app = App()
+    headers = dict(HEADERS)
+    if value is None:
+        headers.pop(name, None)
+    else:
+        headers[name] = value
+    assert call(IngressGuard(app, max_body=16), headers, [b"{}"]) == (status, 0)
+    assert app.bodies == []
+
+
+def test_content_type_parameters_are_allowed():
+    headers = {**HEADERS, b"content-type": b"Application/JSON; charset=utf-8"}
+    assert call(IngressGuard(App()), headers, [b"{}"])[0] == 200
+
+
+def test_oversized_body_stops_reading_without_content_length():
+    app = App()
+    guard = IngressGuard(app, max_body=16)
+    rejected = guard._counters[BODY_TOO_LARGE].value
+    # 上限を超えたチャンクで読むのをやめ、残りは読まない
+    assert call(guard, HEADERS, [b"x" * 10, b"x" * 10, b"x" * 10]) == (413, 2)
+    assert guard._counters[BODY_TOO_LARGE].value - rejected == 1
+    assert app.bodies == []
+
+
+def test_other_paths_are_not_checked():
+    app = App()
+    assert call(IngressGuard(app), {}, [b"{}"], path="/command") == (200, 1)
@@ -0,0 +1,91 @@
+import asyncio
+import signal
+
+from lifecycle import DRAINING, DrainMiddleware, Lifecycle, hook_uvicorn
+
+
+class App:
+    """/slow は release されるまで応答しないASGIアプリ"""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def __call__(self, scope, receive, send):
+        if scope["path"] == "/slow":
+            self.started.set()
+            await self.release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def request(app, path):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    await app({"type": "http", "path": path}, receive, send)
+    start = messages[0]
+    return start["status"], dict(start["headers"])
+
+
+def test_requests_during_drain_get_503():
+    async def main():
+        lifecycle = Lifecycle(drain_timeout=5)
+        lifecycle.mark_ready()
+        inner = App()
+        app = DrainMiddleware(inner, lifecycle, exempt=("/health/ready",))
+
+        slow = asyncio.create_task(request(app, "/slow"))
+        await inner.started.wait()
+        drain = asyncio.create_task(lifecycle.drain())
+        await asyncio.sleep(0)
+
+        assert lifecycle.state == DRAINING and not lifecycle.ready
+        status, headers = await request(app, "/fast")
+        assert status == 503
+        assert headers[b"retry-after"] == b"1"
+        # プローブはドレイン中も処理する
+        assert (await request(app, "/health/ready"))[0] == 200
+        assert not drain.done()
+
+        inner.release.set()
+        assert (await slow)[0] == 200
+        assert await drain is True
+
+    asyncio.run(main())
+
+
+def test_uvicorn_exits_only_after_drain():
+    from uvicorn import Config
+    from uvicorn.server import Server
+
+    original = Server.handle_exit
+
+    async def main():
+        lifecycle = Lifecycle(drain_timeout=5)
+        lifecycle.mark_ready()
+        hook_uvicorn(lifecycle)
+        server = Server(Config(App()))
+        with lifecycle.track():
+            server.handle_exit(signal.SIGTERM, None)
+            await asyncio.sleep(0.05)
+            # 処理中の仕事が終わるまでは uvicorn に終了を伝えない
+            assert lifecycle.state == DRAINING
+            assert not server.should_exit
+        await asyncio.sleep(0.05)
+        assert server.should_exit
+
+        # ドレイン中の2回目のシグナルはすぐに伝える
+        server.should_exit = False
+        server.handle_exit(signal.SIGINT, None)
+        assert server.should_exit
+
+    try:
+        asyncio.run(main())
+    finally:
+        Server.handle_exit = original
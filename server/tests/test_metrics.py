@@ -0,0 +1,40 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from metrics import REQUESTS, MetricsMiddleware, router
+
+
+def requests(route, status):
+    return REQUESTS.labels(route, str(status)).value
+
+
+def test_routes_are_labelled_by_template():
+    app = FastAPI()
+
+    @app.get("/jobs/{job_id}")
+    async def job(job_id: str):
+        return {"job_id": job_id}
+
+    @app.post("/jobs/batch")
+    async def batch():
+        return {}
+
+    app.add_middleware(MetricsMiddleware, routes=("/jobs/{job_id}", "/jobs/batch"))
+    app.include_router(router)
+
+    before = {
+        key: requests(*key)
+        for key in (("/jobs/{job_id}", 200), ("/jobs/batch", 200), ("other", 200), ("other", 404))
+    }
+    client = TestClient(app)
+    client.get("/jobs/1")
+    client.get("/jobs/2")
+    client.post("/jobs/batch")
+    client.get("/metrics")
+    client.get("/missing")
+
+    assert requests("/jobs/{job_id}", 200) - before[("/jobs/{job_id}", 200)] == 2
+    assert requests("/jobs/batch", 200) - before[("/jobs/batch", 200)] == 1
+    assert requests("other", 200) - before[("other", 200)] == 1
+    assert requests("other", 404) - before[("other", 404)] == 1
+    assert ("/jobs/1", "200") not in REQUESTS._children
@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+from outbox import DONE, FAILED, QUEUED, Outbox, OutboxWorker, PermanentError
+
+
+def test_worker_purges_done_jobs_after_retention(tmp_path):
+    async def execute(payload):
+        if payload["fail"]:
+            raise PermanentError("not found")
+        return {"sent": True}
+
+    async def main():
+        outbox = Outbox(str(tmp_path / "outbox.sqlite3"), retention=0.05)
+        worker = OutboxWorker(outbox, execute, poll_interval=0.01, maintenance_interval=0.01)
+        done = await outbox.enqueue("1", "ping", {"fail": False})
+        failed = await outbox.enqueue("2", "ping", {"fail": True})
+        worker.start()
+        for _ in range(100):
+            if (await outbox.counts()).keys() == {DONE, FAILED}:
+                break
+            await asyncio.sleep(0.01)
+        assert (await outbox.get(done))["status"] == DONE
+
+        # 保持期間が過ぎると送信済みのジョブだけが消える
+        await asyncio.sleep(0.1)
+        for _ in range(100):
+            if await outbox.get(done) is None:
+                break
+            await asyncio.sleep(0.01)
+        assert await outbox.get(done) is None
+        assert (await outbox.get(failed))["status"] == FAILED
+
+        await worker.stop()
+        await outbox.close()
+
+    asyncio.run(main())
+
+
+def test_zero_retention_keeps_done_jobs(tmp_path):
+    async def main():
+        outbox = Outbox(str(tmp_path / "outbox.sqlite3"), retention=0)
+        job_id = await outbox.enqueue("1", "ping", {})
+        await outbox.complete(job_id, None)
+        time.sleep(0.01)
+        assert await outbox.purge() == 0
+        assert (await outbox.get(job_id))["status"] == DONE
+        await outbox.close()
+
+    asyncio.run(main())
+
+
+def test_workers_sharing_a_database_send_each_job_once(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    sent = []
+
+    async def execute(payload):
+        sent.append(payload["n"])
+        await asyncio.sleep(0.001)
+
+    async def main():
+        outboxes = [Outbox(path), Outbox(path)]
+        workers = [OutboxWorker(outbox, execute, poll_interval=0.01) for outbox in outboxes]
+        for n in range(40):
+            await outboxes[0].enqueue(str(n % 8), "ping", {"n": n})
+        for worker in workers:
+            worker.start()
+        for _ in range(300):
+            if (await outboxes[0].counts()) == {DONE: 40}:
+                break
+            await asyncio.sleep(0.01)
+        for worker in workers:
+            await worker.stop()
+        for outbox in outboxes:
+            await outbox.close()
+
+    asyncio.run(main())
+    assert sorted(sent) == list(range(40))
+
+
+def test_stale_running_jobs_are_recovered(tmp_path):
+    async def main():
+        outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+        job_id = await outbox.enqueue("1", "ping", {})
+        assert [job["id"] for job in await outbox.claim(1)] == [job_id]
+        # 送信中になったばかりのジョブは他のワーカーが送信中とみなして残す
+        assert await outbox.recover(stale_after=60) == 0
+        time.sleep(0.02)
+        assert await outbox.recover(stale_after=0.01) == 1
+        assert (await outbox.get(job_id))["status"] == QUEUED
+        await outbox.close()
+
+    asyncio.run(main())
+
+
+def test_default_path_is_outside_the_working_directory(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path))
+    monkeypatch.delenv("OUTBOX_PATH", raising=False)
+    assert Outbox.from_env().path == str(tmp_path / "botdiscord" / "outbox.sqlite3")
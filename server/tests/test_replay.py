@@ -0,0 +1,30 @@
+import asyncio
+
+from replay import ReplayGuard
+
+
+def run(guard, interaction_id, calls):
+    async def produce():
+        calls.append(interaction_id)
+        return b"ok"
+
+    return asyncio.run(guard.response(interaction_id, produce))
+
+
+def test_duplicate_returns_saved_response():
+    guard = ReplayGuard(max_entries=2)
+    calls = []
+    for interaction_id in ("1", "1", "2", "3", "1"):
+        assert run(guard, interaction_id, calls) == b"ok"
+    # "1" は "3" で押し出されたので再実行される
+    assert calls == ["1", "2", "3", "1"]
+    assert guard.hits == 1
+
+
+def test_zero_cache_size_disables_deduplication():
+    guard = ReplayGuard(max_entries=0)
+    calls = []
+    for interaction_id in ("1", "1"):
+        assert run(guard, interaction_id, calls) == b"ok"
+    assert calls == ["1", "1"]
+    assert guard.is_fresh("0") is False
@@ -0,0 +1,185 @@
+import asyncio
+import socket
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import rest
+from rest import DiscordHTTPError, DiscordRESTClient, NotFound, route_key
+
+
+class FakeDiscord:
+    """用意した応答を順番に返す偽のDiscord API"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    async def handle(self, request):
+        self.calls.append((request.path, time.monotonic()))
+        # 最後の応答は何度でも返す
+        respond = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        return await respond()
+
+
+def json_response(status=200, body=None, **headers):
+    async def respond():
+        return web.json_response(body if body is not None else {}, status=status, headers=headers)
+
+    return respond
+
+
+async def serve(fake, test):
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", fake.handle)
+    server = TestServer(app)
+    await server.start_server()
+    client = DiscordRESTClient("token", api_base=str(server.make_url("")), timeout=0.5)
+    # バックオフを短くする
+    client._backoff = lambda attempt: 0.01
+    try:
+        await test(client)
+    finally:
+        await client.close()
+        await server.close()
+
+
+def test_waits_for_bucket_reset_before_sending():
+    fake = FakeDiscord([
+        json_response(body={"n": 1}, **{
+            "X-RateLimit-Bucket": "abc", "X-RateLimit-Remaining": "0",
+            "X-RateLimit-Reset-After": "0.2",
+        }),
+        json_response(body={"n": 2}),
+    ])
+
+    async def test(client):
+        assert await client.get("/channels/1/messages") == {"n": 1}
+        assert await client.get("/channels/1/messages") == {"n": 2}
+
+    asyncio.run(serve(fake, test))
+    assert fake.calls[1][1] - fake.calls[0][1] >= 0.2
+
+
+def test_retries_after_429():
+    fake = FakeDiscord([
+        json_response(429, {"retry_after": 0.1, "global": False}),
+        json_response(body={"ok": True}),
+    ])
+
+    async def test(client):
+        assert await client.get("/guilds/1") == {"ok": True}
+
+    asyncio.run(serve(fake, test))
+    assert len(fake.calls) == 2
+    assert fake.calls[1][1] - fake.calls[0][1] >= 0.1
+
+
+def test_server_errors_exhaust_retries():
+    fake = FakeDiscord([json_response(502, {"message": "bad gateway"})])
+
+    async def test(client):
+        with pytest.raises(DiscordHTTPError) as info:
+            await client.get("/guilds/1")
+        assert info.value.status == 502
+
+    asyncio.run(serve(fake, test))
+    assert len(fake.calls) == 4
+
+
+def test_not_found_is_not_retried():
+    fake = FakeDiscord([json_response(404, {"message": "Unknown"})])
+
+    async def test(client):
+        with pytest.raises(NotFound):
+            await client.get("/users/1")
+        assert await client.fetch("/users/1") is None
+
+    asyncio.run(serve(fake, test))
+    assert len(fake.calls) == 2
+
+
+def test_timeout_is_retried():
+    async def slow():
+        await asyncio.sleep(1)
+        return web.json_response({})
+
+    fake = FakeDiscord([slow, json_response(body={"ok": True})])
+
+    async def test(client):
+        assert await client.get("/guilds/1") == {"ok": True}
+
+    asyncio.run(serve(fake, test))
+    assert len(fake.calls) == 2
+
+
+def test_post_timeout_is_not_retried():
+    async def slow():
+        await asyncio.sleep(1)
+        return web.json_response({})
+
+    fake = FakeDiscord([slow, json_response(body={"ok": True})])
+
+    async def test(client):
+        # Discordが受け付けた後のタイムアウトかもしれないので2回目は送らない
+        with pytest.raises(asyncio.TimeoutError):
+            await client.post("/channels/1/messages", json={"content": "hi"})
+
+    asyncio.run(serve(fake, test))
+    assert len(fake.calls) == 1
+
+
+def test_webhook_tokens_are_not_kept_in_bucket_keys():
+    fake = FakeDiscord([json_response(**{
+        "X-RateLimit-Bucket": "webhook", "X-RateLimit-Remaining": "4",
+        "X-RateLimit-Reset-After": "0.05",
+    })])
+    tokens = [f"secret-token-{n}" for n in range(5)]
+
+    async def test(client):
+        for token in tokens:
+            await client.patch(f"/webhooks/123456789012345678/{token}/messages/@original", json={})
+        keys = list(client._bucket_hashes) + list(client._buckets)
+        assert not any(token in key for key in keys for token in tokens)
+        # ハッシュはルートごとに1つ、バケットはトークンごと
+        assert list(client._bucket_hashes) == ["PATCH /webhooks/:id/:token/messages/@original"]
+        assert len(client._buckets) == 5
+
+        # リセット時刻を過ぎたバケットは次に新しいバケットを作るときに捨てる
+        await asyncio.sleep(0.1)
+        client._swept_at -= rest._SWEEP_INTERVAL
+        await client.get("/guilds/1")
+        assert len(client._buckets) == 1
+
+    asyncio.run(serve(fake, test))
+
+
+def test_route_key_hides_ids_and_tokens():
+    assert route_key("GET", "/guilds/123456789012345678/members/223456789012345678?limit=1") == (
+        "GET /guilds/:id/members/:id"
+    )
+    assert route_key("POST", "/interactions/123456789012345678/abc.def/callback") == (
+        "POST /interactions/:id/:token/callback"
+    )
+
+
+def test_connection_errors_exhaust_retries():
+    # 誰も待ち受けていないポート
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    async def test():
+        client = DiscordRESTClient("token", api_base=f"http://127.0.0.1:{port}", max_retries=2)
+        client._backoff = lambda attempt: 0.01
+        try:
+            # 接続できなかったリクエストは送っていないので POST でも再試行する
+            with pytest.raises(aiohttp.ClientConnectionError):
+                await client.post("/channels/1/messages", json={})
+        finally:
+            await client.close()
+
+    asyncio.run(test())
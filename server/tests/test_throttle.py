@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+import throttle as throttle_module
+from metrics import THROTTLED
+from throttle import COMMAND, GUILD, USER, MemoryBackend, Rule, Throttle, retry_after
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(throttle_module.time, "monotonic", clock)
+    return clock
+
+
+def make(command=None, user=None, guild=None) -> Throttle:
+    return Throttle({COMMAND: command, USER: user, GUILD: guild}, MemoryBackend())
+
+
+def check(throttle, *args):
+    return asyncio.run(throttle.check(*args))
+
+
+def test_bucket_refills_with_elapsed_time(clock):
+    throttle = make(user=Rule(2, 10))
+    assert check(throttle, "1") == 0
+    assert check(throttle, "1") == 0
+    # 1トークンは5秒で補充される
+    assert check(throttle, "1") == pytest.approx(5)
+    clock.now += 2.5
+    assert check(throttle, "1") == pytest.approx(2.5)
+    clock.now += 2.5
+    assert check(throttle, "1") == 0
+    # 他のユーザーは別のバケット
+    assert check(throttle, "2") == 0
+
+
+def test_denied_call_does_not_consume_narrower_buckets(clock):
+    throttle = make(command=Rule(5, 10), user=Rule(5, 10), guild=Rule(1, 10))
+    guild_throttled = THROTTLED.labels(GUILD).value
+    assert check(throttle, "1", "g", "ping") == 0
+    # ギルドの枠で断られた呼び出しはユーザーとコマンドの枠を使わない
+    for _ in range(10):
+        assert check(throttle, "1", "g", "ping") > 0
+    assert THROTTLED.labels(GUILD).value - guild_throttled == 10
+    tables = throttle.backend._tables
+    assert tables[USER]["1"][0] == 4
+    assert tables[COMMAND]["1:ping"][0] == 4
+    # 別のギルドではそのまま使える
+    assert check(throttle, "1", "h", "ping") == 0
+
+
+def test_check_all_is_all_or_nothing(clock):
+    throttle = make(command=Rule(1, 10))
+    assert check(throttle, "2", None, "batch") == 0
+    # 2人目が制限中なら1人目の枠も使わない
+    assert asyncio.run(throttle.check_all([("1", None, "batch"), ("2", None, "batch")])) > 0
+    assert throttle.backend._tables[COMMAND]["1:batch"][0] == 1
+    clock.now += 10
+    assert asyncio.run(throttle.check_all([("1", None, "batch"), ("2", None, "batch")])) == 0
+    assert throttle.backend._tables[COMMAND]["1:batch"][0] == 0
+
+
+def test_rule_parse():
+    assert Rule.parse("0") is None
+    assert Rule.parse("") is None
+    rule = Rule.parse("10/5")
+    assert (rule.capacity, rule.rate) == (10, 2)
+    assert repr(Rule.parse("3")) == "3/1"
+
+
+@pytest.mark.parametrize(
+    "wait, header", [(0.01, "1"), (0.5, "1"), (1.0, "1"), (1.01, "2"), (2.5, "3"), (10.0, "10")]
+)
+def test_retry_after_rounds_up_to_whole_seconds(wait, header):
+    assert retry_after(wait) == header
@@ -0,0 +1,258 @@
+"""
+リクエストの流量制限（トークンバケット）
+ユーザー・ユーザーとコマンドの組・ギルドごとにバケットを持ち、1回の実行で
+トークンを1つずつ使います。使うのは関係するすべてのバケットに残りがある場合だけで、
+1つでも足りなければどれも減らしません。トークンは参照したときに経過時間から補充する（タイマーを
+使わない）ので、バケットは最後の残量と時刻だけを保持します。満タンまで補充された
+バケットは無いのと同じなので、しばらく使われていないものから捨てます。
+
+環境変数:
+    THROTTLE_USER       ユーザーごとの上限（"回数/秒"、既定: 10/10、0で無効）
+    THROTTLE_COMMAND    ユーザーとコマンドの組ごとの上限（既定: 5/10）
+    THROTTLE_GUILD      ギルドごとの上限（既定: 100/10）
+    THROTTLE_MAX_KEYS   プロセス内で保持するバケットの最大数（種類ごと、既定: 65536）
+    THROTTLE_URL        複数ワーカーで共有する場合の Redis 互換ストアのURL
+"""
+
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from metrics import THROTTLED
+
+# バケットの種類（狭い順。制限に掛かったときのメトリクスは最初に足りなかった種類で数える）
+COMMAND = "command"
+USER = "user"
+GUILD = "guild"
+
+SCOPES = (COMMAND, USER, GUILD)
+
+_DEFAULTS = {USER: "10/10", COMMAND: "5/10", GUILD: "100/10"}
+
+# (種類, キー, ルール)
+Bucket = Tuple[str, str, "Rule"]
+
+
+class Rule:
+    """バケットの容量と1秒あたりの補充量"""
+
+    __slots__ = ("capacity", "rate")
+
+    def __init__(self, capacity: float, period: float):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+
+    @classmethod
+    def parse(cls, text: str) -> Optional["Rule"]:
+        """"10/10"（10秒に10回）を読む（空や 0 なら制限しない）"""
+        text = text.strip()
+        if not text or text == "0":
+            return None
+        count, _, period = text.partition("/")
+        rule = cls(float(count), float(period or 1))
+        return rule if rule.capacity > 0 else None
+
+    @property
+    def idle_after(self) -> float:
+        """空のバケットが満タンに戻るまでの秒数"""
+        return self.capacity / self.rate
+
+    def __repr__(self) -> str:
+        return f"{self.capacity:g}/{self.idle_after:g}"
+
+
+class MemoryBackend:
+    """プロセス内のバケット表
+
+    種類ごとに キー -> [残量, 最後に使った時刻] のdictを持ち、使うたびに末尾へ
+    移します。先頭が最も長く使われていないバケットなので、満タンに戻ったものを
+    先頭から捨てれば表全体を走査せずに済みます。
+    """
+
+    def __init__(self, max_keys: int = 65536):
+        self.max_keys = max_keys
+        self._tables: Dict[str, "OrderedDict[str, List[float]]"] = {}
+
+    def __len__(self) -> int:
+        return sum(len(table) for table in self._tables.values())
+
+    def _evict(self, table: "OrderedDict[str, List[float]]", rule: Rule, now: float) -> None:
+        # 満タンに戻ったバケットを古い順に捨てる（1回あたり数件まで）
+        for _ in range(2):
+            key = next(iter(table), None)
+            if key is None or now - table[key][1] < rule.idle_after:
+                break
+            del table[key]
+        # それでも多すぎる場合は最も古いバケットを捨てる（その分だけ制限が緩む）
+        while len(table) > self.max_keys:
+            table.popitem(last=False)
+
+    async def take_all(self, buckets: Sequence[Bucket]) -> Tuple[float, Optional[str]]:
+        """すべてのバケットに残りがあれば1つずつ使って (0, None) を返す
+
+        足りないバケットがあればどれも使わず、(待つべき秒数, 最初に足りなかった種類) を返します。
+        """
+        now = time.monotonic()
+        states = []
+        for scope, key, rule in buckets:
+            table = self._tables.get(scope)
+            if table is None:
+                table = self._tables[scope] = OrderedDict()
+            bucket = table.get(key)
+            if bucket is None:
+                bucket = table[key] = [rule.capacity, now]
+            else:
+                bucket[0] = min(rule.capacity, bucket[0] + (now - bucket[1]) * rule.rate)
+                bucket[1] = now
+                table.move_to_end(key)
+            states.append(bucket)
+
+        wait, denied = 0.0, None
+        for (scope, _, rule), bucket in zip(buckets, states):
+            if bucket[0] < 1:
+                wait = max(wait, (1 - bucket[0]) / rule.rate)
+                denied = denied or scope
+        if denied is None:
+            for bucket in states:
+                bucket[0] -= 1
+        for scope, _, rule in buckets:
+            self._evict(self._tables[scope], rule, now)
+        return wait, denied
+
+
+# すべてのバケットを補充して確認し、残りがあれば全部から1つずつ使う（満タンに戻る時刻にキーが消える）
+# ARGV: 現在時刻, (容量, 1秒あたりの補充量) をキーの数だけ
+_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local tokens = {}
+local wait = 0
+local denied = 0
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('hmget', KEYS[i], 't', 's')
+    local t = tonumber(state[1]) or capacity
+    local stamp = tonumber(state[2]) or now
+    t = math.min(capacity, t + math.max(now - stamp, 0) * rate)
+    tokens[i] = t
+    if t < 1 then
+        wait = math.max(wait, (1 - t) / rate)
+        if denied == 0 then
+            denied = i
+        end
+    end
+end
+if denied > 0 then
+    return {tostring(wait), denied}
+end
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local t = tokens[i] - 1
+    redis.call('hset', KEYS[i], 't', tostring(t), 's', tostring(now))
+    redis.call('pexpire', KEYS[i], math.ceil((capacity - t) / rate * 1000) + 1000)
+end
+return {'0', 0}
+"""
+
+
+class RedisBackend:
+    """Redis互換ストアのバケット（複数ワーカー・インスタンスで共有する）"""
+
+    def __init__(self, url: str, prefix: str = "botdiscord:throttle:"):
+        import redis.asyncio as redis
+
+        self._client = redis.from_url(url)
+        self.prefix = prefix
+
+    async def take_all(self, buckets: Sequence[Bucket]) -> Tuple[float, Optional[str]]:
+        args = [repr(time.time())]
+        for _, _, rule in buckets:
+            args += [repr(rule.capacity), repr(rule.rate)]
+        wait, denied = await self._client.eval(
+            _TAKE_SCRIPT, len(buckets),
+            *[f"{self.prefix}{scope}:{key}" for scope, key, _ in buckets], *args,
+        )
+        return float(wait), buckets[int(denied) - 1][0] if int(denied) else None
+
+
+class Throttle:
+    """ユーザー・コマンド・ギルドのバケットをまとめて確認する"""
+
+    def __init__(self, rules: Dict[str, Optional[Rule]], backend=None):
+        self.rules = {scope: rule for scope, rule in rules.items() if rule is not None}
+        self.backend = backend or MemoryBackend()
+        self._throttled = {scope: THROTTLED.labels(scope) for scope in SCOPES}
+
+    @classmethod
+    def from_env(cls) -> "Throttle":
+        rules = {
+            scope: Rule.parse(os.getenv(f"THROTTLE_{scope.upper()}", _DEFAULTS[scope]))
+            for scope in SCOPES
+        }
+        url = os.getenv("THROTTLE_URL")
+        if url:
+            backend = RedisBackend(url)
+        else:
+            backend = MemoryBackend(int(os.getenv("THROTTLE_MAX_KEYS", "65536")))
+        return cls(rules, backend)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rules)
+
+    def _buckets(
+        self, user_id: str, guild_id: Optional[str], command: Optional[str]
+    ) -> List[Bucket]:
+        buckets = []
+        rules = self.rules
+        if command and COMMAND in rules:
+            buckets.append((COMMAND, f"{user_id}:{command}", rules[COMMAND]))
+        if user_id and USER in rules:
+            buckets.append((USER, user_id, rules[USER]))
+        if guild_id and GUILD in rules:
+            buckets.append((GUILD, guild_id, rules[GUILD]))
+        return buckets
+
+    async def _take(self, buckets: Sequence[Bucket]) -> float:
+        if not buckets:
+            return 0.0
+        wait, denied = await self.backend.take_all(buckets)
+        if denied is not None:
+            self._throttled[denied].inc()
+        return wait
+
+    async def check(
+        self, user_id: str, guild_id: Optional[str] = None, command: Optional[str] = None
+    ) -> float:
+        """実行してよければ 0、制限中なら再試行までの秒数を返す
+
+        関係するバケットすべてに残りがあるときだけ1つずつ使い、1つでも足りなければ
+        どのバケットも使いません（ギルドの枠で断られた実行でユーザーの枠が減らない）。
+        """
+        return await self._take(self._buckets(user_id, guild_id, command))
+
+    async def check_all(
+        self, requests: Sequence[Tuple[str, Optional[str], Optional[str]]]
+    ) -> float:
+        """(ユーザー, ギルド, コマンド) の組すべてをまとめて確認する
+
+        一括実行の後ろのユーザーで断られたときに、前のユーザーの枠が減ることは
+        ありません。同じバケットは1回だけ数えます。
+        """
+        buckets: Dict[Tuple[str, str], Bucket] = {}
+        for request in requests:
+            for bucket in self._buckets(*request):
+                buckets[bucket[0], bucket[1]] = bucket
+        return await self._take(list(buckets.values()))
+
+
+def retry_after(wait: float) -> str:
+    """Retry-After ヘッダーの値（整数の秒数、切り上げ）"""
+    return str(max(math.ceil(wait), 1))
+
+
+# 共有の流量制限（HTTPモードとゲートウェイの両方で使う）
+throttle = Throttle.from_env()
@@ -0,0 +1,173 @@
+"""
+Discordインタラクションの署名検証
+公開鍵は起動時に一度だけパースし、リクエストごとの鍵生成を省きます。
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from nacl.exceptions import BadSignatureError
+from nacl.signing import VerifyKey
+
+from applog import get_logger
+
+logger = get_logger("verifier")
+
+# env.example のプレースホルダー
+PLACEHOLDER_PUBLIC_KEY = "your_discord_public_key_here"
+
+# Ed25519署名の長さ（バイト）
+SIGNATURE_SIZE = 64
+
+
+def parse_public_keys(value: Optional[str]) -> List[VerifyKey]:
+    """カンマ区切りの公開鍵（hex）をVerifyKeyのリストに変換する"""
+    keys = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item or item == PLACEHOLDER_PUBLIC_KEY:
+            continue
+        try:
+            keys.append(VerifyKey(bytes.fromhex(item)))
+        except ValueError as e:
+            logger.warning("公開鍵を読み込めませんでした: %s", e)
+    return keys
+
+
+class SignatureVerifier:
+    """複数の公開鍵に対応した署名検証器
+
+    鍵のローテーション中は新旧両方の鍵を DISCORD_PUBLIC_KEY に
+    カンマ区切りで設定します。処理中のリクエストが offload_threshold を
+    超えたら、検証をスレッドプールへ移し、同じループ周回で溜まった分を
+    まとめて1回のジョブで検証します。
+    """
+
+    def __init__(
+        self,
+        public_keys: Sequence[VerifyKey] = (),
+        offload_threshold: int = 4,
+        max_workers: Optional[int] = None,
+    ):
+        self._keys: Tuple[VerifyKey, ...] = tuple(public_keys)
+        self.offload_threshold = offload_threshold
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._inflight = 0
+        self._batch: List[Tuple[bytes, bytes, asyncio.Future]] = []
+
+    @classmethod
+    def from_env(cls) -> "SignatureVerifier":
+        """環境変数から検証器を作成する"""
+        keys = parse_public_keys(os.getenv("DISCORD_PUBLIC_KEY"))
+        if not keys:
+            logger.warning("DISCORD_PUBLIC_KEYが設定されていません")
+        return cls(
+            keys,
+            offload_threshold=int(os.getenv("VERIFY_OFFLOAD_THRESHOLD", "4")),
+        )
+
+    @property
+    def configured(self) -> bool:
+        return bool(self._keys)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """処理中のリクエスト数を数える"""
+        self._inflight += 1
+        try:
+            yield
+        finally:
+            self._inflight -= 1
+
+    def _check(self, message: bytes, signature: bytes) -> bool:
+        for key in self._keys:
+            try:
+                key.verify(message, signature)
+                return True
+            except BadSignatureError:
+                continue
+        return False
+
+    def _check_many(self, items: Sequence[Tuple[bytes, bytes]]) -> List[bool]:
+        return [self._check(message, signature) for message, signature in items]
+
+    @staticmethod
+    def _prepare(
+        raw_body: bytes, signature: str, timestamp: str
+    ) -> Optional[Tuple[bytes, bytes]]:
+        try:
+            sig = bytes.fromhex(signature)
+        except ValueError:
+            return None
+        if len(sig) != SIGNATURE_SIZE:
+            return None
+        return timestamp.encode() + raw_body, sig
+
+    def verify(self, raw_body: bytes, signature: str, timestamp: str) -> bool:
+        """署名をその場で検証する"""
+        if not self._keys:
+            return False
+        prepared = self._prepare(raw_body, signature, timestamp)
+        if prepared is None:
+            return False
+        return self._check(*prepared)
+
+    async def verify_async(
+        self, raw_body: bytes, signature: str, timestamp: str
+    ) -> bool:
+        """混雑時はスレッドプールでまとめて検証する"""
+        if not self._keys:
+            return False
+        prepared = self._prepare(raw_body, signature, timestamp)
+        if prepared is None:
+            return False
+        if self._inflight <= self.offload_threshold:
+            return self._check(*prepared)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._batch:
+            loop.call_soon(self._flush)
+        self._batch.append((prepared[0], prepared[1], future))
+        return await future
+
+    def _flush(self) -> None:
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix="verify"
+            )
+        loop = asyncio.get_running_loop()
+        job = loop.run_in_executor(
+            self._executor,
+            self._check_many,
+            [(message, signature) for message, signature, _ in batch],
+        )
+
+        def _resolve(done: asyncio.Future) -> None:
+            error = done.exception()
+            results = None if error else done.result()
+            for index, (_, _, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(results[index])
+
+        job.add_done_callback(_resolve)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None